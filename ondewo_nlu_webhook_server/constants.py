@@ -18,3 +18,12 @@ SLOT_FILLING_CASE: str = "slot_filling"
 RESPONSE_REFINEMENT_CASE: str = "response_refinement"
 
 CALL_CASES: List[str] = [SLOT_FILLING_CASE, RESPONSE_REFINEMENT_CASE]
+
+# outcomes of a webhook request, label of the request metrics
+OUTCOME_UNHANDLED: str = "unhandled"
+OUTCOME_HANDLED: str = "handled"
+OUTCOME_CACHED: str = "cached"
+OUTCOME_TIMEOUT: str = "timeout"
+OUTCOME_ERROR: str = "error"
+OUTCOME_DISCONNECTED: str = "disconnected"
+OUTCOME_INVALID: str = "invalid"
@@ -13,8 +13,31 @@
 # limitations under the License.
 
 import os
+import tempfile
 from dataclasses import dataclass
-from typing import ClassVar
+from typing import (
+    ClassVar,
+    FrozenSet,
+    Tuple,
+)
+
+
+def _get_positive_int(name: str, default: str) -> int:
+    """
+    Args:
+        name (str): name of the environment variable
+        default (str): value if the variable is not set
+
+    Returns:
+        int: the value of the variable
+
+    Raises:
+        ValueError: if the value is not an integer of at least 1, hence the server does not start
+    """
+    value: int = int(os.getenv(name, default).strip())
+    if value < 1:
+        raise ValueError(f"{name} must be at least 1, got {value}")
+    return value
 
 
 @dataclass
@@ -39,3 +62,222 @@ class WebhookGlobals():
     ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BEARER: ClassVar[str] = str(
         os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BEARER", "").strip(),
     )
+
+    # dump whole request and response payloads only for every n-th request (debug log level only)
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PAYLOAD_LOG_SAMPLE_RATE: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PAYLOAD_LOG_SAMPLE_RATE", "1").strip(),
+    )
+
+    # comma-separated intent display names to dump payloads for; all intents if empty
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PAYLOAD_LOG_INTENTS: ClassVar[FrozenSet[str]] = frozenset(
+        intent.strip()
+        for intent in os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PAYLOAD_LOG_INTENTS", "").split(",")
+        if intent.strip()
+    )
+
+    # maximum number of requests of one batch request whose custom code is run concurrently
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BATCH_MAX_CONCURRENCY: ClassVar[int] = _get_positive_int(
+        "ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BATCH_MAX_CONCURRENCY", "16",
+    )
+
+    # seconds the custom code may take per call, unlimited if 0; the default response is returned if it takes longer
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGET: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGET", "0").strip(),
+    )
+
+    # comma-separated time budgets "<call case>=<seconds>" or "<call case>:<intent display name>=<seconds>"
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGETS: ClassVar[str] = str(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGETS", "").strip(),
+    )
+
+    # request header with the milliseconds ondewo-cai still waits for the response, shortens the time budget
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGET_HEADER: ClassVar[str] = str(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGET_HEADER", "x-ondewo-timeout-ms").strip(),
+    )
+
+    # cancels the custom code of a request if ondewo-cai disconnects before the response is sent
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_CANCEL_ON_DISCONNECT: ClassVar[bool] = (
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_CANCEL_ON_DISCONNECT", "true").strip().lower() == "true"
+    )
+
+    # maximum of the adaptive limit of the webhook requests a worker processes concurrently, unlimited if 0
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_IN_FLIGHT: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_IN_FLIGHT", "64").strip(),
+    )
+
+    # minimum of the adaptive limit of the webhook requests a worker processes concurrently
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MIN_IN_FLIGHT: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MIN_IN_FLIGHT", "4").strip(),
+    )
+
+    # seconds a webhook request may wait for a free slot before it is rejected with 503
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_QUEUE_TIME: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_QUEUE_TIME", "0.5").strip(),
+    )
+
+    # seconds of a webhook handler above which the limit of the concurrent requests is decreased
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_TARGET_LATENCY: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_TARGET_LATENCY", "2").strip(),
+    )
+
+    # seconds in the Retry-After header of rejected webhook requests
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_RETRY_AFTER: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_RETRY_AFTER", "1").strip(),
+    )
+
+    # directory of the metric snapshots of the workers, emptied at startup; only the serving worker's metrics if empty
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_METRICS_DIR: ClassVar[str] = str(
+        os.getenv(
+            "ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_METRICS_DIR",
+            os.path.join(tempfile.gettempdir(), "ondewo_nlu_webhook_server_metrics"),
+        ).strip(),
+    )
+
+    # seconds between the metric snapshots of a worker, i.e. the maximum age of the values of the other workers
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_METRICS_FLUSH_INTERVAL: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_METRICS_FLUSH_INTERVAL", "5").strip(),
+    )
+
+    # number of the most recent spans of the hot path kept per worker
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_CAPACITY: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_CAPACITY", "4096").strip(),
+    )
+
+    # comma-separated modules whose functions record no spans at startup, e.g. "ondewo_nlu_webhook_server.server.relay"
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_DISABLED_MODULES: ClassVar[FrozenSet[str]] = frozenset(
+        module.strip()
+        for module in os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_DISABLED_MODULES", "").split(",")
+        if module.strip()
+    )
+
+    # write every n-th span to the debug log, none if 0
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_LOG_SAMPLE_RATE: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_LOG_SAMPLE_RATE", "0").strip(),
+    )
+
+    # seconds between the heartbeats of the event loop monitor of a worker, no monitor if 0
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_LOOP_MONITOR_INTERVAL: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_LOOP_MONITOR_INTERVAL", "0.5").strip(),
+    )
+
+    # seconds the event loop may be blocked before a warning with the stack of the blocking call is logged
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_LOOP_LAG_THRESHOLD: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_LOOP_LAG_THRESHOLD", "0.1").strip(),
+    )
+
+    # maximum seconds of an on-demand profiling session of a worker started by POST /admin/profile
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PROFILE_MAX_DURATION: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PROFILE_MAX_DURATION", "60").strip(),
+    )
+
+    # entries of the LRU cache of the fulfillment messages of cached response_refinement handlers, no cache if 0
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_RESPONSE_CACHE_MAX_ENTRIES: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_RESPONSE_CACHE_MAX_ENTRIES", "1024").strip(),
+    )
+
+    # pooled http client of http_services.make_http_request, one per worker
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_MAX_CONNECTIONS: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_MAX_CONNECTIONS", "100").strip(),
+    )
+
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", "20").strip(),
+    )
+
+    # seconds an idle keep-alive connection stays in the pool
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_KEEPALIVE_EXPIRY: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_KEEPALIVE_EXPIRY", "30").strip(),
+    )
+
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_CONNECT_TIMEOUT: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_CONNECT_TIMEOUT", "5").strip(),
+    )
+
+    # seconds for reading, writing and waiting for a connection of the pool
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_TIMEOUT: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_TIMEOUT", "10").strip(),
+    )
+
+    # HTTP/2 is negotiated with upstreams which support it over TLS, plain http stays HTTP/1.1
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_HTTP2: ClassVar[bool] = (
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_HTTP2", "true").strip().lower() == "true"
+    )
+
+    # seconds a scraped price table is served from the cache without revalidation
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PRICE_TABLE_CACHE_TTL: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PRICE_TABLE_CACHE_TTL", "300").strip(),
+    )
+
+    # seconds after the TTL a price table is still served while it is revalidated in the background
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PRICE_TABLE_CACHE_MAX_STALE: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PRICE_TABLE_CACHE_MAX_STALE", "3600").strip(),
+    )
+
+    # grpc.aio channels of the custom code to ondewo-nlu per worker
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_POOL_SIZE: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_POOL_SIZE", "2").strip(),
+    )
+
+    # default deadline in seconds of a call of the custom code to ondewo-nlu
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_TIMEOUT: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_TIMEOUT", "2").strip(),
+    )
+
+    # file sharing the auth token of the NLU login across the workers; cached per worker only if empty
+    # its directory is created private to the user of the server, a directory accessible by others is refused
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_FILE: ClassVar[str] = str(
+        os.getenv(
+            "ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_FILE",
+            os.path.join(tempfile.gettempdir(), f"ondewo_nlu_webhook_server_{os.getuid()}", "nlu_token.json"),
+        ).strip(),
+    )
+
+    # seconds before its expiry the auth token of the NLU login is refreshed in the background
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_REFRESH_MARGIN: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_REFRESH_MARGIN", "60").strip(),
+    )
+
+    # seconds an auth token without "exp" claim is considered valid
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_TTL: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_TTL", "3600").strip(),
+    )
+
+    # attempts of a call of the custom code to ondewo-nlu, retries only within its deadline and retry budget
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_MAX_ATTEMPTS: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_MAX_ATTEMPTS", "3").strip(),
+    )
+
+    # share of the calls to ondewo-nlu per channel which may be retried
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_RETRY_BUDGET_RATIO: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_RETRY_BUDGET_RATIO", "0.1").strip(),
+    )
+
+    # consecutive failed calls to ondewo-nlu which open the circuit breaker
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_CIRCUIT_BREAKER_FAILURES: ClassVar[int] = int(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_CIRCUIT_BREAKER_FAILURES", "5").strip(),
+    )
+
+    # seconds the circuit breaker stays open before one call probes ondewo-nlu
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_CIRCUIT_BREAKER_RESET_TIMEOUT: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_CIRCUIT_BREAKER_RESET_TIMEOUT", "10").strip(),
+    )
+
+    # seconds an intent is served from the intent cache of the custom code
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_TTL: ClassVar[float] = float(
+        os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_TTL", "600").strip(),
+    )
+
+    # comma-separated agents "projects/<PROJECT-ID>/agent" whose intents are cached at startup; none if empty
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_AGENTS: ClassVar[Tuple[str, ...]] = tuple(
+        agent.strip()
+        for agent in os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_AGENTS", "").split(",")
+        if agent.strip()
+    )
+
+    # comma-separated language codes of the intents cached at startup
+    ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_LANGUAGE_CODES: ClassVar[Tuple[str, ...]] = tuple(
+        language_code.strip()
+        for language_code in os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_LANGUAGE_CODES", "de-DE")
+        .split(",")
+        if language_code.strip()
+    )
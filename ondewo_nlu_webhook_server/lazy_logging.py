@@ -0,0 +1,116 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Level-gated logging facade which defers building log messages until the log level is known to be enabled.
+
+Messages are passed either as plain strings or as zero-argument callables, e.g.
+
+    lazy_log.debug(lambda: f"contexts={active_contexts}")
+
+The callable, and therefore the formatting of potentially large objects, is only evaluated if the logger would emit
+the message. Dumps of whole request and response payloads are additionally sampled by the PayloadDumpSampler.
+"""
+import itertools
+import logging
+from typing import (
+    Callable,
+    FrozenSet,
+    Iterator,
+    Optional,
+    Union,
+)
+
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+
+LazyMessage = Union[str, Callable[[], str]]
+
+
+class LazyLogger:
+    """
+    Wraps a logger and only evaluates lazy messages if the requested log level is enabled.
+    """
+
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger: logging.Logger = logger
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def is_debug_enabled(self) -> bool:
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def log(self, level: int, message: LazyMessage) -> None:
+        self._log(level, message)
+
+    def debug(self, message: LazyMessage) -> None:
+        self._log(logging.DEBUG, message)
+
+    def info(self, message: LazyMessage) -> None:
+        self._log(logging.INFO, message)
+
+    def warning(self, message: LazyMessage) -> None:
+        self._log(logging.WARNING, message)
+
+    def _log(self, level: int, message: LazyMessage) -> None:
+        if self.logger.isEnabledFor(level):
+            # the record is attributed to the caller of the public method, not to this facade
+            self.logger.log(level, message() if callable(message) else message, stacklevel=3)
+
+
+class PayloadDumpSampler:
+    """
+    Decides for which requests whole request and response payloads are dumped into the debug log.
+
+    Payloads are only dumped if debug logging is enabled, the intent is selected (all intents are selected if no
+    intents are configured) and the request is one of every <sample_rate> selected requests.
+    """
+
+    def __init__(
+        self,
+        lazy_logger: LazyLogger,
+        sample_rate: int = 1,
+        intents: Optional[FrozenSet[str]] = None,
+    ) -> None:
+        if sample_rate < 1:
+            raise ValueError(f"sample_rate must be at least 1, got {sample_rate}")
+        self.lazy_logger: LazyLogger = lazy_logger
+        self.sample_rate: int = sample_rate
+        self.intents: FrozenSet[str] = intents or frozenset()
+        self._counter: Iterator[int] = itertools.count()
+
+    def should_dump(self, intent_display_name: Optional[str] = None) -> bool:
+        """
+        Args:
+            intent_display_name (Optional[str]): display name of the intent of the request
+
+        Returns:
+            bool: True if the payloads of the request should be dumped
+        """
+        if not self.lazy_logger.is_debug_enabled():
+            return False
+        if self.intents and intent_display_name not in self.intents:
+            return False
+        return self.sample_rate == 1 or next(self._counter) % self.sample_rate == 0
+
+
+lazy_log: LazyLogger = LazyLogger(log)
+
+payload_dump_sampler: PayloadDumpSampler = PayloadDumpSampler(
+    lazy_logger=lazy_log,
+    sample_rate=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PAYLOAD_LOG_SAMPLE_RATE,
+    intents=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PAYLOAD_LOG_INTENTS,
+)
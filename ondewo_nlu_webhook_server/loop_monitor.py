@@ -0,0 +1,177 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Monitor of the event loop of a worker: lag, running tasks and the queue of the thread pool.
+
+A heartbeat task of the event loop sleeps for `interval` and measures how much later it woke up, i.e. the lag of the
+event loop, and samples the number of tasks and the busy and waiting threads of the thread pool of Starlette, which
+runs the sync endpoints. A watchdog thread checks the heartbeat: if it is overdue by more than `lag_threshold`, a
+blocking call holds the event loop, and the watchdog logs the stack of the event loop thread at that moment, which
+shows the blocking coroutine, e.g. a handler calling requests.get or a sync gRPC client.
+
+The values are published as metrics of the /metrics route and on /stats/event_loop.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import anyio.to_thread
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    metrics_registry,
+)
+
+# upper bounds in seconds of the buckets of the event loop lag
+LAG_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EventLoopMonitor:
+    """
+    Heartbeat task of the event loop of a worker and watchdog thread which captures the stack of a blocked loop.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        interval: float = 0.5,
+        lag_threshold: float = 0.1,
+    ) -> None:
+        """
+        Args:
+            registry (MetricsRegistry): registry of the metrics of the monitor
+            interval (float): seconds between the heartbeats
+            lag_threshold (float): seconds of lag above which a warning with the stack of the event loop is logged
+        """
+        self.interval: float = interval
+        self.lag_threshold: float = lag_threshold
+        self._lag: Histogram = registry.histogram(
+            "ondewo_nlu_webhook_event_loop_lag_seconds",
+            "Lag of the heartbeat of the event loop of the workers.",
+            buckets=LAG_BUCKETS,
+        )
+        self._blocked: Counter = registry.counter(
+            "ondewo_nlu_webhook_event_loop_blocked",
+            "Times the event loop of a worker was blocked for longer than the lag threshold.",
+        )
+        self._tasks: Gauge = registry.gauge("ondewo_nlu_webhook_event_loop_tasks", "Tasks of the event loops.")
+        self._threads: Gauge = registry.gauge(
+            "ondewo_nlu_webhook_threadpool",
+            "Busy threads and tasks waiting for a thread of the thread pools of the workers.",
+            ("state",),
+        )
+        # created before the watchdog thread increments it, a snapshot never sees the dict of the counter change size
+        self._blocked.inc(amount=0)
+        self.max_lag: float = 0.0
+        self.blocked: int = 0
+        self.last_blocking_stack: str = ""
+        self._heartbeat: float = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional["asyncio.Task[None]"] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped: threading.Event = threading.Event()
+
+    def start(self) -> None:
+        """
+        Starts the heartbeat task in the running event loop and the watchdog thread.
+        """
+        if self.interval <= 0 or (self._heartbeat_task is not None and not self._heartbeat_task.done()):
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.ensure_future(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        """
+        Stops the heartbeat task and the watchdog thread.
+        """
+        self._stopped.set()
+        heartbeat_task: Optional["asyncio.Task[None]"] = self._heartbeat_task
+        self._heartbeat_task = None
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+            try:
+                await heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval)
+            self._watchdog = None
+
+    def stats(self) -> Dict[str, Union[int, float, str]]:
+        """
+        Returns:
+            Dict[str, Union[int, float, str]]: maximum lag, blocked loops and the stack of the last blocking call
+        """
+        return {
+            "max_lag": round(self.max_lag, 4),
+            "blocked": self.blocked,
+            "last_blocking_stack": self.last_blocking_stack,
+        }
+
+    async def _beat(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            start: float = loop.time()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            lag: float = max(0.0, loop.time() - start - self.interval)
+            self._lag.observe((), lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._tasks.set((), len(asyncio.all_tasks(loop)))
+            statistics: Any = anyio.to_thread.current_default_thread_limiter().statistics()
+            self._threads.set(("busy",), statistics.borrowed_tokens)
+            self._threads.set(("waiting",), statistics.tasks_waiting)
+
+    def _watch(self) -> None:
+        # heartbeat whose overdue stack was captured, a blocked loop is reported once
+        reported_heartbeat: float = -1.0
+        while not self._stopped.wait(max(0.01, self.lag_threshold / 2)):
+            heartbeat: float = self._heartbeat
+            overdue: float = time.monotonic() - heartbeat - self.interval
+            if overdue <= self.lag_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            frame: Optional[FrameType] = sys._current_frames().get(self._loop_thread_id or 0)
+            stack: str = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.blocked += 1
+            self._blocked.inc()
+            self.last_blocking_stack = stack
+            log.warning(f"EventLoopMonitor: event loop blocked for more than {overdue:.3f}s at:\n{stack}")
+
+
+event_loop_monitor: EventLoopMonitor = EventLoopMonitor(
+    registry=metrics_registry,
+    interval=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_LOOP_MONITOR_INTERVAL,
+    lag_threshold=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_LOOP_LAG_THRESHOLD,
+)
@@ -0,0 +1,474 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Metrics of the webhook server in the Prometheus text format, aggregated over the uvicorn workers.
+
+Recording a value only updates a dict of the worker, no strings are formatted and no locks are taken:
+
+    request_duration.observe((call_case, intent_display_name, outcome, "200"), seconds)
+
+Every worker writes a snapshot of its metrics to <directory>/<pid>.json every flush_interval seconds and when it
+stops. /metrics is served by any worker: it writes its own snapshot and merges the snapshots of all workers, hence
+the values of the other workers are at most flush_interval old. Counters and histograms of stopped workers are kept,
+gauges only count running workers. The directory is emptied when the server starts.
+
+Latencies are recorded in histograms with fixed buckets, percentiles such as p50, p99 and p999 per intent are
+computed by Prometheus, e.g.
+
+    histogram_quantile(0.99, sum by (intent, le) (rate(ondewo_nlu_webhook_request_duration_seconds_bucket[5m])))
+"""
+import asyncio
+import glob
+import json
+import math
+import os
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from bisect import bisect_left
+from collections import defaultdict
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+
+LabelValues = Tuple[str, ...]
+
+# upper bounds in seconds of the buckets of latency histograms
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75,
+    1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0,
+)
+
+
+class Metric(ABC):
+    """
+    Metric with labels whose values of a worker are snapshotted and merged with the ones of the other workers.
+    """
+
+    type: ClassVar[str] = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        """
+        Args:
+            name (str): name of the metric, e.g. "ondewo_nlu_webhook_requests_in_flight"
+            documentation (str): help text of the metric
+            label_names (Sequence[str]): names of the labels, the values are passed in the same order
+        """
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Tuple[str, ...] = tuple(label_names)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[LabelValues, Any]]:
+        """
+        Returns:
+            List[Tuple[LabelValues, Any]]: the values of the worker by label values
+        """
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: json-serializable snapshot of the metric
+        """
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "label_names": list(self.label_names),
+            "samples": [[list(label_values), value] for label_values, value in self.samples()],
+        }
+
+
+class Counter(Metric):
+    """Monotonic counter."""
+
+    type: ClassVar[str] = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: DefaultDict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, label_values: LabelValues = (), amount: float = 1.0) -> None:
+        self._values[label_values] += amount
+
+    def samples(self) -> List[Tuple[LabelValues, Any]]:
+        return list(self._values.items())
+
+
+class Gauge(Metric):
+    """Current value, e.g. of requests in flight; summed over the running workers."""
+
+    type: ClassVar[str] = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: DefaultDict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, label_values: LabelValues = (), amount: float = 1.0) -> None:
+        self._values[label_values] += amount
+
+    def dec(self, label_values: LabelValues = (), amount: float = 1.0) -> None:
+        self._values[label_values] -= amount
+
+    def set(self, label_values: LabelValues, value: float) -> None:
+        self._values[label_values] = value
+
+    def samples(self) -> List[Tuple[LabelValues, Any]]:
+        return list(self._values.items())
+
+
+class CallbackGauge(Gauge):
+    """Gauge whose values are read from a callback when the metrics are snapshotted, e.g. from existing stats."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+    ) -> None:
+        """
+        Args:
+            name (str): name of the metric
+            documentation (str): help text of the metric
+            label_names (Sequence[str]): names of the labels
+            collect (Callable[[], Iterable[Tuple[LabelValues, float]]]): returns the values by label values
+        """
+        super().__init__(name, documentation, label_names)
+        self._collect: Callable[[], Iterable[Tuple[LabelValues, float]]] = collect
+
+    def samples(self) -> List[Tuple[LabelValues, Any]]:
+        try:
+            return [(label_values, float(value)) for label_values, value in self._collect()]
+        except Exception as e:
+            log.error(f"CallbackGauge: collecting {self.name} failed: {e!r}")
+            return []
+
+
+class Histogram(Metric):
+    """Histogram with fixed buckets, e.g. of latencies in seconds."""
+
+    type: ClassVar[str] = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        """
+        Args:
+            name (str): name of the metric
+            documentation (str): help text of the metric
+            label_names (Sequence[str]): names of the labels
+            buckets (Sequence[float]): sorted upper bounds of the buckets, the +Inf bucket is added
+        """
+        super().__init__(name, documentation, label_names)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # per label values: the count of each bucket, of the +Inf bucket, and the sum of the observed values
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, label_values: LabelValues, value: float) -> None:
+        entry: Optional[List[float]] = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [0.0] * (len(self.buckets) + 2)
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def samples(self) -> List[Tuple[LabelValues, Any]]:
+        return [(label_values, list(entry)) for label_values, entry in self._values.items()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = super().to_dict()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """
+    Metrics of a worker, stored as snapshot files in a directory shared by the workers of the server.
+    """
+
+    def __init__(
+        self,
+        directory: str = "",
+        flush_interval: float = 5.0,
+        get_pid: Callable[[], int] = os.getpid,
+        is_alive: Callable[[int], bool] = _is_alive,
+    ) -> None:
+        """
+        Args:
+            directory (str): directory of the snapshot files of the workers; only the metrics of the worker serving
+                /metrics are returned if empty
+            flush_interval (float): seconds between the snapshots of a worker
+            get_pid (Callable[[], int]): id of the process of the worker
+            is_alive (Callable[[int], bool]): whether the process of a worker is running
+        """
+        self.directory: str = directory
+        self.flush_interval: float = flush_interval
+        self._get_pid: Callable[[], int] = get_pid
+        self._is_alive: Callable[[int], bool] = is_alive
+        self._metrics: Dict[str, Metric] = {}
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Args:
+            metric (Metric): metric of the worker
+
+        Returns:
+            Metric: the metric
+
+        Raises:
+            ValueError: if another metric with the same name is registered
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        counter: Counter = Counter(name, documentation, label_names)
+        self.register(counter)
+        return counter
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        gauge: Gauge = Gauge(name, documentation, label_names)
+        self.register(gauge)
+        return gauge
+
+    def callback_gauge(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+    ) -> CallbackGauge:
+        gauge: CallbackGauge = CallbackGauge(name, documentation, label_names, collect)
+        self.register(gauge)
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        histogram: Histogram = Histogram(name, documentation, label_names, buckets)
+        self.register(histogram)
+        return histogram
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Has to be called in the event loop of the worker, which records the metrics.
+
+        Returns:
+            Dict[str, Any]: json-serializable snapshot of the metrics of the worker
+        """
+        return {
+            "pid": self._get_pid(),
+            "metrics": {name: metric.to_dict() for name, metric in self._metrics.items()},
+        }
+
+    def write(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Writes the snapshot of the worker atomically, hence other workers never read a partial file.
+
+        Args:
+            snapshot (Dict[str, Any]): snapshot of the worker
+        """
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path: str = os.path.join(self.directory, f"{snapshot['pid']}.json")
+        temporary_path: str = f"{path}.tmp"
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temporary_path, path)
+
+    def clear(self) -> None:
+        """
+        Removes the snapshots of all workers, called before the workers of the server are started.
+        """
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            os.remove(path)
+
+    def render(self, snapshot: Dict[str, Any]) -> str:
+        """
+        Writes the snapshot of the worker and merges it with the snapshots of the other workers. Reads files, hence
+        it is called in a thread.
+
+        Args:
+            snapshot (Dict[str, Any]): snapshot of the worker
+
+        Returns:
+            str: the metrics of all workers in the Prometheus text format
+        """
+        self.write(snapshot)
+        snapshots: List[Dict[str, Any]] = [snapshot]
+        if self.directory:
+            for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+                try:
+                    with open(path) as snapshot_file:
+                        other: Dict[str, Any] = json.load(snapshot_file)
+                except (OSError, ValueError) as e:
+                    log.warning(f"MetricsRegistry: ignoring snapshot {path}: {e!r}")
+                    continue
+                if other["pid"] != snapshot["pid"]:
+                    snapshots.append(other)
+        return _render(self._merge(snapshots))
+
+    def _merge(self, snapshots: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for index, snapshot in enumerate(snapshots):
+            # the first snapshot is the one of this worker
+            alive: Optional[bool] = True if index == 0 else None
+            for name, metric in snapshot["metrics"].items():
+                if metric["type"] == Gauge.type:
+                    if alive is None:
+                        alive = self._is_alive(snapshot["pid"])
+                    if not alive:
+                        continue
+                target: Dict[str, Any] = merged.setdefault(name, {**metric, "values": {}})
+                values: Dict[LabelValues, Any] = target["values"]
+                for label_values, value in metric["samples"]:
+                    key: LabelValues = tuple(label_values)
+                    if key not in values:
+                        values[key] = value
+                    elif isinstance(value, list):
+                        values[key] = [total + added for total, added in zip(values[key], value)]
+                    else:
+                        values[key] += value
+        return merged
+
+    def start(self) -> None:
+        """
+        Starts the background task which writes the snapshots of the worker.
+        """
+        if self.directory and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self) -> None:
+        """
+        Stops the background task and writes the last snapshot of the worker.
+        """
+        flush_task: Optional["asyncio.Task[None]"] = self._flush_task
+        self._flush_task = None
+        if flush_task is not None:
+            flush_task.cancel()
+            try:
+                await flush_task
+            except asyncio.CancelledError:
+                pass
+        try:
+            self.write(self.snapshot())
+        except OSError as e:
+            log.warning(f"MetricsRegistry: writing the last snapshot failed: {e!r}")
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.write(self.snapshot())
+            except OSError as e:
+                log.warning(f"MetricsRegistry: writing the snapshot failed: {e!r}")
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if not label_names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _render(merged: Dict[str, Dict[str, Any]]) -> str:
+    lines: List[str] = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        label_names: List[str] = metric["label_names"]
+        for label_values, value in sorted(metric["values"].items()):
+            if metric["type"] != Histogram.type:
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+                continue
+            cumulative: float = 0
+            for upper_bound, count in zip([*metric["buckets"], math.inf], value[:-1]):
+                cumulative += count
+                labels: str = _format_labels([*label_names, "le"], [*label_values, _format_value(upper_bound)])
+                lines.append(f"{name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(label_names, label_values)
+            lines.append(f"{name}_sum{labels} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{labels} {_format_value(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+
+metrics_registry: MetricsRegistry = MetricsRegistry(
+    directory=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_METRICS_DIR,
+    flush_interval=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_METRICS_FLUSH_INTERVAL,
+)
+
+request_duration: Histogram = metrics_registry.histogram(
+    "ondewo_nlu_webhook_request_duration_seconds",
+    "Duration of the webhook requests by call case, intent display name, outcome of the custom code and status code.",
+    ("call_case", "intent", "outcome", "status_code"),
+)
+
+requests_in_flight: Gauge = metrics_registry.gauge(
+    "ondewo_nlu_webhook_requests_in_flight",
+    "Webhook requests being processed by call case.",
+    ("call_case",),
+)
+
+outbound_call_duration: Histogram = metrics_registry.histogram(
+    "ondewo_nlu_webhook_outbound_call_duration_seconds",
+    "Duration of the calls of the custom code to other services by service, host or method, and outcome.",
+    ("service", "target", "outcome"),
+)
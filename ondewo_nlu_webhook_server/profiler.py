@@ -0,0 +1,155 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+On-demand profiling of the live traffic of the worker which receives the profiling request.
+
+Two modes are supported:
+
+    - "sampler": a thread samples the stacks of all other threads of the worker every `interval` seconds, the result
+      are collapsed stacks, one line "thread;frame;...;frame count" per distinct stack, the input format of
+      flamegraph.pl, speedscope and inferno. The sampler needs the GIL to take a sample, so it sees the code which
+      holds the GIL for long, e.g. a blocking handler, but may over-represent calls which release it, e.g. select.
+    - "cprofile": cProfile traces every call of the event loop thread, which runs the webhook requests and the custom
+      code, the result is the binary pstats dump, readable by pstats.Stats, snakeviz or flameprof.
+
+Only one session runs per worker at a time and its duration is bounded by `max_duration`.
+"""
+import asyncio
+import cProfile
+import marshal
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+
+PROFILE_MODE_SAMPLER: str = "sampler"
+PROFILE_MODE_CPROFILE: str = "cprofile"
+PROFILE_MODES: Tuple[str, ...] = (PROFILE_MODE_SAMPLER, PROFILE_MODE_CPROFILE)
+
+
+class ProfilingInProgress(Exception):
+    """Raised if a profiling session is started while another one runs in the same worker."""
+
+
+def collapse_stack(thread_name: str, frame: Optional[FrameType]) -> str:
+    """
+    Args:
+        thread_name (str): name of the thread, the root of the stack
+        frame (Optional[FrameType]): innermost frame of the thread
+
+    Returns:
+        str: the frames from the outermost to the innermost, separated by ";"
+    """
+    frames: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    frames.append(thread_name)
+    # ";" and " " separate the frames and the count of a collapsed stack
+    return ";".join(name.replace(";", ":") for name in reversed(frames)).replace(" ", "_")
+
+
+class Profiler:
+    """
+    Time-bounded profiling sessions of the worker, one at a time.
+    """
+
+    def __init__(self, max_duration: float = 60.0) -> None:
+        """
+        Args:
+            max_duration (float): maximum duration of a session in seconds
+        """
+        self.max_duration: float = max_duration
+        self._running: bool = False
+
+    async def profile(self, mode: str, duration: float, interval: float = 0.005) -> bytes:
+        """
+        Profiles the worker for `duration` seconds while it keeps serving requests.
+
+        Args:
+            mode (str): "sampler" or "cprofile"
+            duration (float): seconds of the session
+            interval (float): seconds between the samples of the sampler
+
+        Returns:
+            bytes: collapsed stacks for "sampler", the marshalled pstats for "cprofile"
+
+        Raises:
+            ValueError: if the mode, the duration or the interval is invalid
+            ProfilingInProgress: if another session runs in this worker
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}, got {mode}")
+        if not 0 < duration <= self.max_duration:
+            raise ValueError(f"duration must be in (0, {self.max_duration}] seconds, got {duration}")
+        if interval < 0.001:
+            raise ValueError(f"interval must be at least 0.001 seconds, got {interval}")
+        if self._running:
+            raise ProfilingInProgress("a profiling session is already running in this worker")
+        self._running = True
+        log.info(f"Profiler: {mode} session of {duration}s started")
+        try:
+            if mode == PROFILE_MODE_SAMPLER:
+                return await self._sample(duration, interval)
+            return await self._trace(duration)
+        finally:
+            self._running = False
+            log.info(f"Profiler: {mode} session of {duration}s finished")
+
+    async def _sample(self, duration: float, interval: float) -> bytes:
+        stacks: Counter = Counter()
+        stopped: threading.Event = threading.Event()
+
+        def sample() -> None:
+            sampler_id: int = threading.get_ident()
+            while not stopped.wait(interval):
+                names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate() if thread.ident}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != sampler_id:
+                        stacks[collapse_stack(names.get(thread_id, str(thread_id)), frame)] += 1
+
+        sampler: threading.Thread = threading.Thread(target=sample, name="profiler-sampler", daemon=True)
+        sampler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            stopped.set()
+            sampler.join()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode()
+
+    async def _trace(self, duration: float) -> bytes:
+        # cProfile traces the thread which enables it, i.e. the event loop thread with all coroutines of the worker
+        profile: cProfile.Profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profile.disable()
+        profile.create_stats()
+        return marshal.dumps(profile.stats)  # type: ignore[attr-defined]
+
+
+profiler: Profiler = Profiler(max_duration=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PROFILE_MAX_DURATION)
@@ -14,6 +14,7 @@
 import argparse
 import os
 import sys
+from contextlib import asynccontextmanager
 from multiprocessing import cpu_count
 from signal import (
     SIGINT,
@@ -22,6 +23,7 @@ from signal import (
 )
 from types import FrameType
 from typing import (
+    AsyncIterator,
     List,
     Optional,
     Tuple,
@@ -37,10 +39,52 @@ from starlette.middleware.cors import (
     CORSMiddleware,  # type: ignore
 )
 
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.loop_monitor import event_loop_monitor
+from ondewo_nlu_webhook_server.metrics import metrics_registry
+from ondewo_nlu_webhook_server.server.admission import (
+    AdmissionControlMiddleware,
+    admission_controller,
+)
 from ondewo_nlu_webhook_server.server.server import router as server_router
 from ondewo_nlu_webhook_server.version import __version__
+from ondewo_nlu_webhook_server_custom_integration.auth import (
+    intent_cache,
+    nlu_client_pool,
+    nlu_token_manager,
+    start_token_refresh,
+)
+from ondewo_nlu_webhook_server_custom_integration.http_services import shared_http_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Startup and shutdown of a worker: the pooled http client and the NLU client pool of the custom code live as long
+    as the worker. The channels of the NLU client pool are opened by its first call, the auth token of the NLU login
+    is refreshed, the intent cache is warmed up, the metrics are written for the other workers and the event loop is
+    monitored in the background.
+
+    Args:
+        app (FastAPI): the app
+    """
+    await shared_http_client.start()
+    start_token_refresh()
+    intent_cache.start()
+    metrics_registry.start()
+    event_loop_monitor.start()
+    try:
+        yield
+    finally:
+        await event_loop_monitor.close()
+        await metrics_registry.close()
+        await shared_http_client.close()
+        await intent_cache.close()
+        await nlu_token_manager.close()
+        await nlu_client_pool.close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # region: CORS middleware: used for local debugging to prevent CORS errors
 app.add_middleware(
@@ -52,6 +96,15 @@ app.add_middleware(
 )
 # endregion: CORS middleware
 
+# region: admission control: added last, hence the outermost middleware, sheds requests before any work is done
+if WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_IN_FLIGHT > 0:
+    app.add_middleware(
+        AdmissionControlMiddleware,  # type: ignore
+        controller=admission_controller,
+        retry_after=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_RETRY_AFTER,
+    )
+# endregion: admission control
+
 # Add routers here
 app.include_router(server_router)
 
@@ -156,6 +209,12 @@ def main() -> None:
     # Number of workers based on environment variable. If not set then set workers based on CPU cores
     workers: int = int(os.getenv("ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NR_OF_WORKERS", cpu_count() * 2 + 1))
 
+    # the metrics of the workers of a previous run must not be aggregated with the ones of the new workers
+    try:
+        metrics_registry.clear()
+    except OSError as e:
+        log.error(f"Could not remove the metrics of the previous run: {e}")
+
     # Start the server
     try:
         uvicorn.run(
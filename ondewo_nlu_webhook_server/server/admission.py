@@ -0,0 +1,239 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Admission control and load shedding of the webhook requests of a worker.
+
+At most `limit` requests of a worker are processed at once, further requests wait in a FIFO queue. A request which
+waited longer than max_queue_time since it arrived at the worker is rejected at once with 503 and a Retry-After
+header, so that ondewo-cai can retry it elsewhere instead of waiting for a response that would come too late anyway.
+
+The limit adapts to the latency of the handlers (AIMD): every request finished within target_latency increases it by
+1 / limit, i.e. by about 1 per round of requests, up to max_in_flight; a request which took longer decreases it by
+decrease_factor, at most once per target_latency, down to min_in_flight.
+
+Only the single webhook requests /slot_filling and /response_refinement are admitted by the controller, the batch
+endpoint bounds its concurrency itself and the other routes are not limited.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Optional,
+    Union,
+)
+
+from ondewo.logging.logger import logger_console as log
+from starlette.responses import JSONResponse
+from starlette.types import (
+    ASGIApp,
+    Receive,
+    Scope,
+    Send,
+)
+
+from ondewo_nlu_webhook_server.constants import CALL_CASES
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+
+
+class AdmissionController:
+    """
+    Adaptive limit of the requests processed concurrently by a worker, with a FIFO queue bounded by the queue time.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        min_in_flight: int = 1,
+        max_queue_time: float = 0.1,
+        target_latency: float = 1.0,
+        decrease_factor: float = 0.9,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            max_in_flight (int): initial and maximum limit of the requests processed concurrently
+            min_in_flight (int): minimum limit
+            max_queue_time (float): seconds a request may wait from its arrival until its handler starts
+            target_latency (float): seconds of a handler above which the limit is decreased
+            decrease_factor (float): factor the limit is multiplied with if a handler exceeded the target latency
+            clock (Callable[[], float]): monotonic clock in seconds
+        """
+        self.max_in_flight: int = max_in_flight
+        self.min_in_flight: int = max(1, min(min_in_flight, max_in_flight))
+        self.max_queue_time: float = max_queue_time
+        self.target_latency: float = target_latency
+        self.decrease_factor: float = decrease_factor
+        self._clock: Callable[[], float] = clock
+        self.limit: float = float(max_in_flight)
+        self.in_flight: int = 0
+        self._waiters: Deque["asyncio.Future[bool]"] = deque()
+        self._last_decrease: float = -math.inf
+        self.admitted: int = 0
+        self.shed: int = 0
+
+    async def acquire(self, arrived_at: float) -> bool:
+        """
+        Waits until the request may be processed. release() has to be called after an admitted request.
+
+        Args:
+            arrived_at (float): time of the clock the request arrived at the worker
+
+        Returns:
+            bool: True if the request is admitted, False if it is shed since it exceeded the queue time
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        timeout: float = self.max_queue_time - (self._clock() - arrived_at)
+        if timeout <= 0:
+            self.shed += 1
+            return False
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        waiter: "asyncio.Future[bool]" = loop.create_future()
+        self._waiters.append(waiter)
+        timer: asyncio.TimerHandle = loop.call_later(timeout, self._expire, waiter)
+        try:
+            admitted: bool = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                # the slot was handed over right before the request was cancelled
+                self.release(None)
+            self._remove(waiter)
+            raise
+        finally:
+            timer.cancel()
+        if admitted:
+            self.admitted += 1
+        else:
+            self.shed += 1
+        return admitted
+
+    def release(self, latency: Optional[float]) -> None:
+        """
+        Frees the slot of an admitted request and adapts the limit to the latency of its handler.
+
+        Args:
+            latency (Optional[float]): seconds the handler took, the limit is not adapted if None
+        """
+        self.in_flight -= 1
+        if latency is not None:
+            if latency <= self.target_latency:
+                self.limit = min(float(self.max_in_flight), self.limit + 1 / self.limit)
+            elif self._clock() - self._last_decrease >= self.target_latency:
+                # the requests in flight at the same time were slow for the same reason: decrease once for them
+                self.limit = max(float(self.min_in_flight), self.limit * self.decrease_factor)
+                self._last_decrease = self._clock()
+        while self._waiters and self.in_flight < self.limit:
+            waiter: "asyncio.Future[bool]" = self._waiters.popleft()
+            if waiter.done():
+                # cancelled, removed by its request later
+                continue
+            self.in_flight += 1
+            waiter.set_result(True)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Returns:
+            Dict[str, Union[int, float]]: the current limit, requests in flight and queued, admitted and shed requests
+        """
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+    def _expire(self, waiter: "asyncio.Future[bool]") -> None:
+        if not waiter.done():
+            self._remove(waiter)
+            waiter.set_result(False)
+
+    def _remove(self, waiter: "asyncio.Future[bool]") -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+admission_controller: AdmissionController = AdmissionController(
+    max_in_flight=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_IN_FLIGHT,
+    min_in_flight=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MIN_IN_FLIGHT,
+    max_queue_time=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_MAX_QUEUE_TIME,
+    target_latency=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_ADMISSION_TARGET_LATENCY,
+)
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware which admits the webhook requests via an AdmissionController and sheds them with 503.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        retry_after: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            app (ASGIApp): the wrapped app
+            controller (AdmissionController): admission controller of the worker
+            retry_after (float): seconds sent in the Retry-After header of shed requests
+            clock (Callable[[], float]): monotonic clock in seconds, the clock of the controller
+        """
+        self.app: ASGIApp = app
+        self.controller: AdmissionController = controller
+        self.retry_after: str = str(max(1, math.ceil(retry_after)))
+        self._clock: Callable[[], float] = clock
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"].strip("/") not in CALL_CASES
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived_at: float = self._clock()
+        if not await self.controller.acquire(arrived_at):
+            log.warning(
+                f"AdmissionControlMiddleware: shedding {scope['path']} after {self._clock() - arrived_at:.3f}s "
+                f"in the queue, {self.controller.in_flight} requests in flight",
+            )
+            response: JSONResponse = JSONResponse(
+                {"detail": "Server overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": self.retry_after},
+            )
+            await response(scope, receive, send)
+            return
+
+        started_at: float = self._clock()
+        latency: Optional[float] = None
+        try:
+            await self.app(scope, receive, send)
+            latency = self._clock() - started_at
+        finally:
+            # failed or cancelled requests free their slot without adapting the limit
+            self.controller.release(latency)
@@ -18,12 +18,10 @@ Definitions of json dataclass objects used for communication from & to the webho
 from enum import Enum
 from typing import (
     Any,
-    Callable,
     Dict,
     List,
     Optional,
     Set,
-    Type,
 )
 
 from pydantic import (
@@ -70,38 +68,31 @@ class Context(BaseModel):
     parameters: Dict[str, Parameter]
     lifespanTime: Optional[float] = None
 
-    class Config:
-        # This will tell Pydantic to use the `Parameter` model for `Parameter` parsing
-        # and handle nested objects automatically
-        json_encoders: Dict[Type[Any], Callable[[Any], Any]] = {
-            Parameter: lambda v: v.dict(),  # Convert Parameter object back to dict if needed
-        }
-
 
 class IntentMessageText(BaseModel):
-    text: Optional[List[str]]
+    text: Optional[List[str]] = None
 
 
 class IntentMessageImage(BaseModel):
-    image_uri: Optional[str]
-    accessibility_text: Optional[str]
+    image_uri: Optional[str] = None
+    accessibility_text: Optional[str] = None
 
 
 class IntentMessageQuickReplies(BaseModel):
-    title: Optional[str]
-    quick_replies: Optional[List[str]]
+    title: Optional[str] = None
+    quick_replies: Optional[List[str]] = None
 
 
 class IntentMessageCardButton(BaseModel):
-    text: Optional[str]
-    postback: Optional[str]
+    text: Optional[str] = None
+    postback: Optional[str] = None
 
 
 class IntentMessageCard(BaseModel):
-    title: Optional[str]
-    subtitle: Optional[str]
-    image_uri: Optional[str]
-    buttons: Optional[List[IntentMessageCardButton]]
+    title: Optional[str] = None
+    subtitle: Optional[str] = None
+    image_uri: Optional[str] = None
+    buttons: Optional[List[IntentMessageCardButton]] = None
 
 
 class IntentMessageBasicCardButtonOpenUriAction(BaseModel):
@@ -114,17 +105,17 @@ class IntentMessageBasicCardButton(BaseModel):
 
 
 class IntentMessageBasicCard(BaseModel):
-    title: Optional[str]
-    subtitle: Optional[str]
-    formatted_text: Optional[str]
-    image: Optional[IntentMessageImage]
-    buttons: Optional[List[IntentMessageBasicCardButton]]
+    title: Optional[str] = None
+    subtitle: Optional[str] = None
+    formatted_text: Optional[str] = None
+    image: Optional[IntentMessageImage] = None
+    buttons: Optional[List[IntentMessageBasicCardButton]] = None
 
 
 class IntentMessageSimpleResponse(BaseModel):
-    text_to_speech: Optional[str]
-    ssml: Optional[str]
-    display_text: Optional[str]
+    text_to_speech: Optional[str] = None
+    ssml: Optional[str] = None
+    display_text: Optional[str] = None
 
 
 class IntentMessageSimpleResponses(BaseModel):
@@ -146,7 +137,7 @@ class IntentMessageLinkOutSuggestion(BaseModel):
 
 class IntentMessageSelectItemInfo(BaseModel):
     key: str
-    synonyms: Optional[List[str]]
+    synonyms: Optional[List[str]] = None
 
 
 class IntentMessageCarouselSelectItem(BaseModel):
@@ -262,35 +253,6 @@ class QueryResult(BaseModel):
     parameters: Optional[Dict[str, Any]] = None
     queryText: str
 
-    class Config:
-        # This will tell Pydantic to use the `Context` model for `outputContexts` parsing
-        # and handle nested objects automatically
-        json_encoders: Dict[Type[Any], Callable[[Any], Any]] = {
-            Context: lambda v: v.dict(),  # Convert Context object back to dict if needed
-            IntentMessage: lambda v: v.dict(),
-            IntentMessageText: lambda v: v.dict(),
-            IntentMessageImage: lambda v: v.dict(),
-            IntentMessageQuickReplies: lambda v: v.dict(),
-            IntentMessageCard: lambda v: v.dict(),
-            IntentMessageCardButton: lambda v: v.dict(),
-            IntentMessageBasicCardButtonOpenUriAction: lambda v: v.dict(),
-            IntentMessageBasicCardButton: lambda v: v.dict(),
-            IntentMessageBasicCard: lambda v: v.dict(),
-            IntentMessageSimpleResponse: lambda v: v.dict(),
-            IntentMessageSimpleResponses: lambda v: v.dict(),
-            IntentMessageSuggestion: lambda v: v.dict(),
-            IntentMessageSuggestions: lambda v: v.dict(),
-            IntentMessageLinkOutSuggestion: lambda v: v.dict(),
-            IntentMessageSelectItemInfo: lambda v: v.dict(),
-            IntentMessageCarouselSelectItem: lambda v: v.dict(),
-            IntentMessageCarouselSelect: lambda v: v.dict(),
-            IntentMessageListSelectItem: lambda v: v.dict(),
-            IntentMessageListSelect: lambda v: v.dict(),
-            IntentMessageHTMLText: lambda v: v.dict(),
-            IntentMessageVideo: lambda v: v.dict(),
-            IntentMessageAudio: lambda v: v.dict(),
-        }
-
 
 class QueryParams(BaseModel):
     datastreamId: Optional[str] = None
@@ -394,7 +356,7 @@ class WebhookResponse(BaseModel):
     fulfillmentMessages: List[IntentMessage]
     source: str
     payload: Dict[str, Any]
-    outputContexts: Optional[List[Context]]
+    outputContexts: Optional[List[Context]] = None
     followupEventInput: EventInput  # TODO: make better so pydantic can parse full objects according to proto
     """
     webhook response json dataclass for communication from the webhook server to ondewo-cai
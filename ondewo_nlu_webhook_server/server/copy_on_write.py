@@ -0,0 +1,238 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Copy-on-write wrappers for the contexts handed to the custom code.
+
+Instead of deep copying all contexts of a request up front, the wrappers only copy what the custom code actually
+changes, while the contexts of the request stay unchanged:
+    - CopyOnWriteContextList is a shallow copy of the list of contexts. A context is copied the first time the custom
+      code accesses it through the list, and only shallowly: its parameters become a CopyOnWriteParameters dict.
+    - CopyOnWriteParameters is a shallow copy of the parameters dict. A Parameter is handed out as a
+      CopyOnWriteParameter, which shares the fields of the Parameter of the request until one of them is set.
+Adding, replacing or removing contexts and parameters only changes the shallow copies. Both wrappers are subclasses
+of list and dict, hence they are serialized like the plain containers. They override the methods which would hand
+out the objects of the request without copying them, e.g. dict(parameters), {**parameters} and contexts.copy().
+"""
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    SupportsIndex,
+    Tuple,
+    Union,
+    overload,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    Parameter,
+)
+
+_set_attribute = object.__setattr__
+
+
+class CopyOnWriteParameter(Parameter):
+    """
+    Parameter which shares the fields of a Parameter of the request until the custom code sets one of them.
+    """
+    __slots__ = ("_shared",)
+
+    @classmethod
+    def view(cls, parameter: Parameter) -> "CopyOnWriteParameter":
+        """
+        Args:
+            parameter (Parameter): parameter of the request
+
+        Returns:
+            CopyOnWriteParameter: parameter with the fields of the parameter of the request, without copying them
+        """
+        view: CopyOnWriteParameter = object.__new__(cls)
+        _set_attribute(view, "__dict__", parameter.__dict__)
+        _set_attribute(view, "__pydantic_fields_set__", parameter.__pydantic_fields_set__)
+        _set_attribute(view, "__pydantic_extra__", parameter.__pydantic_extra__)
+        _set_attribute(view, "__pydantic_private__", parameter.__pydantic_private__)
+        _set_attribute(view, "_shared", True)
+        return view
+
+    def _detach(self) -> None:
+        # the fields of a Parameter are strings, a shallow copy of the fields is a full copy
+        if getattr(self, "_shared", False):
+            _set_attribute(self, "__dict__", dict(self.__dict__))
+            _set_attribute(self, "__pydantic_fields_set__", set(self.__pydantic_fields_set__))
+            _set_attribute(self, "_shared", False)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        self._detach()
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name: str) -> None:
+        self._detach()
+        super().__delattr__(name)
+
+
+class CopyOnWriteParameters(Dict[str, Parameter]):
+    """
+    Parameters dict of a context whose Parameter objects are handed out as CopyOnWriteParameter views.
+    """
+
+    def __init__(self, parameters: Dict[str, Parameter]) -> None:
+        super().__init__(parameters)
+        # a value is still the Parameter of the request if it is the value of its key in the dict of the request,
+        # which the custom code cannot change
+        self._source: Dict[str, Parameter] = parameters
+
+    def _own(self, key: str, parameter: Parameter) -> Parameter:
+        if parameter is self._source.get(key):
+            parameter = CopyOnWriteParameter.view(parameter)
+            dict.__setitem__(self, key, parameter)
+        return parameter
+
+    def __getitem__(self, key: str) -> Parameter:
+        return self._own(key, dict.__getitem__(self, key))
+
+    def __iter__(self) -> Iterator[str]:
+        # NOTE: overridden, so dict(parameters) and {**parameters} read the values via __getitem__ instead of
+        # copying the Parameter objects of the request directly
+        return super().__iter__()
+
+    def get(self, key: str, default: Any = None) -> Any:  # type: ignore[override]
+        return self[key] if key in self else default
+
+    def values(self) -> List[Parameter]:  # type: ignore[override]
+        own = self._own
+        return [own(key, parameter) for key, parameter in list(dict.items(self))]
+
+    def items(self) -> List[Tuple[str, Parameter]]:  # type: ignore[override]
+        own = self._own
+        return [(key, own(key, parameter)) for key, parameter in list(dict.items(self))]
+
+    def pop(self, key: str, *default: Any) -> Any:  # type: ignore[override]
+        if key not in self:
+            return super().pop(key, *default)
+        parameter: Parameter = self[key]
+        super().pop(key)
+        return parameter
+
+    def popitem(self) -> Tuple[str, Parameter]:
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key: str = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:  # type: ignore[override]
+        if key in self:
+            return self[key]
+        super().__setitem__(key, default)
+        return default
+
+    def copy(self) -> Dict[str, Parameter]:  # type: ignore[override]
+        return dict(self.items())
+
+    def __or__(self, other: Any) -> Dict[str, Parameter]:  # type: ignore[override]
+        merged: Dict[str, Parameter] = self.copy()
+        merged.update(other)
+        return merged
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return dict, (self.copy(),)
+
+
+def copy_context_on_write(context: Context) -> Context:
+    """
+    Args:
+        context (Context): context of the request
+
+    Returns:
+        Context: shallow copy of the context whose parameters are a CopyOnWriteParameters dict
+    """
+    return context.model_copy(update={"parameters": CopyOnWriteParameters(context.parameters)})
+
+
+class CopyOnWriteContextList(List[Context]):
+    """
+    List of contexts whose Context objects are copied on their first access.
+    """
+
+    def __init__(self, contexts: Iterable[Context]) -> None:
+        super().__init__(contexts)
+        # the not yet copied contexts are identified by object identity, they are kept alive by the request
+        self._shared_ids: Set[int] = {id(context) for context in super().__iter__()}
+
+    def _own(self, index: int) -> Context:
+        context: Context = super().__getitem__(index)
+        if id(context) in self._shared_ids:
+            context = copy_context_on_write(context)
+            super().__setitem__(index, context)
+        return context
+
+    @overload
+    def __getitem__(self, index: SupportsIndex) -> Context:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Context]:
+        ...
+
+    def __getitem__(self, index: Union[SupportsIndex, slice]) -> Union[Context, List[Context]]:
+        if isinstance(index, slice):
+            return [self._own(i) for i in range(*index.indices(len(self)))]
+        return self._own(index.__index__())
+
+    def __iter__(self) -> Iterator[Context]:
+        # NOTE: index based, since the custom code may append contexts while iterating
+        index: int = 0
+        while index < len(self):
+            yield self._own(index)
+            index += 1
+
+    def __reversed__(self) -> Iterator[Context]:
+        for index in range(len(self) - 1, -1, -1):
+            yield self._own(index)
+
+    def pop(self, index: SupportsIndex = -1) -> Context:
+        context: Context = self._own(index.__index__())
+        super().pop(index)
+        return context
+
+    def copy(self) -> List[Context]:
+        return list(self)
+
+    def __add__(self, other: List[Context]) -> List[Context]:  # type: ignore[override]
+        return list(self) + other
+
+    def __mul__(self, times: SupportsIndex) -> List[Context]:
+        return list(self) * times
+
+    __rmul__ = __mul__
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return list, (list(self),)
+
+
+def copy_contexts_on_write(contexts: Optional[List[Context]]) -> Optional[List[Context]]:
+    """
+    Args:
+        contexts (Optional[List[Context]]): contexts of the request
+
+    Returns:
+        Optional[List[Context]]: the contexts wrapped into a CopyOnWriteContextList
+    """
+    if contexts is None:
+        return None
+    return CopyOnWriteContextList(contexts)
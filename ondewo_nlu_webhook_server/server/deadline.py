@@ -0,0 +1,164 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Time budgets of the custom code and the deadline of the request being processed.
+
+The budget of a call of the custom code is configured per call case and per intent, and can be shortened by a request
+header of ondewo-cai with the time in milliseconds it is still willing to wait. The relay cancels custom code which
+exceeds its budget and returns the pre-built default response instead. The custom code reads the remaining time via
+get_remaining_time(), e.g. to use it as timeout of its outbound calls.
+"""
+import math
+import time
+from contextvars import (
+    ContextVar,
+    Token,
+)
+from typing import (
+    Dict,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from ondewo.logging.logger import logger_console as log
+
+
+class TimeBudgets:
+    """
+    Time budgets in seconds of the custom code per call case and per (call case, intent display name).
+    """
+
+    def __init__(self, default: Optional[float], budgets: str = "") -> None:
+        """
+        Args:
+            default (Optional[float]): budget of all calls without a more specific one, unlimited if None or <= 0
+            budgets (str): comma-separated budgets "<call case>=<seconds>" or "<call case>:<intent display
+                name>=<seconds>", e.g. "slot_filling=1.5,response_refinement:order pizza=3"
+        """
+        self.default: Optional[float] = default if default is not None and default > 0 else None
+        self._by_call_case: Dict[str, float] = {}
+        self._by_intent: Dict[Tuple[str, str], float] = {}
+        for budget in budgets.split(","):
+            if not budget.strip():
+                continue
+            key, _, seconds = budget.rpartition("=")
+            call_case, _, intent_display_name = key.strip().partition(":")
+            try:
+                value: float = float(seconds)
+            except ValueError:
+                log.error(f"TimeBudgets: ignoring invalid time budget '{budget}'")
+                continue
+            if intent_display_name:
+                self._by_intent[(call_case, intent_display_name)] = value
+            else:
+                self._by_call_case[call_case] = value
+
+    def get(self, call_case: str, intent_display_name: str) -> Optional[float]:
+        """
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+            intent_display_name (str): display name of the intent
+
+        Returns:
+            Optional[float]: the most specific budget in seconds, None if unlimited
+        """
+        budget: Optional[float] = self._by_intent.get(
+            (call_case, intent_display_name),
+            self._by_call_case.get(call_case, self.default),
+        )
+        return budget if budget is not None and budget > 0 else None
+
+
+def get_time_budget(
+    time_budgets: TimeBudgets,
+    call_case: str,
+    intent_display_name: str,
+    headers: Optional[Mapping[str, str]],
+    header_name: str,
+) -> Optional[float]:
+    """
+    Args:
+        time_budgets (TimeBudgets): configured budgets
+        call_case (str): "slot_filling" or "response_refinement"
+        intent_display_name (str): display name of the intent
+        headers (Optional[Mapping[str, str]]): headers of the request, lower case names
+        header_name (str): name of the header with the time in milliseconds ondewo-cai still waits, ignored if empty
+
+    Returns:
+        Optional[float]: the configured budget, shortened to the time of the header if it is a positive finite number;
+            None if unlimited
+    """
+    budget: Optional[float] = time_budgets.get(call_case, intent_display_name)
+    header_value: Optional[str] = headers.get(header_name.lower()) if headers and header_name else None
+    if header_value is None:
+        return budget
+    try:
+        header_budget: float = float(header_value) / 1000
+    except ValueError:
+        header_budget = math.nan
+    # "nan", "inf", 0 and negative times are no time ondewo-cai still waits
+    if not (math.isfinite(header_budget) and header_budget > 0):
+        log.warning(f"get_time_budget: ignoring invalid header {header_name}: '{header_value}'")
+        return budget
+    return header_budget if budget is None else min(budget, header_budget)
+
+
+# monotonic time the custom code of the request processed in the current task has to be finished at
+_current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+def set_deadline(budget: Optional[float]) -> Token:
+    """
+    Args:
+        budget (Optional[float]): seconds from now, no deadline if None
+
+    Returns:
+        Token: token to reset the deadline
+    """
+    return _current_deadline.set(None if budget is None else time.monotonic() + budget)
+
+
+def reset_deadline(token: Token) -> None:
+    """
+    Args:
+        token (Token): token returned by set_deadline
+    """
+    _current_deadline.reset(token)
+
+
+def get_remaining_time() -> Optional[float]:
+    """
+    Returns:
+        Optional[float]: seconds until the deadline of the request processed in the current task (<= 0 if passed),
+        None if there is no deadline
+    """
+    deadline: Optional[float] = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def get_timeout(default: Optional[float]) -> Optional[float]:
+    """
+    Args:
+        default (Optional[float]): timeout of an outbound call without deadline
+
+    Returns:
+        Optional[float]: the default timeout, shortened to the remaining time of the current request
+    """
+    remaining: Optional[float] = get_remaining_time()
+    if remaining is None:
+        return default
+    remaining = max(0.0, remaining)
+    return remaining if default is None else min(default, remaining)
@@ -0,0 +1,106 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cancellation of the custom code of a request whose client disconnected.
+
+ondewo-cai closes the connection when it gives up on a request. The custom code of the request runs in a task next
+to a watcher of the ASGI receive channel; when the watcher receives "http.disconnect" first, the task is cancelled,
+and with it the time budget, the outbound http and gRPC calls and everything else the custom code awaits. Neither
+task outlives the call of cancel_on_disconnect.
+"""
+import asyncio
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Awaitable,
+    Dict,
+    TypeVar,
+)
+
+from starlette.types import (
+    Message,
+    Receive,
+)
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The client disconnected before the custom code of its request was finished."""
+
+
+@dataclass
+class DisconnectStats:
+    """Requests of a worker whose custom code was cancelled since the client disconnected, by call case."""
+    cancelled: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, call_case: str, requests: int = 1) -> None:
+        """
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+            requests (int): number of cancelled requests
+        """
+        self.cancelled[call_case] = self.cancelled.get(call_case, 0) + requests
+
+    def to_dict(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: cancelled requests by call case
+        """
+        return dict(self.cancelled)
+
+
+disconnect_stats: DisconnectStats = DisconnectStats()
+
+
+async def wait_for_disconnect(receive: Receive) -> None:
+    """
+    Returns once the client disconnected. The body of the request has to be read before.
+
+    Args:
+        receive (Receive): ASGI receive channel of the request
+    """
+    while True:
+        message: Message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(awaitable: Awaitable[T], receive: Receive) -> T:
+    """
+    Args:
+        awaitable (Awaitable[T]): work of the request, e.g. the call of the custom code
+        receive (Receive): ASGI receive channel of the request, its body has to be read before
+
+    Returns:
+        T: the result of the awaitable
+
+    Raises:
+        ClientDisconnected: if the client disconnected first, the awaitable is cancelled
+    """
+    work: "asyncio.Future[T]" = asyncio.ensure_future(awaitable)
+    watcher: "asyncio.Task[None]" = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait((work, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # also if the caller itself is cancelled: no task outlives the call
+        work.cancel()
+        watcher.cancel()
+        await asyncio.gather(work, watcher, return_exceptions=True)
+    if work.cancelled() and not watcher.cancelled():
+        raise ClientDisconnected()
+    return work.result()
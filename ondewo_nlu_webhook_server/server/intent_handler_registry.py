@@ -0,0 +1,213 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Registry of the custom code intent handlers per call case.
+
+Handlers are registered with a decorator for the display names and/or IDs of the intents they handle, e.g.
+
+    @on_slot_filling(IntentMapping.DEFAULT_WELCOME_INTENT, "d420ff8b-8b71-41f0-9b2d-1eabcffec1ae")
+    async def welcome(active_intent: Intent, active_contexts: Optional[List[Context]], headers: ...) -> ...:
+        ...
+
+Dispatch is a dict lookup of the intent display name, falling back to the intent ID. A response_refinement handler
+can declare a cache key function and a TTL, its fulfillment messages are then served from the response cache, see
+response_cache.py.
+"""
+from enum import Enum
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+from ondewo_nlu_webhook_server.constants import (
+    CALL_CASES,
+    RESPONSE_REFINEMENT_CASE,
+    SLOT_FILLING_CASE,
+)
+from ondewo_nlu_webhook_server.server.base_models import Intent
+from ondewo_nlu_webhook_server.server.response_cache import (
+    CacheKeyFunction,
+    CachePolicy,
+)
+
+IntentHandler = Callable[..., Awaitable[Any]]
+IntentHandlerT = TypeVar("IntentHandlerT", bound=IntentHandler)
+IntentKey = Union[str, Enum]
+
+
+def get_intent_id(intent: Intent) -> str:
+    """
+    Args:
+        intent (Intent): intent with the name "projects/<PROJECT-ID>/agent/intents/<INTENT-ID>"
+
+    Returns:
+        str: the <INTENT-ID> part of the intent name
+    """
+    return intent.name.rsplit("/", 1)[-1]
+
+
+class IntentHandlerRegistry:
+    """
+    Maps the display names and IDs of intents to their handler per call case.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, Dict[str, IntentHandler]] = {call_case: {} for call_case in CALL_CASES}
+        # precomputed per call case for the cheap check whether any work has to be done for a request
+        self._handled_intents: Dict[str, FrozenSet[str]] = {call_case: frozenset() for call_case in CALL_CASES}
+        self._cache_policies: Dict[str, CachePolicy] = {}
+
+    def register(
+        self,
+        call_case: str,
+        *intents: IntentKey,
+        cache_policy: Optional[CachePolicy] = None,
+    ) -> Callable[[IntentHandlerT], IntentHandlerT]:
+        """
+        Decorator which registers the decorated coroutine function as handler of the intents for the call case.
+
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+            *intents (IntentKey): display names or IDs of the intents, either as string or as enum with string values
+            cache_policy (Optional[CachePolicy]): cache key function and TTL of the fulfillment messages of the
+                handler, only for response_refinement
+
+        Returns:
+            the decorator, which returns the handler unchanged
+
+        Raises:
+            ValueError: if the call case is unknown, no intent is given, an intent already has another handler or a
+                cache policy is given for slot_filling or with a TTL <= 0
+        """
+        if call_case not in self._handlers:
+            raise ValueError(f"Unknown call_case: {call_case}")
+        if not intents:
+            raise ValueError("At least one intent display name or intent ID is needed to register a handler.")
+        if cache_policy is not None and call_case != RESPONSE_REFINEMENT_CASE:
+            raise ValueError(f"Only {RESPONSE_REFINEMENT_CASE} handlers can be cached, not {call_case} handlers.")
+        if cache_policy is not None and cache_policy.ttl <= 0:
+            raise ValueError(f"The cache TTL must be positive, got {cache_policy.ttl}.")
+        keys = [intent.value if isinstance(intent, Enum) else intent for intent in intents]
+
+        def decorator(handler: IntentHandlerT) -> IntentHandlerT:
+            handlers: Dict[str, IntentHandler] = self._handlers[call_case]
+            for key in keys:
+                registered: Optional[IntentHandler] = handlers.get(key)
+                if registered is not None and registered is not handler:
+                    raise ValueError(
+                        f"Intent '{key}' already has the {call_case} handler '{registered.__name__}', "
+                        f"cannot register '{handler.__name__}'.",
+                    )
+                handlers[key] = handler
+                if cache_policy is not None:
+                    self._cache_policies[key] = cache_policy
+            self._handled_intents[call_case] = frozenset(handlers)
+            return handler
+
+        return decorator
+
+    def get_handler(self, call_case: str, intent: Intent) -> Optional[IntentHandler]:
+        """
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+            intent (Intent): the active intent of the request
+
+        Returns:
+            Optional[IntentHandler]: the handler registered for the display name or ID of the intent, if any
+        """
+        handlers: Optional[Dict[str, IntentHandler]] = self._handlers.get(call_case)
+        if not handlers:
+            return None
+        handler: Optional[IntentHandler] = handlers.get(intent.displayName)
+        if handler is None:
+            handler = handlers.get(get_intent_id(intent))
+        return handler
+
+    def get_cache_policy(self, call_case: str, intent: Intent) -> Optional[CachePolicy]:
+        """
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+            intent (Intent): the active intent of the request
+
+        Returns:
+            Optional[CachePolicy]: cache policy of the response_refinement handler of the intent, if it is cached
+        """
+        if call_case != RESPONSE_REFINEMENT_CASE or not self._cache_policies:
+            return None
+        cache_policy: Optional[CachePolicy] = self._cache_policies.get(intent.displayName)
+        if cache_policy is None:
+            cache_policy = self._cache_policies.get(get_intent_id(intent))
+        return cache_policy
+
+    def is_handled(self, call_case: str, intent: Intent) -> bool:
+        """
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+            intent (Intent): the active intent of the request
+
+        Returns:
+            bool: True if a handler is registered for the display name or ID of the intent
+        """
+        handled_intents: FrozenSet[str] = self._handled_intents.get(call_case, frozenset())
+        if not handled_intents:
+            return False
+        return intent.displayName in handled_intents or get_intent_id(intent) in handled_intents
+
+    def handled_intents(self, call_case: str) -> FrozenSet[str]:
+        """
+        Args:
+            call_case (str): "slot_filling" or "response_refinement"
+
+        Returns:
+            FrozenSet[str]: display names and IDs of the intents with a registered handler
+        """
+        return self._handled_intents.get(call_case, frozenset())
+
+
+intent_handler_registry: IntentHandlerRegistry = IntentHandlerRegistry()
+
+
+def on_slot_filling(*intents: IntentKey) -> Callable[[IntentHandlerT], IntentHandlerT]:
+    """Registers the decorated coroutine function as slot_filling handler of the intents."""
+    return intent_handler_registry.register(SLOT_FILLING_CASE, *intents)
+
+
+def on_response_refinement(
+    *intents: IntentKey,
+    cache_key: Optional[CacheKeyFunction] = None,
+    cache_ttl: float = 60.0,
+) -> Callable[[IntentHandlerT], IntentHandlerT]:
+    """
+    Registers the decorated coroutine function as response_refinement handler of the intents.
+
+    Args:
+        *intents (IntentKey): display names or IDs of the intents, either as string or as enum with string values
+        cache_key (Optional[CacheKeyFunction]): cache key of a request, e.g. key_by_parameters("city"); the
+            fulfillment messages of the handler are cached by it if given
+        cache_ttl (float): seconds the fulfillment messages are served from the cache
+
+    Returns:
+        the decorator, which returns the handler unchanged
+    """
+    cache_policy: Optional[CachePolicy] = (
+        CachePolicy(key=cache_key, ttl=cache_ttl) if cache_key is not None else None
+    )
+    return intent_handler_registry.register(RESPONSE_REFINEMENT_CASE, *intents, cache_policy=cache_policy)
@@ -12,33 +12,93 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from copy import deepcopy
+import asyncio
+from contextvars import (
+    ContextVar,
+    Token,
+)
+from typing import (
+    Any,
+    Awaitable,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
 
-from ondewo.logging.decorators import Timer
 from ondewo.logging.logger import logger_console as log
+from starlette.types import Receive
 
 from ondewo_nlu_webhook_server.constants import (
+    OUTCOME_CACHED,
+    OUTCOME_ERROR,
+    OUTCOME_HANDLED,
+    OUTCOME_TIMEOUT,
+    OUTCOME_UNHANDLED,
     RESPONSE_REFINEMENT_CASE,
     SLOT_FILLING_CASE,
 )
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.lazy_logging import lazy_log
 from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    IntentMessage,
     WebhookRequest,
     WebhookResponse,
 )
+from ondewo_nlu_webhook_server.server.copy_on_write import copy_contexts_on_write
+from ondewo_nlu_webhook_server.server.deadline import (
+    TimeBudgets,
+    get_time_budget,
+    reset_deadline,
+    set_deadline,
+)
+from ondewo_nlu_webhook_server.server.disconnect import (
+    ClientDisconnected,
+    cancel_on_disconnect,
+)
+from ondewo_nlu_webhook_server.server.intent_handler_registry import (
+    get_intent_id,
+    intent_handler_registry,
+)
+from ondewo_nlu_webhook_server.server.response_cache import (
+    CachePolicy,
+    response_cache,
+)
+from ondewo_nlu_webhook_server.server.session_info import (
+    SessionInfo,
+    reset_session_info,
+    set_session_info,
+)
+from ondewo_nlu_webhook_server.spans import span_recorder
 from ondewo_nlu_webhook_server_custom_integration.custom_integration import (
     response_refinement,
     slot_filling,
 )
 
-
-@Timer(
-    logger=log.info, log_arguments=False,
-    message="relay.py: call_custom_code: Elapsed time: {}",
+time_budgets: TimeBudgets = TimeBudgets(
+    default=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGET,
+    budgets=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGETS,
 )
+
+# outcome of the last call of call_custom_code in the current task, a label of the request metrics
+_custom_code_outcome: ContextVar[str] = ContextVar("custom_code_outcome", default=OUTCOME_UNHANDLED)
+
+
+def get_custom_code_outcome() -> str:
+    """
+    Returns:
+        str: outcome of the last call of call_custom_code awaited in the current task, e.g. OUTCOME_HANDLED
+    """
+    return _custom_code_outcome.get()
+
+
+@span_recorder.span("call_custom_code")
 async def call_custom_code(
     webhook_request: WebhookRequest,
     webhook_response: WebhookResponse,
     call_case: str,
+    receive: Optional[Receive] = None,
 ) -> WebhookResponse:
     """
     calls functions defined in <CUSTOM_CODE.py> for the defined <call_case>s
@@ -46,44 +106,153 @@ async def call_custom_code(
 
     Args:
         webhook_request: request sent by ondewo-cai
-        webhook_response: pre-constructed response (copy of request)
+        webhook_response: pre-constructed response (copy of request), returned unchanged if no handler is
+            registered for the intent or the custom code exceeds its time budget; holds the cached fulfillment
+            messages if the response_refinement handler of the intent is cached
         call_case: "slot_filling" or "response_refinement"
+        receive: ASGI receive channel of the request with its body read; if given, the custom code is cancelled
+            when the client disconnects
 
     Returns:
         response object
+
+    Raises:
+        ClientDisconnected: if the client disconnected before the custom code was finished
     """
-    try:
-        if call_case == SLOT_FILLING_CASE:
-            log.debug("relay.py: call_custom_code: slot_filling: START:")
-            # get parameters and active_contexts from _custom_code and relay them to the response object
-            webhook_response.outputContexts = await slot_filling(
-                active_intent=webhook_request.queryResult.intent,
-                active_contexts=webhook_request.queryResult.outputContexts,
-                headers=webhook_request.headers,
-            )
-            log.debug(
-                "relay.py: call_custom_code: slot_filling: END:"
-                f"webhook_response.outputContexts={webhook_response.outputContexts}",
-            )
+    # most intents have no custom code: skip copying and dispatching for them
+    if not intent_handler_registry.is_handled(call_case, webhook_request.queryResult.intent):
+        lazy_log.debug(
+            lambda: f"relay.py: call_custom_code: {call_case}: no handler for intent display name "
+            f"'{webhook_request.queryResult.intent.displayName}'",
+        )
+        _custom_code_outcome.set(OUTCOME_UNHANDLED)
+        return webhook_response
 
-        elif call_case == RESPONSE_REFINEMENT_CASE:
-            log.debug("relay.py: call_custom_code: response_refinement: START:")
-            webhook_response.fulfillmentMessages, webhook_response.outputContexts = await response_refinement(
-                headers=webhook_request.headers,
-                active_intent=webhook_request.queryResult.intent,
-                fulfillment_messages=webhook_request.queryResult.fulfillmentMessages,
-                active_contexts=deepcopy(webhook_request.queryResult.outputContexts),
-                parameters=webhook_request.queryResult.parameters,
-            )
-            log.debug(
-                "relay.py: call_custom_code: response_refinement: END: "
-                f"fulfillmentMessages={webhook_response} \n"
-                f"outputContexts={webhook_response.outputContexts}",
+    # deterministic response_refinement handlers are served from the response cache without calling the custom code
+    cache_policy: Optional[CachePolicy] = intent_handler_registry.get_cache_policy(
+        call_case, webhook_request.queryResult.intent,
+    )
+    cache_key: Optional[Hashable] = None
+    if cache_policy is not None:
+        cache_key = _get_cache_key(cache_policy, webhook_request)
+        cached_messages: Optional[List[Any]] = response_cache.get(cache_key) if cache_key is not None else None
+        if cached_messages is not None:
+            webhook_response.fulfillmentMessages = cached_messages
+            _custom_code_outcome.set(OUTCOME_CACHED)
+            return webhook_response
+
+    budget: Optional[float] = get_time_budget(
+        time_budgets=time_budgets,
+        call_case=call_case,
+        intent_display_name=webhook_request.queryResult.intent.displayName,
+        headers=webhook_request.headers,
+        header_name=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_TIME_BUDGET_HEADER,
+    )
+    # the contexts of the request stay unchanged in response refinement, only contexts touched by the custom code
+    # are copied; with a time budget also in slot filling, since the default response holds the contexts of the
+    # request and is returned if the custom code is cancelled
+    active_contexts: Optional[List[Context]] = (
+        copy_contexts_on_write(webhook_request.queryResult.outputContexts)
+        if call_case == RESPONSE_REFINEMENT_CASE or budget is not None
+        else webhook_request.queryResult.outputContexts
+    )
+    fulfillment_messages: Optional[List[IntentMessage]] = webhook_request.queryResult.fulfillmentMessages
+    if budget is not None and call_case == RESPONSE_REFINEMENT_CASE and fulfillment_messages:
+        # the messages are refined in place, the few messages of a response are copied for the same reason
+        fulfillment_messages = [message.model_copy(deep=True) for message in fulfillment_messages]
+
+    # available to the custom code via get_session_info() and get_remaining_time()
+    session_info_token: Token = set_session_info(SessionInfo.from_request(webhook_request, active_contexts))
+    deadline_token: Token = set_deadline(budget)
+    try:
+        custom_code: Awaitable[WebhookResponse] = _run_custom_code(
+            webhook_request=webhook_request,
+            webhook_response=webhook_response,
+            call_case=call_case,
+            active_contexts=active_contexts,
+            fulfillment_messages=fulfillment_messages,
+        )
+        if budget is not None:
+            custom_code = asyncio.wait_for(custom_code, timeout=budget)
+        if receive is not None:
+            custom_code = cancel_on_disconnect(custom_code, receive)
+        try:
+            webhook_response = await custom_code
+            _custom_code_outcome.set(OUTCOME_HANDLED)
+            if cache_policy is not None and cache_key is not None:
+                response_cache.put(cache_key, webhook_response.fulfillmentMessages, cache_policy.ttl)
+            return webhook_response
+        except asyncio.TimeoutError:
+            if budget is None:
+                raise
+            _custom_code_outcome.set(OUTCOME_TIMEOUT)
+            log.warning(
+                f"relay.py: call_custom_code: {call_case}: custom code of intent "
+                f"'{webhook_request.queryResult.intent.displayName}' exceeded its time budget of {budget:.3f}s, "
+                "returning the default response",
             )
+            return webhook_response
 
-        log.debug("relay.py: call_custom_code: response_refinement: END: ")
-        return webhook_response
+    except ClientDisconnected:
+        raise
 
     except Exception as e:
+        _custom_code_outcome.set(OUTCOME_ERROR)
         log.error(f"Error in call_custom_code: {e}")
         return webhook_response
+
+    finally:
+        reset_deadline(deadline_token)
+        reset_session_info(session_info_token)
+
+
+def _get_cache_key(cache_policy: CachePolicy, webhook_request: WebhookRequest) -> Optional[Hashable]:
+    # the key of the handler is combined with the intent, since a handler can be registered for several intents
+    try:
+        key: Optional[Hashable] = cache_policy.key(webhook_request)
+    except Exception as e:
+        log.error(f"relay.py: call_custom_code: cache key of the response could not be computed: {e}")
+        return None
+    return (get_intent_id(webhook_request.queryResult.intent), key) if key is not None else None
+
+
+async def _run_custom_code(
+    webhook_request: WebhookRequest,
+    webhook_response: WebhookResponse,
+    call_case: str,
+    active_contexts: Optional[List[Context]],
+    fulfillment_messages: Optional[List[IntentMessage]],
+) -> WebhookResponse:
+    # the response is only updated once the custom code returned, a cancelled call leaves it unchanged
+    if call_case == SLOT_FILLING_CASE:
+        log.debug("relay.py: call_custom_code: slot_filling: START:")
+        # get parameters and active_contexts from _custom_code and relay them to the response object
+        webhook_response.outputContexts = await slot_filling(
+            active_intent=webhook_request.queryResult.intent,
+            active_contexts=active_contexts,
+            headers=webhook_request.headers,
+        )
+        lazy_log.debug(
+            lambda: "relay.py: call_custom_code: slot_filling: END:"
+            f"webhook_response.outputContexts={webhook_response.outputContexts}",
+        )
+
+    elif call_case == RESPONSE_REFINEMENT_CASE:
+        log.debug("relay.py: call_custom_code: response_refinement: START:")
+        # NOTE: the custom code annotates the messages as dicts, they are IntentMessage models
+        refined: Tuple[Any, Optional[List[Context]]] = await response_refinement(
+            headers=webhook_request.headers,  # type: ignore[arg-type]
+            active_intent=webhook_request.queryResult.intent,
+            fulfillment_messages=fulfillment_messages,  # type: ignore[arg-type]
+            active_contexts=active_contexts,
+            parameters=webhook_request.queryResult.parameters,
+        )
+        webhook_response.fulfillmentMessages, webhook_response.outputContexts = refined
+        lazy_log.debug(
+            lambda: "relay.py: call_custom_code: response_refinement: END: "
+            f"fulfillmentMessages={webhook_response.fulfillmentMessages} \n"
+            f"outputContexts={webhook_response.outputContexts}",
+        )
+
+    log.debug("relay.py: call_custom_code: response_refinement: END: ")
+    return webhook_response
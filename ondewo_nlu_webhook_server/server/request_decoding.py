@@ -0,0 +1,78 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Decoding of raw webhook request bodies into validated WebhookRequest objects.
+
+ondewo-aim sends the request as a json object, whereas ondewo-nlu-cai sends the same json object wrapped into a
+json string. Both cases are decoded straight from the raw body bytes by pydantic-core without building an
+intermediate python dict and without validating the request a second time.
+"""
+import json
+from json import JSONDecodeError
+from typing import (
+    Union,
+)
+
+from fastapi import HTTPException
+from pydantic_core import ValidationError
+
+from ondewo_nlu_webhook_server.server.base_models import WebhookRequest
+
+# leading bytes which are skipped by a json parser before the first value
+_JSON_WHITESPACE: bytes = b" \t\r\n"
+_JSON_STRING_QUOTE: int = ord('"')
+
+
+def is_string_wrapped(body: bytes) -> bool:
+    """
+    Checks whether the body is a json string (e.g. '"{\\"responseId\\": ...}"') rather than a json object.
+
+    Args:
+        body (bytes): raw body of the request
+
+    Returns:
+        bool: True if the first non-whitespace byte of the body opens a json string
+    """
+    stripped: bytes = body.lstrip(_JSON_WHITESPACE)
+    return bool(stripped) and stripped[0] == _JSON_STRING_QUOTE
+
+
+def decode_webhook_request(body: bytes) -> WebhookRequest:
+    """
+    Decodes and validates the raw body of a webhook request in a single pass.
+
+    Args:
+        body (bytes): raw body of the request sent by ondewo-nlu-cai or ondewo-aim
+
+    Returns:
+        WebhookRequest: the validated webhook request
+
+    Raises:
+        HTTPException: 400 if the body is not valid json or does not match the WebhookRequest format
+    """
+    payload: Union[bytes, str] = body
+    if is_string_wrapped(body):
+        # ondewo-nlu-cai sends the request as a string, hence unwrap the string once and validate its content
+        try:
+            payload = json.loads(body)
+        except (JSONDecodeError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Invalid JSON format")
+
+    try:
+        return WebhookRequest.model_validate_json(payload)
+    except ValidationError as e:
+        if any(error["type"] == "json_invalid" for error in e.errors()):
+            raise HTTPException(status_code=400, detail="Invalid JSON format")
+        raise HTTPException(status_code=400, detail="Invalid request format")
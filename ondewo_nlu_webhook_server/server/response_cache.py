@@ -0,0 +1,159 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cache of the fulfillment messages of deterministic response_refinement handlers.
+
+A handler whose messages depend only on a few fields of the request, e.g. the intent, the language and some
+parameters, and on slowly changing external data, declares a cache key function and a TTL when it is registered:
+
+    @on_response_refinement(IntentMapping.I_OPENING_HOURS, cache_key=key_by_parameters("store"), cache_ttl=300)
+    async def opening_hours(headers, active_intent, fulfillment_messages, active_contexts, parameters) -> ...:
+        ...
+
+The relay looks up the messages before it calls the custom code and serves them from the cache on a hit, the custom
+code and its backends are not called. The contexts of the request are returned unchanged on a hit, a cached handler
+must therefore not change the contexts. Cached messages are shared by the requests of a worker and must not be
+modified.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.server.base_models import WebhookRequest
+
+# returns the cache key of a request, or None if the response of the request must not be cached
+CacheKeyFunction = Callable[[WebhookRequest], Optional[Hashable]]
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Cache key function and time to live in seconds of the responses of a handler."""
+    key: CacheKeyFunction
+    ttl: float
+
+
+@dataclass
+class CachedMessages:
+    """Fulfillment messages and the time they expire at."""
+    messages: Tuple[Any, ...]
+    expires_at: float
+
+
+def key_by_parameters(*parameter_names: str) -> CacheKeyFunction:
+    """
+    Args:
+        *parameter_names (str): names of the parameters of the query result the response depends on
+
+    Returns:
+        CacheKeyFunction: key of the language code and the string values of the parameters, the relay adds the intent
+    """
+
+    def key(webhook_request: WebhookRequest) -> Optional[Hashable]:
+        parameters: Dict[str, Any] = webhook_request.queryResult.parameters or {}
+        return (
+            webhook_request.queryResult.languageCode,
+            *(str(parameters.get(name)) for name in parameter_names),
+        )
+
+    return key
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of fulfillment messages with a TTL per entry.
+    """
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            max_entries (int): entries kept, the least recently used entry is evicted first; no caching if 0
+            clock (Callable[[], float]): monotonic clock in seconds
+        """
+        self.max_entries: int = max_entries
+        self._clock: Callable[[], float] = clock
+        self._entries: "OrderedDict[Hashable, CachedMessages]" = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[List[Any]]:
+        """
+        Args:
+            key (Hashable): cache key of the request
+
+        Returns:
+            Optional[List[Any]]: the cached fulfillment messages, None if they are not cached or expired
+        """
+        if self.max_entries <= 0:
+            return None
+        entry: Optional[CachedMessages] = self._entries.get(key)
+        if entry is None or entry.expires_at <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(entry.messages)
+
+    def put(self, key: Hashable, messages: List[Any], ttl: float) -> None:
+        """
+        Args:
+            key (Hashable): cache key of the request
+            messages (List[Any]): fulfillment messages of the response, must not be modified afterwards
+            ttl (float): seconds the messages are served from the cache
+        """
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        self._entries[key] = CachedMessages(messages=tuple(messages), expires_at=self._clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes all entries, e.g. after the external data of the cached responses changed."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: hits, misses, evictions, size and maximum size of the cache
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+        }
+
+
+response_cache: ResponseCache = ResponseCache(
+    max_entries=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_RESPONSE_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,57 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fast-path serialization of WebhookResponse objects into json bytes.
+
+The response is written directly by the serializer which pydantic-core compiled for the WebhookResponse model. This
+skips the re-validation and the jsonable_encoder pass of the FastAPI `response_model` handling. Fields set to None,
+e.g. the many unused optional fields of IntentMessage, are not written: ondewo-cai parses the response into protobuf
+messages where an absent field and a null field are equivalent.
+"""
+from typing import Any
+
+from pydantic_core import SchemaSerializer
+from starlette.responses import Response
+
+from ondewo_nlu_webhook_server.server.base_models import WebhookResponse
+
+WEBHOOK_RESPONSE_SERIALIZER: SchemaSerializer = WebhookResponse.__pydantic_serializer__
+
+
+def serialize_webhook_response(webhook_response: WebhookResponse) -> bytes:
+    """
+    Serializes a webhook response into json bytes.
+
+    Args:
+        webhook_response (WebhookResponse): response to serialize
+
+    Returns:
+        bytes: utf-8 encoded json without the fields which are None
+    """
+    # NOTE: custom code is allowed to put plain dicts into the message lists, hence the type warnings are disabled
+    return WEBHOOK_RESPONSE_SERIALIZER.to_json(webhook_response, exclude_none=True, warnings=False)
+
+
+class WebhookJSONResponse(Response):
+    """
+    Response class which renders WebhookResponse objects with the precompiled serializer.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, WebhookResponse):
+            return serialize_webhook_response(content)
+        return bytes(super().render(content))
@@ -28,15 +28,28 @@ A request is sent by ondewo-cai when an intent is matched where a webhook call i
 If server.py is called directly, it will create the server using flask itself with debugging activated.
 This is not recommended for production
 """
+import asyncio
 import json
-from json import JSONDecodeError
-from typing import Dict
+import os
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Union,
+)
 
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
     Request,
+    Response,
+)
+from fastapi.responses import (
+    PlainTextResponse,
+    StreamingResponse,
 )
 from fastapi.security import (
     HTTPBasic,
@@ -45,21 +58,112 @@ from fastapi.security import (
 )
 from ondewo.logging.decorators import Timer
 from ondewo.logging.logger import logger_console as log
-from pydantic_core import ValidationError
 from starlette import status
-
-from ondewo_nlu_webhook_server.constants import CALL_CASES
+from starlette.concurrency import run_in_threadpool
+
+from ondewo_nlu_webhook_server.constants import (
+    CALL_CASES,
+    OUTCOME_DISCONNECTED,
+    OUTCOME_ERROR,
+    OUTCOME_HANDLED,
+    OUTCOME_INVALID,
+)
 from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.lazy_logging import (
+    lazy_log,
+    payload_dump_sampler,
+)
+from ondewo_nlu_webhook_server.loop_monitor import event_loop_monitor
+from ondewo_nlu_webhook_server.metrics import (
+    metrics_registry,
+    request_duration,
+    requests_in_flight,
+)
+from ondewo_nlu_webhook_server.profiler import (
+    PROFILE_MODE_SAMPLER,
+    ProfilingInProgress,
+    profiler,
+)
+from ondewo_nlu_webhook_server.server.admission import admission_controller
 from ondewo_nlu_webhook_server.server.base_models import (
     EventInput,
     WebhookRequest,
     WebhookResponse,
 )
-from ondewo_nlu_webhook_server.server.relay import call_custom_code
+from ondewo_nlu_webhook_server.server.disconnect import (
+    ClientDisconnected,
+    disconnect_stats,
+)
+from ondewo_nlu_webhook_server.server.relay import (
+    call_custom_code,
+    get_custom_code_outcome,
+)
+from ondewo_nlu_webhook_server.server.request_decoding import decode_webhook_request
+from ondewo_nlu_webhook_server.server.response_cache import response_cache
+from ondewo_nlu_webhook_server.server.serialization import (
+    WebhookJSONResponse,
+    serialize_webhook_response,
+)
+from ondewo_nlu_webhook_server.spans import span_recorder
 from ondewo_nlu_webhook_server.version import __version__
+from ondewo_nlu_webhook_server_custom_integration.auth import (
+    intent_cache,
+    nlu_client_pool,
+    nlu_token_manager,
+)
+from ondewo_nlu_webhook_server_custom_integration.http_services import shared_http_client
 
 router = APIRouter()
 
+# region metrics: the statistics of the worker are exported as gauges of the /metrics route
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_http_client",
+    "Statistics of the pooled http client of the custom code per upstream host.",
+    ("host", "stat"),
+    lambda: (
+        ((host, stat), value)
+        for host, host_stats in shared_http_client.host_stats().items()
+        for stat, value in host_stats.items()
+    ),
+)
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_nlu_client",
+    "Calls, retries and circuit breaker trips of the NLU client pool of the custom code.",
+    ("stat",),
+    lambda: (((stat,), value) for stat, value in nlu_client_pool.stats().items()),
+)
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_nlu_intent_cache",
+    "Hits, misses and size of the intent cache of the custom code.",
+    ("stat",),
+    lambda: [(("hits",), intent_cache.hits), (("misses",), intent_cache.misses), (("size",), len(intent_cache))],
+)
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_nlu_logins",
+    "Logins of the token manager of the NLU client.",
+    (),
+    lambda: [((), nlu_token_manager.logins)],
+)
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_disconnected_requests",
+    "Requests whose custom code was cancelled since the client disconnected, by call case.",
+    ("call_case",),
+    lambda: (((call_case,), cancelled) for call_case, cancelled in disconnect_stats.to_dict().items()),
+)
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_admission",
+    "Limit, in-flight, queued, admitted and shed webhook requests of the admission control.",
+    ("stat",),
+    lambda: (((stat,), value) for stat, value in admission_controller.stats().items()),
+)
+metrics_registry.callback_gauge(
+    "ondewo_nlu_webhook_response_cache",
+    "Hits, misses, evictions and size of the cache of the responses of cached response_refinement handlers.",
+    ("stat",),
+    lambda: (((stat,), value) for stat, value in response_cache.stats().items()),
+)
+# endregion metrics
+
 # welcome message
 welcome_message: str = (
     f"Welcome to ONDEWO NLU Webhook Server Python {__version__}! "
@@ -101,15 +205,39 @@ def verify_credentials(credentials=Depends(security)) -> HTTPBasicCredentials:
 
 # endregion security: Http Basic authentication
 
-@router.post("/{call_case}", response_model=WebhookResponse)
-@Timer(logger=log.debug, log_arguments=True, message='call_case. Elapsed time: {:.5f}')
+
+def create_default_webhook_response(webhook_request: WebhookRequest) -> WebhookResponse:
+    """
+    Creates the response which is returned if the custom code does not change anything.
+
+    Args:
+        webhook_request (WebhookRequest): request sent by ondewo-cai
+
+    Returns:
+        WebhookResponse: response with the relevant fields of the request copied into it
+    """
+    return WebhookResponse(
+        fulfillmentText=webhook_request.queryResult.fulfillmentText,
+        fulfillmentMessages=(
+            webhook_request.queryResult.fulfillmentMessages
+            if webhook_request.queryResult.fulfillmentMessages else []
+        ),
+        source='',
+        payload={},
+        outputContexts=webhook_request.queryResult.outputContexts,
+        followupEventInput=EventInput(),
+    )
+
+
+@router.post("/{call_case}", response_model=WebhookResponse, response_class=WebhookJSONResponse)
+@span_recorder.span("call_case")
 async def call_case(
     call_case: str,
     request: Request,
     # NOTE: activate token or http basic credentials authentication
     # token: str = Depends(verify_token),  # type: ignore
     credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
-) -> WebhookResponse:
+) -> Response:
     """
     Handles HTTP POST requests sent to [server_address]/<call_case>.
 
@@ -137,7 +265,8 @@ async def call_case(
         credentials (HTTPBasicCredentials, optional): Basic authentication credentials for user validation.
 
     Returns:
-        WebhookResponse: A JSON object with the following structure:
+        Response: The serialized WebhookResponse, fields which are None are omitted. A JSON object with
+        the following structure:
             - **fulfillmentText**: Text of the fulfillment message (currently unused by `ondewo-cai`).
             - **fulfillmentMessages**: A list of response messages for the detected intent.
             - **source**: A string passed directly to `QueryResult.webhook_source` of `ondewo-cai`.
@@ -163,69 +292,244 @@ async def call_case(
       returned, depending on the error type.
     - If authentication fails (either Basic Authentication or token verification), a 401 Unauthorized response
       will be returned.
+    - If the client disconnects before the custom code is finished, the custom code is cancelled and an empty 499
+      response is returned, which is not received by anyone.
     """
     if call_case not in CALL_CASES:
         raise HTTPException(status_code=400, detail=f"Unknown call_case: {call_case}")
 
-    request_json: Dict
-
+    requests_in_flight.inc((call_case,))
+    start: float = time.perf_counter()
+    intent_display_name: str = ""
+    outcome: str = OUTCOME_ERROR
+    status_code: int = 500
     try:
-        request_json = await request.json()
-        log.debug(f"server.py: call_case: webhook_request={request_json}")
-    except JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
-
-    webhook_request: WebhookRequest
-    if isinstance(request_json, str):
-        # ondewo-nlu-cai sends the request as a string hence we need to load it
-        request_json_loaded: Dict = json.loads(request_json)
+        # decode the raw body once: handles both, json payloads of ondewo-aim and string-wrapped ones of
+        # ondewo-nlu-cai
+        body: bytes = await request.body()
         try:
-            webhook_request = WebhookRequest(**request_json_loaded)
-        except ValidationError:
-            raise HTTPException(status_code=400, detail="Invalid request format")
-    else:
-        # ondewo-aim sends the request as a json payload
+            webhook_request: WebhookRequest = decode_webhook_request(body)
+        except HTTPException:
+            outcome = OUTCOME_INVALID
+            raise
+
+        # set headers of request into the WebhookRequest object
+        webhook_request.headers = dict(request.headers)
+
+        webhook_response: WebhookResponse = create_default_webhook_response(webhook_request)
+
+        intent_display_name = webhook_request.queryResult.intent.displayName
+        session_id = webhook_request.session
+        lazy_log.debug(
+            lambda: f"server.py: call_case: session_id={session_id} and intent_display_name={intent_display_name}",
+        )
+
+        # dumps of whole payloads are expensive, hence they are sampled and only done for enabled debug logging
+        dump_payloads: bool = payload_dump_sampler.should_dump(intent_display_name)
+        if dump_payloads:
+            log.debug(f"server.py: call_case: webhook_request={body.decode('utf-8', errors='replace')}")
+
         try:
-            webhook_request = WebhookRequest(**request_json)
-        except ValidationError:
-            raise HTTPException(status_code=400, detail="Invalid request format")
+            webhook_response = await call_custom_code(
+                webhook_request=webhook_request,
+                webhook_response=webhook_response,
+                call_case=call_case,
+                receive=(
+                    request.receive if WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_CANCEL_ON_DISCONNECT else None
+                ),
+            )
+            outcome = get_custom_code_outcome()
+        except ClientDisconnected:
+            outcome = OUTCOME_DISCONNECTED
+            status_code = 499
+            disconnect_stats.count(call_case)
+            log.info(
+                f"server.py: call_case: client disconnected, cancelled the custom code of session_id={session_id} "
+                f"and intent_display_name={intent_display_name}",
+            )
+            # 499: client closed request
+            return Response(status_code=499)
+
+        status_code = 200
+        if dump_payloads:
+            log.debug(f"webhook_response.model_dump_json(): {json.dumps(webhook_response.model_dump(), indent=2)}")
+        # write the response with the precompiled serializer instead of re-validating it via the response_model
+        return WebhookJSONResponse(content=webhook_response)
+
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+
+    finally:
+        requests_in_flight.dec((call_case,))
+        request_duration.observe(
+            (call_case, intent_display_name, outcome, str(status_code)), time.perf_counter() - start,
+        )
 
-    # get the webhook request object form the fastapi request
-    if not WebhookRequest.model_validate(webhook_request):
-        raise HTTPException(status_code=400, detail="Invalid WebhookRequest format")
 
-    # set headers of request into the WebhookRequest object
-    webhook_request.headers = dict(request.headers)
+@router.post("/batch/{call_case}", response_class=StreamingResponse)
+@span_recorder.span("batch_call_case")
+async def batch_call_case(
+    call_case: str,
+    request: Request,
+    # NOTE: activate token or http basic credentials authentication
+    # token: str = Depends(verify_token),  # type: ignore
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> StreamingResponse:
+    """
+    Handles HTTP POST requests sent to [server_address]/batch/<call_case>.
 
-    webhook_response: WebhookResponse = WebhookResponse(
-        fulfillmentText=webhook_request.queryResult.fulfillmentText,
-        fulfillmentMessages=(
-            webhook_request.queryResult.fulfillmentMessages
-            if webhook_request.queryResult.fulfillmentMessages else []
-        ),
-        source='',
-        payload={},
-        outputContexts=webhook_request.queryResult.outputContexts,
-        followupEventInput=EventInput(),
-    )
+    The body holds newline-delimited json (NDJSON), one WebhookRequest per line. The custom code is run for all
+    requests concurrently, bounded by `ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BATCH_MAX_CONCURRENCY`, and one WebhookResponse
+    per line is streamed back in the order of the requests. Authentication and the request headers apply to all
+    requests of the batch. Meant for offline reprocessing and load tests, which thereby pay for the HTTP round trip,
+    the authentication and the dependency resolution once per batch instead of once per request. Every request of the
+    batch is recorded in the metrics like a request of the `call_case` route, the batch itself as a request of the
+    call case "batch/<call_case>" which lasts until the last response is streamed.
 
-    intent_display_name = webhook_request.queryResult.intent.displayName
-    session_id = webhook_request.session
-    log.debug(f"server.py: call_case: session_id={session_id} and intent_display_name={intent_display_name}")
+    Args:
+        call_case (str): The processing type to be performed, see `call_case`.
+        request (Request): The request object with the NDJSON body.
+        credentials (HTTPBasicCredentials, optional): Basic authentication credentials for user validation.
 
-    webhook_response = await call_custom_code(
-        webhook_request=webhook_request,
-        webhook_response=webhook_response,
-        call_case=call_case,
-    )
+    Returns:
+        StreamingResponse: NDJSON stream of the WebhookResponses, fields which are None are omitted.
 
-    if not WebhookResponse.model_validate(webhook_response):
-        raise HTTPException(status_code=500, detail="Invalid response format")
+    **Error Handling**:
+    - If an invalid `call_case` is provided, a 400 HTTP response is returned.
+    - If any line is not a valid WebhookRequest, a 400 HTTP response naming the line is returned and no request of
+      the batch is processed.
+    """
+    if call_case not in CALL_CASES:
+        raise HTTPException(status_code=400, detail=f"Unknown call_case: {call_case}")
+
+    # the batch is recorded as request of the call case "batch/<call_case>", its requests as ones of the call case
+    batch_call_case: str = f"batch/{call_case}"
+    requests_in_flight.inc((batch_call_case,))
+    start: float = time.perf_counter()
+    outcome: str = OUTCOME_ERROR
+    status_code: int = 500
+    streamed: bool = False
+    try:
+        body: bytes = await request.body()
+        headers: Dict[str, str] = dict(request.headers)
+
+        webhook_requests: List[WebhookRequest] = []
+        for line_number, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                webhook_request: WebhookRequest = decode_webhook_request(line)
+            except HTTPException as e:
+                outcome = OUTCOME_INVALID
+                status_code = e.status_code
+                raise HTTPException(status_code=e.status_code, detail=f"{e.detail} in line {line_number}")
+            webhook_request.headers = headers
+            webhook_requests.append(webhook_request)
+
+        log.debug(f"server.py: batch_call_case: call_case={call_case} and number of requests={len(webhook_requests)}")
+        streamed = True
+        return StreamingResponse(
+            stream_batch_responses(batch_call_case, call_case, webhook_requests, start),
+            media_type="application/x-ndjson",
+        )
+    finally:
+        # the stream records the batch while it is running, a batch which is never streamed processes no request
+        requests_in_flight.dec((batch_call_case,))
+        if not streamed:
+            request_duration.observe((batch_call_case, "", outcome, str(status_code)), time.perf_counter() - start)
 
-    log.debug(
-        f"webhook_response.model_dump_json(): {json.dumps(webhook_response.model_dump(), indent=2)}",
-    )
-    return webhook_response
+
+async def process_batch_request(
+    call_case: str,
+    webhook_request: WebhookRequest,
+    semaphore: asyncio.Semaphore,
+) -> WebhookResponse:
+    """
+    Runs the custom code for a request of a batch and records it like a request of the call_case route, without the
+    time waiting for the semaphore.
+
+    Args:
+        call_case (str): call case of the batch
+        webhook_request (WebhookRequest): the request
+        semaphore (asyncio.Semaphore): bounds the requests of the batch processed concurrently
+
+    Returns:
+        WebhookResponse: the response of the custom code
+    """
+    async with semaphore:
+        requests_in_flight.inc((call_case,))
+        start: float = time.perf_counter()
+        outcome: str = OUTCOME_ERROR
+        status_code: int = 500
+        try:
+            webhook_response: WebhookResponse = await call_custom_code(
+                webhook_request=webhook_request,
+                webhook_response=create_default_webhook_response(webhook_request),
+                call_case=call_case,
+            )
+            outcome = get_custom_code_outcome()
+            status_code = 200
+            return webhook_response
+        except asyncio.CancelledError:
+            outcome = OUTCOME_DISCONNECTED
+            status_code = 499
+            raise
+        finally:
+            requests_in_flight.dec((call_case,))
+            request_duration.observe(
+                (call_case, webhook_request.queryResult.intent.displayName, outcome, str(status_code)),
+                time.perf_counter() - start,
+            )
+
+
+@span_recorder.span("batch_call_case_stream")
+async def stream_batch_responses(
+    batch_call_case: str,
+    call_case: str,
+    webhook_requests: List[WebhookRequest],
+    start: float,
+) -> AsyncIterator[bytes]:
+    """
+    Processes the requests of a batch concurrently, streams their responses in the order of the requests and records
+    the batch when the stream ends. The requests are only started by the stream, hence they are cancelled by it if
+    it ends early, e.g. because the client disconnected.
+
+    Args:
+        batch_call_case (str): call case label of the batch, "batch/<call_case>"
+        call_case (str): call case of the requests of the batch
+        webhook_requests (List[WebhookRequest]): the requests
+        start (float): time.perf_counter() of the start of the batch
+
+    Yields:
+        bytes: one serialized WebhookResponse per line
+    """
+    requests_in_flight.inc((batch_call_case,))
+    outcome: str = OUTCOME_ERROR
+    status_code: int = 500
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BATCH_MAX_CONCURRENCY)
+    tasks: List["asyncio.Task[WebhookResponse]"] = []
+    try:
+        tasks.extend(
+            asyncio.ensure_future(process_batch_request(call_case, webhook_request, semaphore))
+            for webhook_request in webhook_requests
+        )
+        # responses are yielded in input order, later requests may already be finished and wait for their turn
+        for task in tasks:
+            yield serialize_webhook_response(await task) + b"\n"
+        outcome = OUTCOME_HANDLED
+        status_code = 200
+    finally:
+        # the client disconnected before the stream was finished
+        cancelled: int = sum(not task.done() for task in tasks)
+        if cancelled:
+            disconnect_stats.count(call_case, cancelled)
+            outcome = OUTCOME_DISCONNECTED
+            status_code = 499
+        for task in tasks:
+            task.cancel()
+        requests_in_flight.dec((batch_call_case,))
+        request_duration.observe((batch_call_case, "", outcome, str(status_code)), time.perf_counter() - start)
 
 
 # async def index(_: str = Depends(get_current_user)) -> Dict[str, str]:
@@ -241,3 +545,146 @@ async def index() -> Dict[str, str]:
 @router.get("/health")
 def health_check() -> Dict[str, str]:
     return {"status": "ok"}
+
+
+@router.post("/admin/profile")
+async def profile_worker(
+    mode: str = PROFILE_MODE_SAMPLER,
+    duration: float = 10.0,
+    interval: float = 0.005,
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Response:
+    """
+    Profiles the live traffic of the worker which receives the request for `duration` seconds, e.g.
+    POST /admin/profile?mode=sampler&duration=30 returns collapsed stacks for flamegraph.pl or speedscope,
+    POST /admin/profile?mode=cprofile&duration=30 returns a pstats dump for pstats.Stats, snakeviz or flameprof.
+    """
+    try:
+        result: bytes = await profiler.profile(mode=mode, duration=duration, interval=interval)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ProfilingInProgress as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    pid: int = os.getpid()
+    if mode == PROFILE_MODE_SAMPLER:
+        filename, media_type = f"worker-{pid}.collapsed", "text/plain; charset=utf-8"
+    else:
+        filename, media_type = f"worker-{pid}.prof", "application/octet-stream"
+    return Response(
+        content=result,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Worker-Pid": str(pid)},
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> PlainTextResponse:
+    """
+    Metrics of all workers in the Prometheus text format: latency histograms of the webhook requests per call case,
+    intent, outcome and status code, requests in flight, latencies of the outbound calls of the custom code and the
+    statistics of its clients.
+    """
+    # the snapshot is taken in the event loop which records the metrics, the files are read in a thread
+    snapshot: Dict[str, Any] = metrics_registry.snapshot()
+    text: str = await run_in_threadpool(metrics_registry.render, snapshot)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/stats/http_client")
+def http_client_stats(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, Dict[str, Union[int, float]]]:
+    """
+    Statistics of the pooled http client of the custom code per upstream host of this worker.
+    """
+    return shared_http_client.host_stats()
+
+
+@router.get("/stats/nlu_client")
+def nlu_client_stats(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, int]:
+    """
+    Counters of the calls, retries and circuit breaker trips of the NLU client pool of the custom code of this worker.
+    """
+    return nlu_client_pool.stats()
+
+
+@router.get("/stats/disconnects")
+def disconnect_statistics(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, int]:
+    """
+    Requests of this worker per call case whose custom code was cancelled since the client disconnected.
+    """
+    return disconnect_stats.to_dict()
+
+
+@router.get("/stats/admission")
+def admission_statistics(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, Union[int, float]]:
+    """
+    Current limit, in-flight and queued webhook requests and the admitted and shed requests of this worker.
+    """
+    return admission_controller.stats()
+
+
+@router.get("/stats/event_loop")
+def event_loop_statistics(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, Union[int, float, str]]:
+    """
+    Maximum lag of the event loop of this worker, the times it was blocked and the stack of the last blocking call.
+    """
+    return event_loop_monitor.stats()
+
+
+@router.get("/stats/response_cache")
+def response_cache_statistics(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, int]:
+    """
+    Hits, misses, evictions and size of the cache of the responses of cached response_refinement handlers of this
+    worker.
+    """
+    return response_cache.stats()
+
+
+@router.delete("/admin/response_cache")
+def clear_response_cache(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, int]:
+    """
+    Removes the cached responses of this worker, e.g. after the external data of the cached handlers changed.
+    """
+    response_cache.clear()
+    return response_cache.stats()
+
+
+@router.get("/stats/spans")
+def span_statistics(
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, Any]:
+    """
+    Count, mean and maximum duration of the most recent spans of the hot path of this worker by name, and the modules
+    whose functions record spans.
+    """
+    return {"modules": span_recorder.modules(), "spans": span_recorder.summary()}
+
+
+@router.put("/admin/spans/{module}")
+def set_spans_enabled(
+    module: str,
+    enabled: bool,
+    credentials: HTTPBasicCredentials = Depends(verify_credentials),  # type:ignore
+) -> Dict[str, bool]:
+    """
+    Switches the spans of the functions of a module on or off in this worker, e.g.
+    PUT /admin/spans/ondewo_nlu_webhook_server.server.relay?enabled=false
+    """
+    span_recorder.set_enabled(module, enabled)
+    return span_recorder.modules()
@@ -0,0 +1,202 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per request information about the session and the active contexts.
+
+The session and the context names are parsed once per request, e.g. for a context named
+"projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>/contexts/<CONTEXT-NAME>" the short name is <CONTEXT-NAME>. The
+relay makes the SessionInfo of the request being processed available to the custom code via get_session_info().
+"""
+import re
+from contextvars import (
+    ContextVar,
+    Token,
+)
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    WebhookRequest,
+)
+
+SESSION_PATTERN: Pattern[str] = re.compile(r"projects/(?P<project_id>[^/]+)(?:/agent)?/sessions/(?P<session_id>[^/]+)")
+
+
+def get_context_short_name(context_name: str) -> str:
+    """
+    Args:
+        context_name (str): full name of a context
+
+    Returns:
+        str: the last path segment of the context name
+    """
+    return context_name.rsplit("/", 1)[-1]
+
+
+def parse_session(session: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Args:
+        session (str): session or context name containing "projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>"
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: project ID and session ID, None if not found
+    """
+    match: Optional[re.Match] = SESSION_PATTERN.search(session)
+    if match is None:
+        return None, None
+    return match.group("project_id"), match.group("session_id")
+
+
+class SessionInfo:
+    """
+    Project and session ID of a request and indexes of its active contexts by short name and by parameter name.
+
+    Lookups return the contexts from the list handed to the custom code, hence changes made to them are part of the
+    response. The indexes are built from the contexts at the start of the request: contexts added later by the custom
+    code are not found, removing or reordering contexts rebuilds the indexes on the next lookup.
+    """
+
+    def __init__(self, session: str, contexts: Optional[List[Context]]) -> None:
+        """
+        Args:
+            session (str): session of the request
+            contexts (Optional[List[Context]]): active contexts as handed to the custom code
+        """
+        self.session: str = session
+        self.project_id: Optional[str]
+        self.session_id: Optional[str]
+        self.project_id, self.session_id = parse_session(session)
+        self._contexts: List[Context] = contexts if contexts is not None else []
+        if self.session_id is None and self._contexts:
+            self.project_id, self.session_id = parse_session(self._raw_context(0).name)
+        self._positions_by_short_name: Dict[str, int] = {}
+        self._positions_by_parameter: Dict[str, List[int]] = {}
+        self._build_indexes()
+
+    @classmethod
+    def from_request(cls, webhook_request: WebhookRequest, contexts: Optional[List[Context]] = None) -> 'SessionInfo':
+        """
+        Args:
+            webhook_request (WebhookRequest): the request
+            contexts (Optional[List[Context]]): active contexts as handed to the custom code, the output contexts of
+                the request if None
+
+        Returns:
+            SessionInfo: session info of the request
+        """
+        return cls(
+            session=webhook_request.session,
+            contexts=contexts if contexts is not None else webhook_request.queryResult.outputContexts,
+        )
+
+    def _raw_context(self, position: int) -> Context:
+        # bypasses a copy-on-write list, reading the name of a context must not copy it
+        return list.__getitem__(self._contexts, position)
+
+    def _build_indexes(self) -> None:
+        self._positions_by_short_name.clear()
+        self._positions_by_parameter.clear()
+        for position in range(len(self._contexts)):
+            context: Context = self._raw_context(position)
+            self._positions_by_short_name.setdefault(get_context_short_name(context.name), position)
+            for parameter_name in dict.keys(context.parameters):
+                self._positions_by_parameter.setdefault(parameter_name, []).append(position)
+
+    def _is_valid(self, position: int, short_name: str) -> bool:
+        return position < len(self._contexts) and (
+            get_context_short_name(self._raw_context(position).name) == short_name
+        )
+
+    def get_context(self, short_name: str) -> Optional[Context]:
+        """
+        Args:
+            short_name (str): short name of the context, e.g. "my-context"
+
+        Returns:
+            Optional[Context]: the active context with the short name
+        """
+        position: Optional[int] = self._positions_by_short_name.get(short_name)
+        if position is not None and not self._is_valid(position, short_name):
+            self._build_indexes()
+            position = self._positions_by_short_name.get(short_name)
+        return self._contexts[position] if position is not None else None
+
+    def get_contexts_with_parameter(self, parameter_name: str) -> List[Context]:
+        """
+        Args:
+            parameter_name (str): name of a parameter
+
+        Returns:
+            List[Context]: the active contexts holding the parameter
+        """
+        positions: List[int] = self._positions_by_parameter.get(parameter_name, [])
+        if any(
+            position >= len(self._contexts) or parameter_name not in self._raw_context(position).parameters
+            for position in positions
+        ):
+            self._build_indexes()
+            positions = self._positions_by_parameter.get(parameter_name, [])
+        return [self._contexts[position] for position in positions]
+
+    def create_context_name(self, short_name: str) -> str:
+        """
+        Args:
+            short_name (str): short name of the new context, e.g. "my-context-999"
+
+        Returns:
+            str: "projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>/contexts/<short_name>"
+
+        Raises:
+            ValueError: if neither the session nor an active context contains the project and session ID
+        """
+        if self.project_id is None or self.session_id is None:
+            raise ValueError(f"Could not parse the project and session ID of the session '{self.session}'.")
+        return f"projects/{self.project_id}/agent/sessions/{self.session_id}/contexts/{short_name}"
+
+
+_current_session_info: ContextVar[Optional[SessionInfo]] = ContextVar("current_session_info", default=None)
+
+
+def set_session_info(session_info: Optional[SessionInfo]) -> Token:
+    """
+    Args:
+        session_info (Optional[SessionInfo]): session info of the request processed in the current task
+
+    Returns:
+        Token: token to reset the session info
+    """
+    return _current_session_info.set(session_info)
+
+
+def reset_session_info(token: Token) -> None:
+    """
+    Args:
+        token (Token): token returned by set_session_info
+    """
+    _current_session_info.reset(token)
+
+
+def get_session_info() -> Optional[SessionInfo]:
+    """
+    Returns:
+        Optional[SessionInfo]: session info of the request processed in the current task, None outside of a request
+    """
+    return _current_session_info.get()
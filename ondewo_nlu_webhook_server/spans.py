@@ -0,0 +1,246 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Low-overhead timing of the functions on the hot path of the webhook requests.
+
+A function decorated with @span_recorder.span() records one span per call: the id of its name, its start and its
+duration from time.perf_counter_ns() are written into preallocated ring buffers of the worker, and the duration is
+observed by the histogram ondewo_nlu_webhook_span_duration_seconds of the /metrics route. No strings are formatted,
+except for every n-th span if the sampled debug log is enabled. Unlike the Timer decorator of ondewo-logging, the
+span of a coroutine function covers the execution of the coroutine, not only its creation, and concurrent calls do not
+share a start time. The span of an async generator function covers the iteration until the generator is exhausted or
+closed, e.g. the streaming of a response.
+
+Spans are switched on and off per module of the decorated functions at runtime, e.g.
+
+    span_recorder.set_enabled("ondewo_nlu_webhook_server.server.relay", False)
+"""
+import asyncio
+import functools
+import inspect
+import time
+from contextlib import aclosing
+from array import array
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.metrics import (
+    Histogram,
+    metrics_registry,
+)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class _Switch:
+    """Mutable flag of a module, read by the decorated functions of the module on every call."""
+    __slots__ = ("enabled",)
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled: bool = enabled
+
+
+class SpanRecorder:
+    """
+    Ring buffers of the most recent spans of a worker and the switches of the modules whose functions record spans.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 4096,
+        disabled_modules: FrozenSet[str] = frozenset(),
+        log_sample_rate: int = 0,
+        histogram: Optional[Histogram] = None,
+    ) -> None:
+        """
+        Args:
+            capacity (int): number of spans kept, older spans are overwritten
+            disabled_modules (FrozenSet[str]): modules whose functions record no spans initially
+            log_sample_rate (int): every n-th span is written to the debug log, none if 0
+            histogram (Optional[Histogram]): histogram with the label "span" which observes the durations in seconds
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity: int = capacity
+        self.log_sample_rate: int = log_sample_rate
+        self._histogram: Optional[Histogram] = histogram
+        self._switches: Dict[str, _Switch] = {module: _Switch(False) for module in disabled_modules}
+        self._names: List[str] = []
+        self._name_ids: "array[int]" = array("I", bytes(4 * capacity))
+        self._starts: "array[int]" = array("q", bytes(8 * capacity))
+        self._durations: "array[int]" = array("q", bytes(8 * capacity))
+        self._recorded: int = 0
+
+    def span(self, name: Optional[str] = None) -> Callable[[F], F]:
+        """
+        Decorator of a function or coroutine function which records a span per call.
+
+        Args:
+            name (Optional[str]): name of the spans, the qualified name of the function if None
+
+        Returns:
+            Callable[[F], F]: the decorator
+        """
+
+        def decorator(function: F) -> F:
+            switch: _Switch = self._switches.setdefault(function.__module__, _Switch(True))
+            name_id: int = len(self._names)
+            self._names.append(name or function.__qualname__)
+            record: Callable[[int, int, int], None] = self.record
+
+            if inspect.isasyncgenfunction(function):
+                @functools.wraps(function)
+                async def async_generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    enabled: bool = switch.enabled
+                    start: int = time.perf_counter_ns()
+                    try:
+                        # closing the wrapper, e.g. when a client disconnects, closes the generator at once
+                        async with aclosing(function(*args, **kwargs)) as generator:
+                            async for item in generator:
+                                yield item
+                    finally:
+                        if enabled:
+                            record(name_id, start, time.perf_counter_ns() - start)
+
+                return cast(F, async_generator_wrapper)
+
+            if asyncio.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    if not switch.enabled:
+                        return await function(*args, **kwargs)
+                    start: int = time.perf_counter_ns()
+                    try:
+                        return await function(*args, **kwargs)
+                    finally:
+                        record(name_id, start, time.perf_counter_ns() - start)
+
+                return cast(F, async_wrapper)
+
+            @functools.wraps(function)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not switch.enabled:
+                    return function(*args, **kwargs)
+                start: int = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(name_id, start, time.perf_counter_ns() - start)
+
+            return cast(F, wrapper)
+
+        return decorator
+
+    def record(self, name_id: int, start: int, duration: int) -> None:
+        """
+        Args:
+            name_id (int): index of the name of the span
+            start (int): start of the span in nanoseconds of time.perf_counter_ns()
+            duration (int): duration of the span in nanoseconds
+        """
+        index: int = self._recorded % self.capacity
+        self._name_ids[index] = name_id
+        self._starts[index] = start
+        self._durations[index] = duration
+        self._recorded += 1
+        if self._histogram is not None:
+            self._histogram.observe((self._names[name_id],), duration / 1e9)
+        if self.log_sample_rate and self._recorded % self.log_sample_rate == 0:
+            log.debug(f"SpanRecorder: {self._names[name_id]} took {duration / 1e6:.3f}ms")
+
+    def is_enabled(self, module: str) -> bool:
+        """
+        Args:
+            module (str): name of a module, e.g. "ondewo_nlu_webhook_server.server.relay"
+
+        Returns:
+            bool: True if the decorated functions of the module record spans
+        """
+        switch: Optional[_Switch] = self._switches.get(module)
+        return switch is None or switch.enabled
+
+    def set_enabled(self, module: str, enabled: bool) -> None:
+        """
+        Args:
+            module (str): name of a module, e.g. "ondewo_nlu_webhook_server.server.relay"
+            enabled (bool): whether the decorated functions of the module record spans
+        """
+        self._switches.setdefault(module, _Switch(enabled)).enabled = enabled
+
+    def modules(self) -> Dict[str, bool]:
+        """
+        Returns:
+            Dict[str, bool]: the known modules and whether they record spans
+        """
+        return {module: switch.enabled for module, switch in sorted(self._switches.items())}
+
+    def spans(self) -> List[Tuple[str, int, int]]:
+        """
+        Returns:
+            List[Tuple[str, int, int]]: name, start and duration in nanoseconds of the kept spans, oldest first
+        """
+        indices: range = (
+            range(self._recorded) if self._recorded <= self.capacity
+            else range(self._recorded - self.capacity, self._recorded)
+        )
+        return [
+            (
+                self._names[self._name_ids[index % self.capacity]],
+                self._starts[index % self.capacity],
+                self._durations[index % self.capacity],
+            )
+            for index in indices
+        ]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            Dict[str, Dict[str, float]]: count, mean and maximum duration in milliseconds of the kept spans by name
+        """
+        durations: Dict[str, List[int]] = {}
+        for name, _, duration in self.spans():
+            durations.setdefault(name, []).append(duration)
+        return {
+            name: {
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values) / 1e6, 3),
+                "max_ms": round(max(values) / 1e6, 3),
+            }
+            for name, values in sorted(durations.items())
+        }
+
+
+span_recorder: SpanRecorder = SpanRecorder(
+    capacity=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_CAPACITY,
+    disabled_modules=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_DISABLED_MODULES,
+    log_sample_rate=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_SPANS_LOG_SAMPLE_RATE,
+    histogram=metrics_registry.histogram(
+        "ondewo_nlu_webhook_span_duration_seconds",
+        "Duration of the functions on the hot path of the webhook requests by span name.",
+        ("span",),
+    ),
+)
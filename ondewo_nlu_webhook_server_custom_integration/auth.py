@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 import os
 from typing import (
     Any,
@@ -21,66 +20,34 @@ from typing import (
     Tuple,
 )
 
-import grpc  # type: ignore
 from ondewo.logging.logger import logger_console as log
 from ondewo.nlu import intent_pb2
-from ondewo.nlu.client import Client as NluClient
-from ondewo.nlu.client_config import ClientConfig
 
-from ondewo_nlu_webhook_server.server.base_models import (
-    GetIntentRequest,
-    LoginRequest,
-    LoginResponse,
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.lazy_logging import lazy_log
+from ondewo_nlu_webhook_server_custom_integration.grpc_resilience import (
+    CircuitBreaker,
+    RetryPolicy,
+)
+from ondewo_nlu_webhook_server_custom_integration.intent_cache import IntentCache
+from ondewo_nlu_webhook_server_custom_integration.nlu_client_pool import AsyncNluClientPool
+from ondewo_nlu_webhook_server_custom_integration.token_manager import (
+    FileTokenStore,
+    TokenManager,
 )
 
 ONDEWO_NLU_CAI_GRPC_CERT: str = os.getenv('ONDEWO_NLU_CAI_GRPC_CERT', '').strip()
 ONDEWO_NLU_CAI_HOST: str = os.getenv('ONDEWO_NLU_CAI_HOST', '').strip()
 ONDEWO_NLU_CAI_HTTP_BASIC_AUTH_TOKEN: str = os.getenv('ONDEWO_NLU_CAI_HTTP_BASIC_AUTH_TOKEN', '').strip()
+ONDEWO_NLU_CAI_KEYCLOAK_CLIENT_ID: str = os.getenv('ONDEWO_NLU_CAI_KEYCLOAK_CLIENT_ID', '').strip()
+ONDEWO_NLU_CAI_KEYCLOAK_REALM: str = os.getenv('ONDEWO_NLU_CAI_KEYCLOAK_REALM', '').strip()
+ONDEWO_NLU_CAI_KEYCLOAK_URL: str = os.getenv('ONDEWO_NLU_CAI_KEYCLOAK_URL', '').strip()
 ONDEWO_NLU_CAI_PORT: str = os.getenv('ONDEWO_NLU_CAI_PORT', '').strip()
 ONDEWO_NLU_CAI_USER_NAME: str = os.getenv('ONDEWO_NLU_CAI_USER_NAME', '').strip()
 ONDEWO_NLU_CAI_USER_PASS: str = os.getenv('ONDEWO_NLU_CAI_USER_PASS', '').strip()
 
 ONDEWO_BPI_CAI_MAX_MESSAGE_LENGTH: int = 10 * 1024 * 1024
 
-service_config_json: str = json.dumps(
-    {
-        "methodConfig": [
-            {
-                "name": [
-                    # To apply retry to all methods, put [{}] as a value in the "name" field
-                    {},
-                    # List single  rpc method call
-                    # {"service": "ondewo.nlu.Agents", "method": "GetAgent"},
-                    # {"service": "ondewo.nlu.Agents", "method": "ListAgents"},
-                    # {"service": "ondewo.nlu.Contexts", "method": "CreateContext"},
-                    # {"service": "ondewo.nlu.Contexts", "method": "ListContexts"},
-                    # {"service": "ondewo.nlu.Contexts", "method": "UpdateContext"},
-                    # {"service": "ondewo.nlu.Sessions", "method": "CreateSession"},
-                    # {"service": "ondewo.nlu.Sessions", "method": "DetectIntent"},
-                    # {"service": "ondewo.nlu.Users", "method": "Login"},
-                ],
-                "retryPolicy": {
-                    "maxAttempts": 100,
-                    "initialBackoff": "0.1s",
-                    "maxBackoff": "30s",
-                    "backoffMultiplier": 2,
-                    "retryableStatusCodes": [
-                        grpc.StatusCode.CANCELLED.name,
-                        grpc.StatusCode.UNKNOWN.name,
-                        grpc.StatusCode.DEADLINE_EXCEEDED.name,
-                        grpc.StatusCode.NOT_FOUND.name,
-                        grpc.StatusCode.RESOURCE_EXHAUSTED.name,
-                        grpc.StatusCode.ABORTED.name,
-                        grpc.StatusCode.INTERNAL.name,
-                        grpc.StatusCode.UNAVAILABLE.name,
-                        grpc.StatusCode.DATA_LOSS.name,
-                    ],
-                },
-            },
-        ],
-    },
-)
-
 options: Set[Tuple[str, Any]] = {
     ("grpc.max_send_message_length", ONDEWO_BPI_CAI_MAX_MESSAGE_LENGTH),
     ("grpc.max_receive_message_length", ONDEWO_BPI_CAI_MAX_MESSAGE_LENGTH),
@@ -91,74 +58,132 @@ options: Set[Tuple[str, Any]] = {
     ("grpc.http2.max_pings_without_data", 4),
     # Example arg requested for the feature
     ("grpc.dns_enable_srv_queries", 1),
-    ("grpc.enable_retries", 1),
-    ("grpc.service_config", service_config_json),
+    # retries are made by the RetryInterceptor of the pool: bounded by the deadline, a retry budget and a circuit
+    # breaker, and only for transient status codes
+    ("grpc.enable_retries", 0),
 }
 
-nlu_client_config: ClientConfig = ClientConfig(
-    host=ONDEWO_NLU_CAI_HOST,
-    port=ONDEWO_NLU_CAI_PORT,
-    http_token=ONDEWO_NLU_CAI_HTTP_BASIC_AUTH_TOKEN,
-    user_name=ONDEWO_NLU_CAI_USER_NAME,
-    password=ONDEWO_NLU_CAI_USER_PASS,
+# channels are opened lazily by the first call of a worker, hence importing this module opens no connection
+nlu_client_pool: AsyncNluClientPool = AsyncNluClientPool(
+    host_and_port=f"{ONDEWO_NLU_CAI_HOST}:{ONDEWO_NLU_CAI_PORT}",
+    size=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_POOL_SIZE,
+    timeout=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_TIMEOUT,
+    grpc_cert=ONDEWO_NLU_CAI_GRPC_CERT,
+    options=sorted(options),
+    metadata=[("authorization", ONDEWO_NLU_CAI_HTTP_BASIC_AUTH_TOKEN)] if ONDEWO_NLU_CAI_HTTP_BASIC_AUTH_TOKEN else [],
+    retry_policy=RetryPolicy(max_attempts=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_MAX_ATTEMPTS),
+    retry_budget_ratio=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_RETRY_BUDGET_RATIO,
+    circuit_breaker=CircuitBreaker(
+        failure_threshold=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_CIRCUIT_BREAKER_FAILURES,
+        reset_timeout=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_CLIENT_CIRCUIT_BREAKER_RESET_TIMEOUT,
+    ),
+    keycloak_url=ONDEWO_NLU_CAI_KEYCLOAK_URL,
+    realm=ONDEWO_NLU_CAI_KEYCLOAK_REALM,
+    client_id=ONDEWO_NLU_CAI_KEYCLOAK_CLIENT_ID,
+)
+
+
+async def _login_for_token() -> str:
+    return await login()
+
+
+# the token is cached per worker and shared by the workers through a file, refreshed before it expires
+nlu_token_manager: TokenManager = TokenManager(
+    login=_login_for_token,
+    refresh_margin=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_REFRESH_MARGIN,
+    default_ttl=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_TTL,
+    store=(
+        FileTokenStore(WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_FILE)
+        if WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_TOKEN_FILE else None
+    ),
+    on_token=nlu_client_pool.set_auth_token,
 )
 
-nlu_client: NluClient = NluClient(
-    config=nlu_client_config,
-    use_secure_channel=True if nlu_client_config.grpc_cert else False,
-    options=options,  # Pass the gRPC options here
+
+def start_token_refresh() -> None:
+    """
+    Starts the background login and token refresh of the worker if an NLU user is configured. The login needs
+    Keycloak, without it the refresh is not started and a single error is logged instead of a failed login per retry.
+    """
+    if not ONDEWO_NLU_CAI_USER_NAME:
+        return
+    if not nlu_client_pool.supports_login:
+        log.error(
+            "The NLU user is configured but Keycloak is not, hence no auth token is requested: set "
+            "ONDEWO_NLU_CAI_KEYCLOAK_URL, ONDEWO_NLU_CAI_KEYCLOAK_REALM and ONDEWO_NLU_CAI_KEYCLOAK_CLIENT_ID.",
+        )
+        return
+    nlu_token_manager.start()
+
+
+# intents by (name, language code), warmed up with one ListIntents call per configured agent and language
+intent_cache: IntentCache = IntentCache(
+    nlu_client_pool=nlu_client_pool,
+    ttl=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_TTL,
+    agents=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_AGENTS,
+    language_codes=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_NLU_INTENT_CACHE_LANGUAGE_CODES,
 )
 
 
-def login() -> Optional[LoginResponse]:
+async def get_auth_token() -> str:
+    """
+    Returns:
+        str: the cached auth token of the NLU login, only logs in if there is no valid token
+    """
+    return await nlu_token_manager.get_token()
+
+
+async def login(timeout: Optional[float] = None) -> str:
     """Logs into the ONDEWO NLU service.
 
-    Sends a login request to authenticate the user and retrieves the authentication token.
+    Requests an access token of the user from the Keycloak of ONDEWO NLU. Every call is a round trip to Keycloak, use
+    get_auth_token() for the cached token.
+
+    Args:
+        timeout (Optional[float]): timeout of the request in seconds, the default timeout of the pool if None
 
     Returns:
-        Optional[LoginResponse]: The login response containing the authentication token if successful.
+        str: The access token, sent as bearer token with the calls to ONDEWO NLU.
 
     Raises:
-        ValueError: If login fails due to missing or invalid response data.
+        ValueError: If Keycloak is not configured.
+        KeycloakAuthenticationError: If Keycloak rejects the login.
     """
     log.info("Attempting to log in.")
     try:
-        login_response: LoginResponse = nlu_client.services.users.login(
-            request=LoginRequest(  # type: ignore
-                userEmail=nlu_client_config.user_name,
-                password=nlu_client_config.password,
-            ),
+        access_token: str = await nlu_client_pool.login(
+            user_name=ONDEWO_NLU_CAI_USER_NAME,
+            password=ONDEWO_NLU_CAI_USER_PASS,
+            timeout=timeout,
         )
-        if not login_response or not login_response.authToken:
-            raise ValueError("Login response or auth token is missing.")
         log.info("Login successful.")
-        return login_response
+        return access_token
 
     except Exception as loginException:
         log.error(f"Login failed: {loginException}")
         raise
 
 
-def get_intent() -> Optional[intent_pb2.Intent]:
+async def get_intent(
+    name: str = "projects/<example_project_id>/agent/intents/<example_intent_name>",
+    language_code: str = "de-DE",
+) -> Optional[intent_pb2.Intent]:
     """Retrieves intent information from the ONDEWO NLU service.
 
-    Calls the GetIntent API with a specific intent ID and language code.
+    Reads the intent with its training phrases and parameters from the intent cache, which calls the GetIntent API
+    only if the intent is not cached or expired. The returned intent is shared and must not be modified.
 
-    Returns:
-        Optional[Dict[str, Any]]: The JSON response from the API if the request is successful, None otherwise.
+    Args:
+        name (str): "projects/<PROJECT-ID>/agent/intents/<INTENT-ID>"
+        language_code (str): language code of the intent
 
-    Raises:
-        Exception: If the API request fails.
+    Returns:
+        Optional[intent_pb2.Intent]: The intent if the request is successful, None otherwise.
     """
-    log.info("Fetching intent information.")
     try:
-        nlu_request: GetIntentRequest = GetIntentRequest(
-            name="projects/<example_project_id>/agent/intents/<example_intent_name>",
-            languageCode="de-DE",
-        )
-        intent: intent_pb2.Intent = nlu_client.services.intents.get_intent(request=nlu_request)  # type: ignore
-        log.debug(f"Intent response: {intent}")
-        log.info("Successfully fetched intent information.")
+        intent: intent_pb2.Intent = await intent_cache.get(name=name, language_code=language_code)
+        # formatting the intent is expensive, it is only done if the debug level is enabled
+        lazy_log.debug(lambda: f"Intent response: {intent}")
         return intent
 
     except Exception as getIntentException:
@@ -29,8 +29,12 @@ There are 2 cases for CUSTOM_CODE.py to be executed after a webhook request:
     last minute check can be used to overhaul the fulfillment messages that were generated when all parameters were
     already supplied
 
-Intents where either slot_filling() or response_refinement() are used need to be supplied to the list <active_intents>
-    for the custom code to be called. Either the displayName or the intent ID need to be in the list.
+Handlers for intents are registered per case with the decorators @on_slot_filling(...) and @on_response_refinement(...)
+    for the custom code to be called. Either the displayName or the intent ID can be used to register a handler.
+    slot_filling() and response_refinement() dispatch to the registered handler of the active intent.
+
+Inside a handler, get_session_info() from ondewo_nlu_webhook_server.server.session_info returns the project and session
+    ID of the request and finds active contexts by short name or by parameter name without scanning active_contexts.
 
 """
 from enum import Enum
@@ -42,13 +46,23 @@ from typing import (
     Tuple,
 )
 
-from ondewo.logging.decorators import Timer
 from ondewo.logging.logger import logger_console as log
 
+from ondewo_nlu_webhook_server.constants import (
+    RESPONSE_REFINEMENT_CASE,
+    SLOT_FILLING_CASE,
+)
 from ondewo_nlu_webhook_server.server.base_models import (
     Context,
     Intent,
 )
+from ondewo_nlu_webhook_server.server.intent_handler_registry import (
+    IntentHandler,
+    intent_handler_registry,
+    on_response_refinement,
+    on_slot_filling,
+)
+from ondewo_nlu_webhook_server.spans import span_recorder
 from ondewo_nlu_webhook_server_custom_integration.utils.helpers import replace_placeholder_in_text
 
 
@@ -71,7 +85,7 @@ class IntentMapping(Enum):
 
 # region CASE 1: Slot Filling
 
-@Timer(logger=log.debug, log_arguments=True, message='slot_filling. Elapsed time: {:.5f}')
+@span_recorder.span("slot_filling")
 async def slot_filling(
     active_intent: Intent,
     active_contexts: Optional[List[Context]] = None,
@@ -79,7 +93,7 @@ async def slot_filling(
 ) -> Optional[List[Context]]:
     """
     slot_filling() is called when the request was posted to [server-IP]/slot_filling and
-        the detected intent is found in the <active_intents> list
+        dispatches to the handler registered with @on_slot_filling(...) for the detected intent
     <response> holds a copy of the request message from ondewo-cai
     <headers> holds the header(s) sent with the request
 
@@ -105,6 +119,13 @@ async def slot_filling(
     ######## YOUR CODE HERE ########
     ################################
 
+    Register a handler with the same signature as slot_filling() per intent, e.g.
+
+    @on_slot_filling(IntentMapping.I_EXAMPLE_MY_DATE)
+    async def my_date(active_intent, active_contexts, headers) -> Optional[List[Context]]:
+        ...
+        return active_contexts
+
     # Example: list active context names
     name_list = []
     for context in active_contexts:
@@ -126,18 +147,30 @@ async def slot_filling(
         )
     )
     """
-    if active_intent.displayName in {IntentMapping.DEFAULT_WELCOME_INTENT.value}:  # TODO: Example Intent, use yours
-        log.debug(f"slot_filling: Intent handler called for intent display name '{active_intent.displayName}'")
-
-    elif active_intent.displayName in {IntentMapping.I_EXAMPLE_THANKS_GOOD.value}:  # TODO: Example Intent, use yours
-        log.debug(f"slot_filling: Intent handler called for intent display name '{active_intent.displayName}'")
+    handler: Optional[IntentHandler] = intent_handler_registry.get_handler(SLOT_FILLING_CASE, active_intent)
+    if handler is None:
+        log.debug(f"slot_filling: No handler for intent display name '{active_intent.displayName}'")
+        return active_contexts
 
-    elif active_intent.displayName in {IntentMapping.I_EXAMPLE_MY_DATE.value}:  # TODO: Example Intent, use yours
-        log.debug(f"slot_filling: Intent handler called for intent display name '{active_intent.displayName}'")
+    active_contexts = await handler(
+        active_intent=active_intent,
+        active_contexts=active_contexts,
+        headers=headers,
+    )
+    return active_contexts
 
-    else:
-        log.debug(f"slot_filling: No handler for intent display name '{active_intent.displayName}'")
 
+@on_slot_filling(
+    IntentMapping.DEFAULT_WELCOME_INTENT,  # TODO: Example Intent, use yours
+    IntentMapping.I_EXAMPLE_THANKS_GOOD,  # TODO: Example Intent, use yours
+    IntentMapping.I_EXAMPLE_MY_DATE,  # TODO: Example Intent, use yours
+)
+async def slot_filling_example(
+    active_intent: Intent,
+    active_contexts: Optional[List[Context]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[List[Context]]:
+    log.debug(f"slot_filling: Intent handler called for intent display name '{active_intent.displayName}'")
     return active_contexts
 
 
@@ -145,7 +178,7 @@ async def slot_filling(
 
 # region CASE 2: Response Refinement
 
-@Timer(logger=log.debug, log_arguments=True, message='response_refinement. Elapsed time: {:.5f}')
+@span_recorder.span("response_refinement")
 async def response_refinement(
     headers: Dict[str, str],
     active_intent: Intent,
@@ -155,7 +188,7 @@ async def response_refinement(
 ) -> Tuple[List[Dict[str, Any]], Optional[List[Context]]]:
     """
     response_refinement() is called when the request was posted to [server-IP]/response_refinement and
-        the detected intent is found in the <active_intents> list
+        dispatches to the handler registered with @on_response_refinement(...) for the detected intent
 
     Changes that can be accomplished here:
         changes to fulfillment messages
@@ -183,6 +216,19 @@ async def response_refinement(
     ######## YOUR CODE HERE ########
     ################################
 
+    Register a handler with the same signature as response_refinement() per intent, e.g.
+
+    @on_response_refinement(IntentMapping.I_EXAMPLE_WEBREQUEST)
+    async def webrequest(headers, active_intent, fulfillment_messages, active_contexts, parameters) -> Tuple[...]:
+        ...
+        return fulfillment_messages, active_contexts
+
+    Example: serve the messages of a handler which depend only on the intent, the language and the parameter "city"
+    from the response cache for 5 minutes
+
+    from ondewo_nlu_webhook_server.server.response_cache import key_by_parameters
+    @on_response_refinement(IntentMapping.I_EXAMPLE_WEBREQUEST, cache_key=key_by_parameters("city"), cache_ttl=300)
+
     Example: add text message
 
     from custom_code_helpers.helpers import add_text_to_fulfillment
@@ -197,26 +243,54 @@ async def response_refinement(
         "response text override by webhook server"
     )
     """
-    if active_intent.displayName in {IntentMapping.DEFAULT_WELCOME_INTENT.value}:
-        log.debug(f"response_refinement: Intent handler called for intent display name '{active_intent.displayName}'")
-
-    elif active_intent.displayName in {IntentMapping.I_EXAMPLE_THANKS_GOOD.value}:  # TODO: Example Intent, use yours
-        log.debug(f"response_refinement: Intent handler called for intent display name '{active_intent.displayName}'")
-
-    elif active_intent.displayName in {IntentMapping.I_EXAMPLE_WEBREQUEST.value}:  # TODO: Example Intent, use yours
-        fulfillment_messages = replace_placeholder_in_text(
-            fulfillment_messages=fulfillment_messages,
-            replace_text="<EXAMPLE_PLACEHOLDER>",  # TODO: Example placeholder, use yours
-            active_intent=active_intent,
-            parameters=parameters,
-        )
-    elif active_intent.displayName in {IntentMapping.DEFAULT_FALLBACK_INTENT.value}:
-        # IDEA: possible request to LLM or RAG system
-        pass
-
-    else:
+    handler: Optional[IntentHandler] = intent_handler_registry.get_handler(RESPONSE_REFINEMENT_CASE, active_intent)
+    if handler is None:
         log.debug(f"response_refinement: No handler for intent display name '{active_intent.displayName}'")
+        return fulfillment_messages, active_contexts
+
+    fulfillment_messages, active_contexts = await handler(
+        headers=headers,
+        active_intent=active_intent,
+        fulfillment_messages=fulfillment_messages,
+        active_contexts=active_contexts,
+        parameters=parameters,
+    )
+    return fulfillment_messages, active_contexts
+
 
+@on_response_refinement(
+    IntentMapping.DEFAULT_WELCOME_INTENT,
+    IntentMapping.I_EXAMPLE_THANKS_GOOD,  # TODO: Example Intent, use yours
+)
+async def response_refinement_example(
+    headers: Dict[str, str],
+    active_intent: Intent,
+    fulfillment_messages: List[Dict[str, Any]],
+    active_contexts: Optional[List[Context]],
+    parameters: Optional[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Optional[List[Context]]]:
+    log.debug(f"response_refinement: Intent handler called for intent display name '{active_intent.displayName}'")
     return fulfillment_messages, active_contexts
 
+
+@on_response_refinement(IntentMapping.I_EXAMPLE_WEBREQUEST)  # TODO: Example Intent, use yours
+async def response_refinement_webrequest(
+    headers: Dict[str, str],
+    active_intent: Intent,
+    fulfillment_messages: List[Dict[str, Any]],
+    active_contexts: Optional[List[Context]],
+    parameters: Optional[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Optional[List[Context]]]:
+    fulfillment_messages = await replace_placeholder_in_text(
+        fulfillment_messages=fulfillment_messages,
+        replace_text="<EXAMPLE_PLACEHOLDER>",  # TODO: Example placeholder, use yours
+        active_intent=active_intent,
+        parameters=parameters,
+        active_contexts=active_contexts,
+    )
+    return fulfillment_messages, active_contexts
+
+
+# IDEA: register a handler for IntentMapping.DEFAULT_FALLBACK_INTENT, e.g. for a request to a LLM or RAG system
+
 # endregion CASE 2: Response Refinement
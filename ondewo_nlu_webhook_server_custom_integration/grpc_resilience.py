@@ -0,0 +1,310 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Retries of the unary gRPC calls to ondewo-nlu which are bounded by the deadline of the call, a retry budget and a
+circuit breaker.
+
+    - A call is only retried for transient status codes, and only while the deadline of the call leaves time for the
+      backoff and another attempt: a retry never extends a call beyond its deadline.
+    - The retry budget of a channel is a token bucket. Every call adds retry_ratio tokens and every retry takes one,
+      hence retries are limited to about retry_ratio of the calls and cannot multiply the load of a failing backend.
+    - The circuit breaker opens after failure_threshold consecutive failed calls. A call which exceeds its deadline only
+      counts as failed if its timeout was at least the default timeout of the client: a call whose deadline was
+      shortened to the remaining time of the webhook request may exceed it although the backend is healthy. While the
+      breaker is open, calls fail at once with UNAVAILABLE instead of waiting for their deadline. After reset_timeout
+      one call probes the backend and closes the breaker again if it succeeds. A probe which fails or ends without an
+      answer, e.g. because it was cancelled, opens the breaker again and another call probes after reset_timeout.
+"""
+import asyncio
+import random
+import time
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Optional,
+)
+
+import grpc  # type: ignore
+from ondewo.logging.logger import logger_console as log
+
+# transient status codes, the request was not processed and can be sent again
+RETRYABLE_STATUS_CODES: FrozenSet[grpc.StatusCode] = frozenset({
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+})
+
+# status codes which indicate an unhealthy backend, other codes except DEADLINE_EXCEEDED are answers of a healthy
+# backend; DEADLINE_EXCEEDED depends on the timeout of the call, see RetryInterceptor
+FAILURE_STATUS_CODES: FrozenSet[grpc.StatusCode] = frozenset({
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.INTERNAL,
+})
+
+
+@dataclass
+class RetryStats:
+    """Counters of the retries and of the circuit breaker of a client."""
+    calls: int = 0
+    retries: int = 0
+    retries_denied_by_budget: int = 0
+    retries_denied_by_deadline: int = 0
+    circuit_breaker_trips: int = 0
+    circuit_breaker_rejections: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: the counters by name
+        """
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Attempts and exponential backoff with full jitter of the retries."""
+    max_attempts: int = 3
+    initial_backoff: float = 0.05
+    max_backoff: float = 1.0
+    backoff_multiplier: float = 2.0
+
+    def backoff(self, retry: int) -> float:
+        """
+        Args:
+            retry (int): number of the retry, starting at 1
+
+        Returns:
+            float: seconds to wait before the retry
+        """
+        return random.uniform(0, min(self.max_backoff, self.initial_backoff * self.backoff_multiplier ** (retry - 1)))
+
+
+class RetryBudget:
+    """
+    Token bucket of the retries of a channel.
+    """
+
+    def __init__(self, retry_ratio: float, max_tokens: float = 10.0) -> None:
+        """
+        Args:
+            retry_ratio (float): tokens added per call, i.e. the share of the calls which may be retried
+            max_tokens (float): capacity of the bucket, i.e. the retries of a burst of failures
+        """
+        self.retry_ratio: float = retry_ratio
+        self.max_tokens: float = max_tokens
+        self.tokens: float = max_tokens
+
+    def deposit(self) -> None:
+        """Adds the tokens of a call."""
+        self.tokens = min(self.max_tokens, self.tokens + self.retry_ratio)
+
+    def try_withdraw(self) -> bool:
+        """
+        Returns:
+            bool: True if the bucket held a token for a retry, which is taken
+        """
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of the calls to a backend, closed, open or half-open.
+    """
+
+    CLOSED: str = "closed"
+    OPEN: str = "open"
+    HALF_OPEN: str = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        stats: Optional[RetryStats] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            failure_threshold (int): consecutive failed calls which open the breaker
+            reset_timeout (float): seconds the breaker stays open before one call probes the backend
+            stats (Optional[RetryStats]): counters of the trips and rejected calls
+            clock (Callable[[], float]): monotonic clock in seconds
+        """
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.stats: RetryStats = stats if stats is not None else RetryStats()
+        self._clock: Callable[[], float] = clock
+        self.state: str = self.CLOSED
+        self._consecutive_failures: int = 0
+        self._opened_at: float = 0.0
+
+    def allow(self) -> bool:
+        """
+        Returns:
+            bool: True if a call may be sent; after the reset timeout only the probing call is allowed
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        self.stats.circuit_breaker_rejections += 1
+        return False
+
+    def record_success(self) -> None:
+        """Closes the breaker."""
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+
+    def abandon_probe(self) -> None:
+        """Opens the breaker again after the probing call ended without an answer, e.g. because it was cancelled."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+
+    def record_failure(self) -> None:
+        """Counts a failed call and opens the breaker after failure_threshold consecutive ones or a failed probe."""
+        self._consecutive_failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self._consecutive_failures >= self.failure_threshold
+        ):
+            if self.state == self.CLOSED:
+                self.stats.circuit_breaker_trips += 1
+                log.warning(f"CircuitBreaker: opened after {self._consecutive_failures} consecutive failures.")
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+
+
+class RetryInterceptor(grpc.aio.UnaryUnaryClientInterceptor):  # type: ignore[misc]
+    """
+    Interceptor of a channel which retries unary calls within their deadline, the retry budget and the circuit breaker.
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        budget: RetryBudget,
+        circuit_breaker: CircuitBreaker,
+        stats: RetryStats,
+        default_timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            policy (RetryPolicy): attempts and backoff
+            budget (RetryBudget): retry budget of the channel
+            circuit_breaker (CircuitBreaker): circuit breaker of the backend, shared by its channels
+            stats (RetryStats): counters of the retries
+            default_timeout (Optional[float]): default timeout of the calls in seconds, a call with at least this
+                timeout which exceeds its deadline counts as failed; exceeded deadlines never count if None
+            clock (Callable[[], float]): monotonic clock in seconds
+        """
+        self.policy: RetryPolicy = policy
+        self.budget: RetryBudget = budget
+        self.circuit_breaker: CircuitBreaker = circuit_breaker
+        self.stats: RetryStats = stats
+        self.default_timeout: Optional[float] = default_timeout
+        self._clock: Callable[[], float] = clock
+
+    async def intercept_unary_unary(
+        self,
+        continuation: Callable[[grpc.aio.ClientCallDetails, Any], Any],
+        client_call_details: grpc.aio.ClientCallDetails,
+        request: Any,
+    ) -> Any:
+        self.stats.calls += 1
+        self.budget.deposit()
+        deadline: Optional[float] = (
+            None if client_call_details.timeout is None else self._clock() + client_call_details.timeout
+        )
+        attempt: int = 1
+        while True:
+            if not self.circuit_breaker.allow():
+                raise grpc.aio.AioRpcError(
+                    code=grpc.StatusCode.UNAVAILABLE,
+                    initial_metadata=grpc.aio.Metadata(),
+                    trailing_metadata=grpc.aio.Metadata(),
+                    details="Circuit breaker of the NLU client is open.",
+                )
+            # only the probing call is allowed while the breaker is half-open
+            probe: bool = self.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+            timeout: Optional[float] = None if deadline is None else deadline - self._clock()
+            try:
+                response: Any = await (await continuation(self._with_timeout(client_call_details, timeout), request))
+            except grpc.aio.AioRpcError as error:
+                if self._is_failure(error, client_call_details.timeout):
+                    self.circuit_breaker.record_failure()
+                elif error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    # neither a failure nor an answer of the backend
+                    if probe:
+                        self.circuit_breaker.abandon_probe()
+                else:
+                    self.circuit_breaker.record_success()
+                backoff: Optional[float] = self._get_backoff(error, attempt, deadline)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            except BaseException:
+                # e.g. cancelled: without an answer a probe would leave the breaker half-open and reject all calls
+                if probe:
+                    self.circuit_breaker.abandon_probe()
+                raise
+            self.circuit_breaker.record_success()
+            return response
+
+    def _is_failure(self, error: grpc.aio.AioRpcError, timeout: Optional[float]) -> bool:
+        # whether the error of a call with the given timeout indicates an unhealthy backend
+        if error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            return self.default_timeout is not None and timeout is not None and timeout >= self.default_timeout
+        return error.code() in FAILURE_STATUS_CODES
+
+    def _get_backoff(self, error: grpc.aio.AioRpcError, attempt: int, deadline: Optional[float]) -> Optional[float]:
+        # seconds to wait before the next attempt, None if the call is not retried
+        if error.code() not in RETRYABLE_STATUS_CODES or attempt >= self.policy.max_attempts:
+            return None
+        backoff: float = self.policy.backoff(attempt)
+        # the backoff and at least as much time for the next attempt have to fit into the deadline
+        if deadline is not None and self._clock() + 2 * backoff >= deadline:
+            self.stats.retries_denied_by_deadline += 1
+            return None
+        if not self.budget.try_withdraw():
+            self.stats.retries_denied_by_budget += 1
+            return None
+        self.stats.retries += 1
+        return backoff
+
+    @staticmethod
+    def _with_timeout(
+        client_call_details: grpc.aio.ClientCallDetails,
+        timeout: Optional[float],
+    ) -> grpc.aio.ClientCallDetails:
+        return grpc.aio.ClientCallDetails(
+            method=client_call_details.method,
+            timeout=timeout,
+            metadata=client_call_details.metadata,
+            credentials=client_call_details.credentials,
+            wait_for_ready=client_call_details.wait_for_ready,
+        )
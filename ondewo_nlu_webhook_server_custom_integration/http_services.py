@@ -12,8 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""
+HTTP requests of the custom code to backend services.
+
+All requests of a worker share one pooled httpx.AsyncClient, hence connections (including their TLS sessions) are kept
+alive and reused across requests and conversation turns. The client is started and closed by the lifespan of the app,
+see ondewo_nlu_webhook_server/server/__main__.py. Connection limits, keep-alive, timeouts and HTTP/2 are configured in
+WebhookGlobals.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import (
+    asdict,
+    dataclass,
+)
 from typing import (
     Any,
+    Awaitable,
+    Callable,
     Dict,
     List,
     Optional,
@@ -22,6 +39,150 @@ from typing import (
 
 import httpx
 from fastapi import HTTPException
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server.metrics import outbound_call_duration
+from ondewo_nlu_webhook_server.server.deadline import get_remaining_time
+
+
+@dataclass
+class HostStats:
+    """Statistics of the requests to one upstream host."""
+    requests: int = 0
+    failed_requests: int = 0
+    in_flight_requests: int = 0
+    # new connections to the host; requests minus opened connections were served by a pooled connection
+    opened_connections: int = 0
+    total_seconds: float = 0.0
+
+
+class SharedHttpClient:
+    """
+    Pooled httpx.AsyncClient shared by all requests of a worker, with per upstream host statistics.
+    """
+
+    def __init__(
+        self,
+        limits: httpx.Limits,
+        timeout: httpx.Timeout,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        """
+        Args:
+            limits (httpx.Limits): connection limits and keep-alive of the pool
+            timeout (httpx.Timeout): default timeouts of the requests
+            http2 (bool): whether HTTP/2 is negotiated with the upstreams
+            transport (Optional[httpx.AsyncBaseTransport]): transport replacing the connection pool, e.g. in tests
+        """
+        self._limits: httpx.Limits = limits
+        self._timeout: httpx.Timeout = timeout
+        self._http2: bool = http2
+        self._transport: Optional[httpx.AsyncBaseTransport] = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_stats: Dict[str, HostStats] = defaultdict(HostStats)
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=self._limits,
+            timeout=self._timeout,
+            http2=self._http2,
+            transport=self._transport,
+        )
+
+    async def start(self) -> None:
+        """Creates the client, called on startup of the app."""
+        if self._client is None:
+            self._client = self._create_client()
+
+    async def close(self) -> None:
+        """Closes the client and its pooled connections, called on shutdown of the app."""
+        client, self._client = self._client, None
+        if client is not None:
+            log.debug(f"SharedHttpClient: closing, upstream host statistics: {self.host_stats()}")
+            await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # outside of the lifespan of the app, e.g. in scripts or tests, the client is created on first use
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def host_stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """
+        Returns:
+            Dict[str, Dict[str, Union[int, float]]]: statistics of the requests per upstream host
+        """
+        return {host: asdict(stats) for host, stats in self._host_stats.items()}
+
+    def _create_trace(self, stats: HostStats) -> Callable[[str, Dict[str, Any]], Awaitable[None]]:
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                stats.opened_connections += 1
+
+        return trace
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        Sends a request with the pooled client and records it in the statistics of the upstream host. Without an
+        explicit timeout, the timeouts are shortened to the remaining time of the webhook request being processed.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL of the request
+            **kwargs (Any): further arguments of httpx.AsyncClient.request
+
+        Returns:
+            httpx.Response: the response
+        """
+        remaining: Optional[float] = get_remaining_time()
+        if remaining is not None and "timeout" not in kwargs:
+            # no phase of the request may wait beyond the deadline of the webhook request
+            kwargs["timeout"] = httpx.Timeout(
+                **{
+                    phase: max(0.0, remaining) if seconds is None else min(seconds, max(0.0, remaining))
+                    for phase, seconds in self._timeout.as_dict().items()
+                },
+            )
+        host: str = httpx.URL(url).host
+        stats: HostStats = self._host_stats[host]
+        stats.requests += 1
+        stats.in_flight_requests += 1
+        outcome: str = "error"
+        start: float = time.perf_counter()
+        try:
+            response: httpx.Response = await self.client.request(
+                method, url, extensions={"trace": self._create_trace(stats)}, **kwargs,
+            )
+            outcome = f"{response.status_code // 100}xx"
+            return response
+        except httpx.HTTPError:
+            stats.failed_requests += 1
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            seconds: float = time.perf_counter() - start
+            stats.in_flight_requests -= 1
+            stats.total_seconds += seconds
+            outbound_call_duration.observe(("http", host, outcome), seconds)
+
+
+shared_http_client: SharedHttpClient = SharedHttpClient(
+    limits=httpx.Limits(
+        max_connections=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_KEEPALIVE_EXPIRY,
+    ),
+    timeout=httpx.Timeout(
+        WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_TIMEOUT,
+        connect=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_CONNECT_TIMEOUT,
+    ),
+    http2=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_HTTP_CLIENT_HTTP2,
+)
 
 
 async def make_http_request(
@@ -52,46 +213,45 @@ async def make_http_request(
         HTTPException: If the server returns an error status code (other than 200 or 201) or if the response
         cannot be parsed as JSON.
     """
-    async with httpx.AsyncClient() as client:
-        # Determine the HTTP method and make the request
-        if method.lower() == "post":
-            if json_payload is None:
-                # POST request without a JSON payload
-                response = await client.post(url, headers=headers, params=params)
-            elif params is None:
-                # POST request without params
-                response = await client.post(url, data=json_payload, headers=headers)
-            else:
-                # POST request with a JSON payload
-                response = await client.post(url, json=json_payload, params=params)
-        elif method.lower() == "get":
-            # GET request
-            response = await client.get(url, headers=headers, params=params)
-        elif method.lower() == "delete":
-            # DELETE request
-            response = await client.delete(url, headers=headers, params=params)
-        elif method.lower() == "put":
-            # PUT request with JSON payload, if applicable
-            response = await client.put(
-                url, headers=headers, params=params, json=json_payload,
-            )
-        else:
-            # Raise an exception if an unsupported method is provided
-            raise HTTPException(status_code=405, detail=f"Unsupported HTTP method: {method}")
-
-        # Check if the response is successful (status codes 200 or 201)
-        if response.status_code in {200, 201}:
-            try:
-                # Attempt to parse the response as JSON and return it
-                return response.json()  # type:ignore
-            except ValueError:
-                # Raise an exception if the response body is not valid JSON
-                raise HTTPException(
-                    status_code=500, detail="Invalid JSON response from server.",
-                )
+    # Determine the HTTP method and make the request
+    if method.lower() == "post":
+        if json_payload is None:
+            # POST request without a JSON payload
+            response = await shared_http_client.request("POST", url, headers=headers, params=params)
+        elif params is None:
+            # POST request without params
+            response = await shared_http_client.request("POST", url, data=json_payload, headers=headers)
         else:
-            # Raise an exception for unsuccessful responses, including the status code and server message
+            # POST request with a JSON payload
+            response = await shared_http_client.request("POST", url, json=json_payload, params=params)
+    elif method.lower() == "get":
+        # GET request
+        response = await shared_http_client.request("GET", url, headers=headers, params=params)
+    elif method.lower() == "delete":
+        # DELETE request
+        response = await shared_http_client.request("DELETE", url, headers=headers, params=params)
+    elif method.lower() == "put":
+        # PUT request with JSON payload, if applicable
+        response = await shared_http_client.request(
+            "PUT", url, headers=headers, params=params, json=json_payload,
+        )
+    else:
+        # Raise an exception if an unsupported method is provided
+        raise HTTPException(status_code=405, detail=f"Unsupported HTTP method: {method}")
+
+    # Check if the response is successful (status codes 200 or 201)
+    if response.status_code in {200, 201}:
+        try:
+            # Attempt to parse the response as JSON and return it
+            return response.json()  # type:ignore
+        except ValueError:
+            # Raise an exception if the response body is not valid JSON
             raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed request with status: {response.status_code}, message: {response.text}",
+                status_code=500, detail="Invalid JSON response from server.",
             )
+    else:
+        # Raise an exception for unsuccessful responses, including the status code and server message
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed request with status: {response.status_code}, message: {response.text}",
+        )
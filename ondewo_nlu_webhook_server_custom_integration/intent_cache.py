@@ -0,0 +1,190 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-memory cache of the intents of ondewo-nlu, e.g. for their training phrases and parameter definitions.
+
+The intents are cached by (intent name, language code). At startup the cache is warmed with one ListIntents call per
+agent and language, and the warm-up is repeated in the background before the cached intents expire. An intent which
+is missing or older than the TTL, e.g. one created after the warm-up, is fetched with GetIntent; concurrent requests
+for the same intent share one call.
+
+The cached intents are shared by all requests of a worker and must not be modified, copy them with
+intent_pb2.Intent().CopyFrom(intent) first.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from ondewo.logging.logger import logger_console as log
+from ondewo.nlu import intent_pb2
+
+from ondewo_nlu_webhook_server_custom_integration.nlu_client_pool import AsyncNluClientPool
+from ondewo_nlu_webhook_server_custom_integration.single_flight import SingleFlight
+
+IntentKey = Tuple[str, str]
+
+
+@dataclass
+class CachedIntent:
+    """Intent and the time it was fetched at."""
+    intent: intent_pb2.Intent
+    fetched_at: float
+
+
+class IntentCache:
+    """
+    TTL cache of the intents by (intent name, language code) with bulk warm-up per agent.
+    """
+
+    def __init__(
+        self,
+        nlu_client_pool: AsyncNluClientPool,
+        ttl: float,
+        agents: Sequence[str] = (),
+        language_codes: Sequence[str] = (),
+        retry_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            nlu_client_pool (AsyncNluClientPool): client of ondewo-nlu
+            ttl (float): seconds an intent is served from the cache
+            agents (Sequence[str]): agents warmed up at startup, e.g. "projects/<PROJECT-ID>/agent"
+            language_codes (Sequence[str]): languages of the intents warmed up at startup, e.g. "de-DE"
+            retry_interval (float): seconds the background warm-up waits after it failed
+            clock (Callable[[], float]): monotonic clock in seconds
+        """
+        self._nlu_client_pool: AsyncNluClientPool = nlu_client_pool
+        self.ttl: float = ttl
+        self.agents: Tuple[str, ...] = tuple(agents)
+        self.language_codes: Tuple[str, ...] = tuple(language_codes)
+        self.retry_interval: float = retry_interval
+        self._clock: Callable[[], float] = clock
+        self._entries: Dict[IntentKey, CachedIntent] = {}
+        self._fetches: SingleFlight[IntentKey, intent_pb2.Intent] = SingleFlight()
+        self._background_task: Optional["asyncio.Task[None]"] = None
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def warm_up(self, agent: str, language_code: str) -> int:
+        """
+        Caches all intents of an agent in a language with one bulk call (one per page of the response).
+
+        Args:
+            agent (str): "projects/<PROJECT-ID>/agent"
+            language_code (str): language code, e.g. "de-DE"
+
+        Returns:
+            int: number of cached intents
+        """
+        intents: List[intent_pb2.Intent] = await self._nlu_client_pool.list_intents(
+            agent=agent,
+            language_code=language_code,
+            intent_view=intent_pb2.IntentView.INTENT_VIEW_FULL,
+        )
+        fetched_at: float = self._clock()
+        for intent in intents:
+            self._entries[(intent.name, language_code)] = CachedIntent(intent=intent, fetched_at=fetched_at)
+        log.info(f"IntentCache: cached {len(intents)} intents of {agent} in {language_code}.")
+        return len(intents)
+
+    async def get(self, name: str, language_code: str) -> intent_pb2.Intent:
+        """
+        Args:
+            name (str): "projects/<PROJECT-ID>/agent/intents/<INTENT-ID>"
+            language_code (str): language code, e.g. "de-DE"
+
+        Returns:
+            intent_pb2.Intent: the intent with its training phrases and parameters, must not be modified
+
+        Raises:
+            grpc.aio.AioRpcError: if the intent is not cached and the GetIntent call fails
+        """
+        key: IntentKey = (name, language_code)
+        entry: Optional[CachedIntent] = self._entries.get(key)
+        if entry is not None and self._clock() - entry.fetched_at < self.ttl:
+            self.hits += 1
+            return entry.intent
+        self.misses += 1
+        return await self._fetches.run(key, lambda: self._get_intent(key))
+
+    def invalidate(self, name: Optional[str] = None, language_code: Optional[str] = None) -> None:
+        """
+        Args:
+            name (Optional[str]): intent removed from the cache, all intents if None
+            language_code (Optional[str]): language of the removed intents, all languages if None
+        """
+        removed: Set[IntentKey] = {
+            key for key in self._entries
+            if (name is None or key[0] == name) and (language_code is None or key[1] == language_code)
+        }
+        for key in removed:
+            del self._entries[key]
+
+    async def _get_intent(self, key: IntentKey) -> intent_pb2.Intent:
+        intent: intent_pb2.Intent = await self._nlu_client_pool.get_intent(
+            name=key[0],
+            language_code=key[1],
+            intent_view=intent_pb2.IntentView.INTENT_VIEW_FULL,
+        )
+        self._entries[key] = CachedIntent(intent=intent, fetched_at=self._clock())
+        return intent
+
+    def start(self) -> None:
+        """
+        Starts the background task which warms up the configured agents and repeats it before the intents expire.
+        """
+        if self.agents and self.language_codes and (self._background_task is None or self._background_task.done()):
+            self._background_task = asyncio.ensure_future(self._warm_up_periodically())
+
+    async def close(self) -> None:
+        """
+        Stops the background task.
+        """
+        background_task: Optional["asyncio.Task[None]"] = self._background_task
+        self._background_task = None
+        if background_task is not None:
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _warm_up_periodically(self) -> None:
+        while True:
+            try:
+                for agent in self.agents:
+                    for language_code in self.language_codes:
+                        await self.warm_up(agent, language_code)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"IntentCache: warm-up failed, intents are fetched one by one: {e!r}")
+                await asyncio.sleep(self.retry_interval)
+                continue
+            # repeated before the cached intents expire
+            await asyncio.sleep(self.ttl * 0.8)
@@ -0,0 +1,448 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Asyncio native (grpc.aio) client of ondewo-nlu with a small pool of channels per worker.
+
+The channels are opened lazily by the first call of a worker, i.e. in its event loop after uvicorn forked it, never at
+import time: a grpc channel must neither be shared across processes nor across event loops. Calls are distributed
+round-robin over the channels and every call has a deadline, the default one of the pool or the one passed to it.
+Unary calls are retried within their deadline, a retry budget per channel and a circuit breaker, see grpc_resilience.
+
+ondewo-nlu-client >= 7 authenticates with Keycloak bearer tokens instead of the Users.Login of older versions: login()
+requests an access token with the password grant of the public Keycloak SDK client, and set_auth_token() sends it as
+"authorization: Bearer <token>" with every following call.
+"""
+import asyncio
+import itertools
+import os
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import grpc  # type: ignore
+import httpx
+from ondewo.logging.logger import logger_console as log
+from ondewo.nlu import (
+    context_pb2,
+    context_pb2_grpc,
+    intent_pb2,
+    intent_pb2_grpc,
+    session_pb2,
+    session_pb2_grpc,
+)
+from ondewo.nlu.utils.keycloak import KeycloakAuthenticationError
+
+from ondewo_nlu_webhook_server.metrics import outbound_call_duration
+from ondewo_nlu_webhook_server.server.deadline import get_timeout
+from ondewo_nlu_webhook_server_custom_integration.grpc_resilience import (
+    CircuitBreaker,
+    RetryBudget,
+    RetryInterceptor,
+    RetryPolicy,
+    RetryStats,
+)
+from ondewo_nlu_webhook_server_custom_integration.http_services import (
+    SharedHttpClient,
+    shared_http_client,
+)
+
+Metadata = List[Tuple[str, str]]
+
+
+class AsyncNluClientPool:
+    """
+    Pool of grpc.aio channels to ondewo-nlu with awaitable calls of the intents, contexts and sessions services.
+    """
+
+    def __init__(
+        self,
+        host_and_port: str,
+        size: int,
+        timeout: float,
+        grpc_cert: Optional[str] = None,
+        options: Optional[Sequence[Tuple[str, Any]]] = None,
+        metadata: Optional[Metadata] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        retry_budget_ratio: float = 0.1,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        keycloak_url: str = "",
+        realm: str = "",
+        client_id: str = "",
+        http_client: Optional[SharedHttpClient] = None,
+    ) -> None:
+        """
+        Args:
+            host_and_port (str): address of ondewo-nlu, e.g. "localhost:50055"
+            size (int): number of channels per worker
+            timeout (float): default deadline of a call in seconds
+            grpc_cert (Optional[str]): root certificate of a secure channel, an insecure channel is used if empty
+            options (Optional[Sequence[Tuple[str, Any]]]): grpc channel options
+            metadata (Optional[Metadata]): metadata sent with every call, e.g. the http basic auth token
+            retry_policy (Optional[RetryPolicy]): retries of the unary calls within their deadline, none if None
+            retry_budget_ratio (float): share of the calls of a channel which may be retried
+            circuit_breaker (Optional[CircuitBreaker]): circuit breaker shared by the channels, a breaker which
+                opens after 5 consecutive failures for 10 seconds if None
+            keycloak_url (str): base url of Keycloak, the part before "/realms/<realm>", e.g. "https://my-host/auth"
+            realm (str): Keycloak realm of the NLU users, e.g. "ondewo-ccai-platform"
+            client_id (str): public Keycloak SDK client, e.g. "ondewo-nlu-cai-sdk-public"
+            http_client (Optional[SharedHttpClient]): client of the token requests, the pooled client of the worker if
+                None
+        """
+        self.host_and_port: str = host_and_port
+        self.size: int = max(1, size)
+        self.timeout: float = timeout
+        self.grpc_cert: Optional[str] = grpc_cert
+        self.options: List[Tuple[str, Any]] = list(options or [])
+        self.metadata: Metadata = list(metadata or [])
+        self.retry_policy: RetryPolicy = retry_policy if retry_policy is not None else RetryPolicy(max_attempts=1)
+        self.retry_budget_ratio: float = retry_budget_ratio
+        self.retry_stats: RetryStats = RetryStats()
+        self.circuit_breaker: CircuitBreaker = (
+            circuit_breaker if circuit_breaker is not None
+            else CircuitBreaker(failure_threshold=5, reset_timeout=10)
+        )
+        self.circuit_breaker.stats = self.retry_stats
+        self.keycloak_url: str = keycloak_url.rstrip("/")
+        self.realm: str = realm
+        self.client_id: str = client_id
+        self._http_client: SharedHttpClient = http_client if http_client is not None else shared_http_client
+        self._channels: List[grpc.aio.Channel] = []
+        self._stubs: Dict[Tuple[int, type], Any] = {}
+        self._next_channel: Iterator[int] = itertools.cycle(range(self.size))
+        # the process and the event loop the channels were opened in
+        self._owner: Optional[Tuple[int, asyncio.AbstractEventLoop]] = None
+
+    @property
+    def supports_login(self) -> bool:
+        """
+        Returns:
+            bool: whether Keycloak is configured, i.e. login() can request a token
+        """
+        return bool(self.keycloak_url and self.realm and self.client_id)
+
+    def set_auth_token(self, token: str) -> None:
+        """
+        Args:
+            token (str): access token of the login, sent as "authorization: Bearer <token>" with every following call,
+                it replaces the http basic auth token of the metadata
+        """
+        self.metadata = [(key, value) for key, value in self.metadata if key != "authorization"] + [
+            ("authorization", f"Bearer {token}"),
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: counters of the calls, retries and circuit breaker trips of this worker, and whether the
+                circuit breaker is open
+        """
+        return {
+            **self.retry_stats.to_dict(),
+            "circuit_breaker_open": int(self.circuit_breaker.state == CircuitBreaker.OPEN),
+        }
+
+    def _open_channel(self) -> grpc.aio.Channel:
+        # one retry budget per channel, one circuit breaker for the backend
+        interceptors: List[RetryInterceptor] = [
+            RetryInterceptor(
+                policy=self.retry_policy,
+                budget=RetryBudget(retry_ratio=self.retry_budget_ratio),
+                circuit_breaker=self.circuit_breaker,
+                stats=self.retry_stats,
+                default_timeout=self.timeout,
+            ),
+        ]
+        if self.grpc_cert:
+            credentials: grpc.ChannelCredentials = grpc.ssl_channel_credentials(
+                root_certificates=self.grpc_cert.encode(),
+            )
+            return grpc.aio.secure_channel(
+                self.host_and_port,
+                credentials,
+                options=self.options,
+                interceptors=interceptors,
+            )
+        return grpc.aio.insecure_channel(self.host_and_port, options=self.options, interceptors=interceptors)
+
+    def _ensure_channels(self) -> None:
+        owner: Tuple[int, asyncio.AbstractEventLoop] = (os.getpid(), asyncio.get_running_loop())
+        if self._owner == owner:
+            return
+        if self._owner is not None:
+            # the channels of the parent process resp. of a closed event loop are unusable, they are dropped
+            log.debug("AsyncNluClientPool: channels opened in another process or event loop, reopening them.")
+        self._channels = [self._open_channel() for _ in range(self.size)]
+        self._stubs.clear()
+        self._owner = owner
+
+    def get_stub(self, stub_class: Type[Any]) -> Any:
+        """
+        Args:
+            stub_class (Type[Any]): generated grpc stub class, e.g. intent_pb2_grpc.IntentsStub
+
+        Returns:
+            Any: stub of the next channel of the pool, round-robin; opens the channels on the first call of a worker
+        """
+        self._ensure_channels()
+        index: int = next(self._next_channel)
+        stub: Any = self._stubs.get((index, stub_class))
+        if stub is None:
+            stub = stub_class(self._channels[index])
+            self._stubs[(index, stub_class)] = stub
+        return stub
+
+    async def call(
+        self,
+        stub_class: Type[Any],
+        method: str,
+        request: Any,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Args:
+            stub_class (Type[Any]): generated grpc stub class, e.g. intent_pb2_grpc.IntentsStub
+            method (str): name of the unary rpc, e.g. "GetIntent"
+            request (Any): protobuf request
+            timeout (Optional[float]): deadline of the call in seconds; if None the default timeout of the pool,
+                shortened to the remaining time of the webhook request being processed
+
+        Returns:
+            Any: protobuf response
+
+        Raises:
+            grpc.aio.AioRpcError: if the call fails, with status DEADLINE_EXCEEDED if the deadline is exceeded
+        """
+        rpc: Any = getattr(self.get_stub(stub_class), method)
+        outcome: str = grpc.StatusCode.UNKNOWN.name
+        start: float = time.perf_counter()
+        try:
+            response: Any = await rpc(
+                request,
+                metadata=self.metadata,
+                timeout=get_timeout(self.timeout) if timeout is None else timeout,
+            )
+            outcome = grpc.StatusCode.OK.name
+            return response
+        except grpc.aio.AioRpcError as error:
+            outcome = error.code().name
+            raise
+        except asyncio.CancelledError:
+            outcome = grpc.StatusCode.CANCELLED.name
+            raise
+        finally:
+            outbound_call_duration.observe(("nlu", method, outcome), time.perf_counter() - start)
+
+    async def login(self, user_name: str, password: str, timeout: Optional[float] = None) -> str:
+        """
+        Requests an access token with the password grant of the public Keycloak SDK client, no client secret is sent.
+
+        Args:
+            user_name (str): email of the user
+            password (str): password of the user
+            timeout (Optional[float]): timeout of the token request in seconds, the default timeout of the pool if None
+
+        Returns:
+            str: the access token, a JWT whose "exp" claim is its expiry
+
+        Raises:
+            ValueError: if Keycloak is not configured
+            KeycloakAuthenticationError: if Keycloak rejects the login or returns no access token
+            httpx.HTTPError: if Keycloak is not reachable
+        """
+        if not self.supports_login:
+            raise ValueError("Keycloak is not configured, the keycloak url, realm and client id are required.")
+        response: httpx.Response = await self._http_client.request(
+            "POST",
+            f"{self.keycloak_url}/realms/{self.realm}/protocol/openid-connect/token",
+            data={
+                "grant_type": "password",
+                "client_id": self.client_id,
+                "username": user_name,
+                "password": password,
+            },
+            timeout=self.timeout if timeout is None else timeout,
+        )
+        if not response.is_success:
+            raise KeycloakAuthenticationError(
+                f"Keycloak login failed with status {response.status_code}: {response.text}",
+            )
+        # the other fields of the response are credentials as well, only their names may be logged
+        payload: Dict[str, Any] = response.json()
+        access_token: Any = payload.get("access_token")
+        if not access_token:
+            raise KeycloakAuthenticationError(
+                f"Keycloak login response has no access_token, it has the fields {sorted(payload)}",
+            )
+        return str(access_token)
+
+    async def get_intent(
+        self,
+        name: str,
+        language_code: str,
+        timeout: Optional[float] = None,
+        intent_view: "intent_pb2.IntentView.ValueType" = intent_pb2.IntentView.INTENT_VIEW_UNSPECIFIED,
+    ) -> intent_pb2.Intent:
+        """
+        Args:
+            name (str): "projects/<PROJECT-ID>/agent/intents/<INTENT-ID>"
+            language_code (str): language code, e.g. "de-DE"
+            timeout (Optional[float]): deadline of the call in seconds
+            intent_view (intent_pb2.IntentView.ValueType): intent_pb2.IntentView, e.g. INTENT_VIEW_FULL for the training phrases
+
+        Returns:
+            intent_pb2.Intent: the intent
+        """
+        request: intent_pb2.GetIntentRequest = intent_pb2.GetIntentRequest(
+            name=name,
+            language_code=language_code,
+            intent_view=intent_view,
+        )
+        intent: intent_pb2.Intent = await self.call(intent_pb2_grpc.IntentsStub, "GetIntent", request, timeout=timeout)
+        return intent
+
+    async def list_intents(
+        self,
+        agent: str,
+        language_code: str,
+        timeout: Optional[float] = None,
+        intent_view: "intent_pb2.IntentView.ValueType" = intent_pb2.IntentView.INTENT_VIEW_UNSPECIFIED,
+    ) -> List[intent_pb2.Intent]:
+        """
+        Args:
+            agent (str): "projects/<PROJECT-ID>/agent"
+            language_code (str): language code, e.g. "de-DE"
+            timeout (Optional[float]): deadline of every call in seconds
+            intent_view (intent_pb2.IntentView.ValueType): intent_pb2.IntentView, e.g. INTENT_VIEW_FULL for the training phrases
+
+        Returns:
+            List[intent_pb2.Intent]: all intents of the agent, following the pages of the response
+        """
+        intents: List[intent_pb2.Intent] = []
+        page_token: str = ""
+        while True:
+            request: intent_pb2.ListIntentsRequest = intent_pb2.ListIntentsRequest(
+                parent=agent,
+                language_code=language_code,
+                intent_view=intent_view,
+                page_token=page_token,
+            )
+            response: intent_pb2.ListIntentsResponse = await self.call(
+                intent_pb2_grpc.IntentsStub,
+                "ListIntents",
+                request,
+                timeout=timeout,
+            )
+            intents.extend(response.intents)
+            page_token = response.next_page_token
+            if not page_token:
+                return intents
+
+    async def get_context(self, name: str, timeout: Optional[float] = None) -> context_pb2.Context:
+        """
+        Args:
+            name (str): "projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>/contexts/<CONTEXT-NAME>"
+            timeout (Optional[float]): deadline of the call in seconds
+
+        Returns:
+            context_pb2.Context: the context
+        """
+        request: context_pb2.GetContextRequest = context_pb2.GetContextRequest(name=name)
+        context: context_pb2.Context = await self.call(context_pb2_grpc.ContextsStub, "GetContext", request, timeout=timeout)
+        return context
+
+    async def list_contexts(self, session: str, timeout: Optional[float] = None) -> List[context_pb2.Context]:
+        """
+        Args:
+            session (str): "projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>"
+            timeout (Optional[float]): deadline of every call in seconds
+
+        Returns:
+            List[context_pb2.Context]: all contexts of the session, following the pages of the response
+        """
+        contexts: List[context_pb2.Context] = []
+        page_token: str = ""
+        while True:
+            request: context_pb2.ListContextsRequest = context_pb2.ListContextsRequest(
+                session_id=session,
+                page_token=page_token,
+            )
+            response: context_pb2.ListContextsResponse = await self.call(
+                context_pb2_grpc.ContextsStub,
+                "ListContexts",
+                request,
+                timeout=timeout,
+            )
+            contexts.extend(response.contexts)
+            page_token = response.next_page_token
+            if not page_token:
+                return contexts
+
+    async def create_context(
+        self,
+        session: str,
+        context: context_pb2.Context,
+        timeout: Optional[float] = None,
+    ) -> context_pb2.Context:
+        """
+        Args:
+            session (str): "projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>"
+            context (context_pb2.Context): the context to create
+            timeout (Optional[float]): deadline of the call in seconds
+
+        Returns:
+            context_pb2.Context: the created context
+        """
+        request: context_pb2.CreateContextRequest = context_pb2.CreateContextRequest(session_id=session, context=context)
+        created_context: context_pb2.Context = await self.call(
+            context_pb2_grpc.ContextsStub,
+            "CreateContext",
+            request,
+            timeout=timeout,
+        )
+        return created_context
+
+    async def get_session(self, session: str, timeout: Optional[float] = None) -> session_pb2.Session:
+        """
+        Args:
+            session (str): "projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>"
+            timeout (Optional[float]): deadline of the call in seconds
+
+        Returns:
+            session_pb2.Session: the session
+        """
+        request: session_pb2.GetSessionRequest = session_pb2.GetSessionRequest(session_id=session)
+        response: session_pb2.Session = await self.call(session_pb2_grpc.SessionsStub, "GetSession", request, timeout=timeout)
+        return response
+
+    async def close(self) -> None:
+        """
+        Closes the channels of the current worker, they are reopened by the next call.
+        """
+        channels: List[grpc.aio.Channel] = self._channels
+        owner: Optional[Tuple[int, asyncio.AbstractEventLoop]] = self._owner
+        self._channels = []
+        self._stubs.clear()
+        self._owner = None
+        if owner is not None and owner[0] == os.getpid():
+            for channel in channels:
+                await channel.close()
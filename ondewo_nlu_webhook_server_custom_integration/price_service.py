@@ -0,0 +1,377 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Async scraping of price tables with a TTL cache of the parsed tables.
+
+A cached table is served without any upstream request while it is fresh. After its TTL it is still served for up to
+max_stale seconds while a single background request revalidates it (stale-while-revalidate). Revalidation is a
+conditional request with If-None-Match / If-Modified-Since, hence an unchanged page is neither transferred nor parsed
+again. Only a missing or too old table is awaited by the request; concurrent requests for the same page share one
+upstream request. Parsing runs in a worker thread, the event loop is never blocked by the scraper.
+
+Together with the table, a PriceIndex of it is built once per refresh. Both are replaced as one cache entry, hence
+requests see either the old or the new table and index, never a mix of both.
+"""
+import asyncio
+import time
+from array import array
+from bisect import (
+    bisect_left,
+    bisect_right,
+)
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import httpx
+from bs4 import BeautifulSoup
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server.globals import WebhookGlobals
+from ondewo_nlu_webhook_server_custom_integration import http_services
+from ondewo_nlu_webhook_server_custom_integration.single_flight import SingleFlight
+
+PriceTable = Dict[str, List[Dict[str, str]]]
+
+# rows per block of the range minimum queries of SortedCategoryKeys
+ROW_BLOCK_SIZE: int = 32
+
+
+def parse_price_table(html: str) -> PriceTable:
+    """
+    Extracts price information from a webpage containing a structured HTML table.
+
+    Args:
+        html (str): html of the webpage containing the price table
+
+    Returns:
+        PriceTable: A dictionary containing a list of extracted price entries.
+        Each entry is a dictionary with the following keys:
+            - "category" (str): The category name from the first column.
+            - "price" (str): The price from the second column.
+
+    Raises:
+        AssertionError: If the expected table or rows are not found in the HTML.
+    """
+    soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
+
+    # Find the table containing the data
+    table = soup.find("div", class_="table-box").find("table", class_="table")  # type: ignore
+    assert table is not None
+    rows = table.find_all("tr", class_="tablerow")  # type:ignore
+    assert rows is not None
+
+    values: List = []
+    # Parse the rows for data
+    for row in rows:
+        cells = row.find_all("td")
+        if len(cells) >= 2:
+            category = cells[0].get_text(strip=True)
+            price = cells[1].get_text(strip=True)
+            values.append(
+                {
+                    "category": category,
+                    "price": price,
+                },
+            )
+
+    return {"price_list": values}
+
+
+class SortedCategoryKeys:
+    """
+    Keys of the categories of a product, i.e. the categories themselves or all their suffixes, in sorted order.
+
+    The keys are stored as (row, start) positions into the categories, not as strings. All keys starting with a text
+    are adjacent in the sorted order, the range is found by two binary searches which compare only len(text)
+    characters per key. The first row of the range is the minimum of a range of rows: the rows are split into blocks
+    of ROW_BLOCK_SIZE, the minimum of the whole blocks in the range is answered by a sparse table of the block minima
+    in constant time, the partial blocks at both ends are scanned.
+    """
+
+    def __init__(self, categories: List[str], suffixes: bool) -> None:
+        """
+        Args:
+            categories (List[str]): categories of the entries of the product by row
+            suffixes (bool): if True all suffixes of the categories including the empty one are keys, else the
+                categories only
+        """
+        self._categories: List[str] = categories
+        positions: List[Tuple[int, int]] = [
+            (row, start)
+            for row, category in enumerate(categories)
+            # the empty suffix keeps empty categories, which contain the empty text, in the keys
+            for start in (range(len(category) + 1) if suffixes else (0,))
+        ]
+        positions.sort(key=lambda position: (categories[position[0]][position[1]:], position[0]))
+        self._rows: "array[int]" = array("l", (row for row, _ in positions))
+        self._starts: "array[int]" = array("l", (start for _, start in positions))
+        # self._block_minimum_rows[level][i] is the minimum row of the blocks i to i + 2 ** level - 1
+        self._block_minimum_rows: List["array[int]"] = [
+            array("l", (min(self._rows[i:i + ROW_BLOCK_SIZE]) for i in range(0, len(self._rows), ROW_BLOCK_SIZE))),
+        ]
+        width: int = 1
+        while 2 * width <= len(self._block_minimum_rows[0]):
+            previous: "array[int]" = self._block_minimum_rows[-1]
+            self._block_minimum_rows.append(array("l", map(min, previous[:len(previous) - width], previous[width:])))
+            width *= 2
+
+    def first_row(self, text: str) -> Optional[int]:
+        """
+        Args:
+            text (str): prefix of the keys
+
+        Returns:
+            Optional[int]: the smallest row of the keys starting with the text, None if no key starts with it
+        """
+        categories: List[str] = self._categories
+        rows: "array[int]" = self._rows
+        starts: "array[int]" = self._starts
+        end: int = len(text)
+
+        def key(index: int) -> str:
+            start: int = starts[index]
+            return categories[rows[index]][start:start + end]
+
+        positions: range = range(len(rows))
+        low: int = bisect_left(positions, text, key=key)
+        high: int = bisect_right(positions, text, lo=low, key=key)
+        if low == high:
+            return None
+        return self._minimum_row(low, high)
+
+    def _minimum_row(self, low: int, high: int) -> int:
+        rows: "array[int]" = self._rows
+        first_block: int = low // ROW_BLOCK_SIZE + 1
+        last_block: int = high // ROW_BLOCK_SIZE
+        if first_block >= last_block:
+            return min(rows[low:high])
+        # the partial blocks at both ends, then the whole blocks in between
+        minimum_row: int = min(rows[low:first_block * ROW_BLOCK_SIZE])
+        if last_block * ROW_BLOCK_SIZE < high:
+            minimum_row = min(minimum_row, min(rows[last_block * ROW_BLOCK_SIZE:high]))
+        level: int = (last_block - first_block).bit_length() - 1
+        block_minimum_rows: "array[int]" = self._block_minimum_rows[level]
+        return min(minimum_row, block_minimum_rows[first_block], block_minimum_rows[last_block - (1 << level)])
+
+
+class PriceIndex:
+    """
+    Immutable index of the prices of a price table per product.
+
+    Lookups by the exact category are a dict lookup. Lookups by a prefix or a substring of the category are binary
+    searches in the sorted categories resp. the sorted suffixes of the categories, see SortedCategoryKeys. As with a
+    linear scan, the first matching entry of the table wins.
+    """
+
+    def __init__(self, table: PriceTable) -> None:
+        """
+        Args:
+            table (PriceTable): entries with "category" and "price" per product
+        """
+        self._exact: Dict[str, Dict[str, str]] = {}
+        self._prices: Dict[str, List[str]] = {}
+        self._categories: Dict[str, SortedCategoryKeys] = {}
+        self._suffixes: Dict[str, SortedCategoryKeys] = {}
+
+        for product, entries in table.items():
+            exact: Dict[str, str] = {}
+            for entry in entries:
+                exact.setdefault(entry["category"], entry["price"])
+            self._exact[product] = exact
+            self._prices[product] = [entry["price"] for entry in entries]
+            categories: List[str] = [entry["category"] for entry in entries]
+            self._categories[product] = SortedCategoryKeys(categories, suffixes=False)
+            self._suffixes[product] = SortedCategoryKeys(categories, suffixes=True)
+
+    def get(self, product: str, category: str) -> Optional[str]:
+        """
+        Args:
+            product (str): key of the product in the price table
+            category (str): category of the entry
+
+        Returns:
+            Optional[str]: price of the first entry of the product with exactly this category
+        """
+        return self._exact.get(product, {}).get(category)
+
+    def find_by_prefix(self, product: str, prefix: str) -> Optional[str]:
+        """
+        Args:
+            product (str): key of the product in the price table
+            prefix (str): prefix of the category
+
+        Returns:
+            Optional[str]: price of the first entry of the product whose category starts with the prefix
+        """
+        return self._find(self._categories, product, prefix)
+
+    def find_by_substring(self, product: str, substring: str) -> Optional[str]:
+        """
+        Args:
+            product (str): key of the product in the price table
+            substring (str): substring of the category
+
+        Returns:
+            Optional[str]: price of the first entry of the product whose category contains the substring
+        """
+        return self._find(self._suffixes, product, substring)
+
+    def _find(self, sorted_keys: Dict[str, SortedCategoryKeys], product: str, text: str) -> Optional[str]:
+        keys: Optional[SortedCategoryKeys] = sorted_keys.get(product)
+        first_row: Optional[int] = keys.first_row(text) if keys is not None else None
+        return None if first_row is None else self._prices[product][first_row]
+
+
+def build_price_index(html: str) -> Tuple[PriceTable, PriceIndex]:
+    """
+    Args:
+        html (str): html of the webpage containing the price table
+
+    Returns:
+        Tuple[PriceTable, PriceIndex]: the parsed price table and its index
+    """
+    table: PriceTable = parse_price_table(html)
+    return table, PriceIndex(table)
+
+
+@dataclass
+class CachedPriceTable:
+    """Parsed price table of a page and its index with the validators of the response it was parsed from."""
+    table: PriceTable
+    index: PriceIndex
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class PriceTableCache:
+    """
+    TTL cache of the parsed price tables per URL with stale-while-revalidate and conditional requests.
+    """
+
+    def __init__(self, ttl: float, max_stale: float, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            ttl (float): seconds a table is served without revalidation
+            max_stale (float): seconds after the ttl a table is still served while it is revalidated in the background
+            clock (Callable[[], float]): monotonic clock in seconds
+        """
+        self._clock: Callable[[], float] = clock
+        self.ttl: float = ttl
+        self.max_stale: float = max_stale
+        self._entries: Dict[str, CachedPriceTable] = {}
+        # concurrent refreshes of the same url share one upstream request
+        self._refreshes: SingleFlight[str, CachedPriceTable] = SingleFlight()
+        # strong references of the background revalidations, the event loop only keeps weak ones
+        self._background_refreshes: Set["asyncio.Task[CachedPriceTable]"] = set()
+
+    async def get(self, url: str) -> PriceTable:
+        """
+        Args:
+            url (str): URL of the webpage containing the price table
+
+        Returns:
+            PriceTable: the parsed price table, possibly stale by up to max_stale seconds
+
+        Raises:
+            httpx.HTTPError: if the page has to be fetched and the request fails
+            AssertionError: if the page has to be parsed and does not contain the price table
+        """
+        return (await self._get_entry(url)).table
+
+    async def get_index(self, url: str) -> PriceIndex:
+        """
+        Args:
+            url (str): URL of the webpage containing the price table
+
+        Returns:
+            PriceIndex: index of the parsed price table, possibly stale by up to max_stale seconds
+
+        Raises:
+            httpx.HTTPError: if the page has to be fetched and the request fails
+            AssertionError: if the page has to be parsed and does not contain the price table
+        """
+        return (await self._get_entry(url)).index
+
+    async def _get_entry(self, url: str) -> CachedPriceTable:
+        entry: Optional[CachedPriceTable] = self._entries.get(url)
+        if entry is not None:
+            age: float = self._clock() - entry.fetched_at
+            if age < self.ttl:
+                return entry
+            if age < self.ttl + self.max_stale:
+                self._revalidate_in_background(url)
+                return entry
+        return await self._refreshes.run(url, lambda: self._fetch(url))
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """
+        Args:
+            url (Optional[str]): URL whose table is removed, all tables are removed if None
+        """
+        if url is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(url, None)
+
+    def _revalidate_in_background(self, url: str) -> None:
+        if url in self._refreshes:
+            return
+        refresh: "asyncio.Task[CachedPriceTable]" = self._refreshes.start(url, lambda: self._fetch(url))
+        self._background_refreshes.add(refresh)
+        refresh.add_done_callback(self._on_background_refresh_done)
+
+    def _on_background_refresh_done(self, refresh: "asyncio.Task[CachedPriceTable]") -> None:
+        self._background_refreshes.discard(refresh)
+        if not refresh.cancelled() and refresh.exception() is not None:
+            log.warning(f"PriceTableCache: revalidation failed, serving the stale table: {refresh.exception()!r}")
+
+    async def _fetch(self, url: str) -> CachedPriceTable:
+        entry: Optional[CachedPriceTable] = self._entries.get(url)
+        headers: Dict[str, str] = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        response: httpx.Response = await http_services.shared_http_client.request("GET", url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            entry.fetched_at = self._clock()
+            return entry
+        response.raise_for_status()
+
+        table, index = await asyncio.to_thread(build_price_index, response.text)
+        entry = CachedPriceTable(
+            table=table,
+            index=index,
+            fetched_at=self._clock(),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        self._entries[url] = entry
+        return entry
+
+
+price_table_cache: PriceTableCache = PriceTableCache(
+    ttl=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PRICE_TABLE_CACHE_TTL,
+    max_stale=WebhookGlobals.ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_PRICE_TABLE_CACHE_MAX_STALE,
+)
@@ -0,0 +1,96 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Coalescing of concurrent calls per key, e.g. of cache misses which would otherwise each call the same upstream.
+
+The first caller of a key starts the call as a task, the callers arriving while it runs await the same task. The task
+is shielded from the cancellation of its callers, hence a cancelled request does not cancel the call other requests are
+waiting for. Once the call is done the key is released and the next caller starts a new call.
+"""
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Runs at most one call per key at a time, concurrent callers of a key share the running call.
+    """
+
+    def __init__(self, on_error: Optional[Callable[[BaseException], None]] = None) -> None:
+        """
+        Args:
+            on_error (Optional[Callable[[BaseException], None]]): called with the exception of every failed call, e.g. to
+                log it
+        """
+        self._on_error: Optional[Callable[[BaseException], None]] = on_error
+        self._calls: Dict[K, "asyncio.Task[V]"] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def start(self, key: K, call: Callable[[], Awaitable[V]]) -> "asyncio.Task[V]":
+        """
+        Args:
+            key (K): key of the call
+            call (Callable[[], Awaitable[V]]): started if no call of the key is running
+
+        Returns:
+            asyncio.Task[V]: the running call of the key
+        """
+        task: Optional["asyncio.Task[V]"] = self._calls.get(key)
+        if task is None:
+            started: "asyncio.Task[V]" = asyncio.ensure_future(call())
+            self._calls[key] = started
+            started.add_done_callback(lambda _: self._on_done(key, started))
+            task = started
+        return task
+
+    async def run(self, key: K, call: Callable[[], Awaitable[V]]) -> V:
+        """
+        Args:
+            key (K): key of the call
+            call (Callable[[], Awaitable[V]]): started if no call of the key is running
+
+        Returns:
+            V: the result of the running call of the key
+
+        Raises:
+            Exception: the exception of the call
+        """
+        # a cancelled caller must not cancel the call other callers are waiting for
+        return await asyncio.shield(self.start(key, call))
+
+    def _on_done(self, key: K, task: "asyncio.Task[V]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if task.cancelled():
+            return
+        # retrieving the exception marks it as retrieved in case all callers waiting for the call were cancelled
+        error: Optional[BaseException] = task.exception()
+        if error is not None and self._on_error is not None:
+            self._on_error(error)
@@ -0,0 +1,320 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cache of the auth token of the NLU client login with proactive refresh.
+
+The token is cached per worker and shared across the workers through a file: a worker which needs a new token first
+reads the file, and only logs in if the token in it is too old as well. The login itself is serialized across the
+workers by a lock file, hence the workers of a server log in once per token instead of once each. If the file cannot be
+used, the token is cached per worker instead of failing the login. A background task refreshes the token refresh_margin
+seconds before it expires, concurrent refreshes of a worker share one login. A webhook request therefore only waits for
+a login if there is no valid token at all, e.g. before the first login. After failed refreshes the background task backs
+off exponentially with jitter, hence the workers of a server neither poll the login of a broken configuration nor retry
+a recovering identity provider in lockstep.
+"""
+import asyncio
+import base64
+import binascii
+import fcntl
+import json
+import os
+import random
+import stat
+import time
+from contextlib import (
+    AsyncExitStack,
+    asynccontextmanager,
+)
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+
+from ondewo.logging.logger import logger_console as log
+
+from ondewo_nlu_webhook_server_custom_integration.single_flight import SingleFlight
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    """Auth token and its expiry as unix timestamp, a wall clock time since it is shared across processes."""
+    token: str
+    expires_at: float
+
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """
+    Args:
+        token (str): auth token
+
+    Returns:
+        Optional[float]: the "exp" claim of the token if it is a JWT, None otherwise
+    """
+    parts: List[str] = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload: Any = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    expiry: Any = payload.get("exp") if isinstance(payload, dict) else None
+    return float(expiry) if isinstance(expiry, (int, float)) else None
+
+
+class FileTokenStore:
+    """
+    File shared by the workers which holds the current token, and a lock file which serializes their logins.
+
+    The files live in a directory private to the user of the server, which is created if it does not exist. A directory
+    or a file owned by another user, or a symbolic link in place of a file, is refused with a PermissionError or an
+    OSError, hence another user of a shared temporary directory can neither read the token nor plant one.
+    """
+
+    def __init__(self, path: str, lock_poll_interval: float = 0.05) -> None:
+        """
+        Args:
+            path (str): path of the token file, the lock file is "<path>.lock"
+            lock_poll_interval (float): seconds between two attempts to acquire the lock
+        """
+        self.path: str = path
+        self.lock_path: str = f"{path}.lock"
+        self.lock_poll_interval: float = lock_poll_interval
+
+    def load(self) -> Optional[CachedToken]:
+        """
+        Returns:
+            Optional[CachedToken]: the token in the file, None if there is none or the file is unreadable or untrusted
+        """
+        try:
+            with os.fdopen(self._open(self.path, os.O_RDONLY), "r") as token_file:
+                content: Dict[str, Any] = json.load(token_file)
+            return CachedToken(token=str(content["token"]), expires_at=float(content["expires_at"]))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning(f"FileTokenStore: ignoring unreadable token file {self.path}: {e!r}")
+            return None
+
+    def save(self, token: CachedToken) -> None:
+        """
+        Writes the token readable by the owner only and atomically, hence other workers never read a partial file.
+
+        Args:
+            token (CachedToken): the token
+
+        Raises:
+            OSError: if the file cannot be written
+        """
+        temporary_path: str = f"{self.path}.{os.getpid()}.tmp"
+        with os.fdopen(self._open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), "w") as token_file:
+            json.dump({"token": token.token, "expires_at": token.expires_at}, token_file)
+        os.replace(temporary_path, self.path)
+
+    @asynccontextmanager
+    async def lock(self) -> AsyncIterator[None]:
+        """
+        Holds the lock file exclusively. The lock is polled without blocking, hence waiting for it neither blocks the
+        event loop nor a thread, and can be cancelled.
+
+        Raises:
+            OSError: if the directory or the lock file cannot be created or is not trusted
+        """
+        self._ensure_private_directory()
+        file_descriptor: int = self._open(self.lock_path, os.O_RDWR | os.O_CREAT)
+        try:
+            while True:
+                try:
+                    fcntl.flock(file_descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(self.lock_poll_interval)
+            try:
+                yield
+            finally:
+                fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+        finally:
+            os.close(file_descriptor)
+
+    def _ensure_private_directory(self) -> None:
+        directory: str = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        status: os.stat_result = os.lstat(directory)
+        if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+            raise PermissionError(f"directory {directory} of the token file is not private to the user")
+
+    @staticmethod
+    def _open(path: str, flags: int) -> int:
+        # O_NOFOLLOW: a symbolic link planted in place of the file is not followed
+        file_descriptor: int = os.open(path, flags | os.O_NOFOLLOW, 0o600)
+        if os.fstat(file_descriptor).st_uid != os.getuid():
+            os.close(file_descriptor)
+            raise PermissionError(f"{path} is owned by another user")
+        return file_descriptor
+
+
+class TokenManager:
+    """
+    Caches the auth token of a worker, refreshes it in the background before it expires and coalesces the refreshes.
+    """
+
+    def __init__(
+        self,
+        login: Callable[[], Awaitable[str]],
+        refresh_margin: float,
+        default_ttl: float,
+        store: Optional[FileTokenStore] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        retry_interval: float = 5.0,
+        max_retry_interval: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Args:
+            login (Callable[[], Awaitable[str]]): logs in and returns a new token
+            refresh_margin (float): seconds before its expiry a token is refreshed
+            default_ttl (float): seconds a token is valid if it has no "exp" claim
+            store (Optional[FileTokenStore]): store shared by the workers, the token is cached per worker only if None
+            on_token (Optional[Callable[[str], None]]): called with every new token, e.g. to update the metadata of
+                a client
+            retry_interval (float): seconds the background task waits after a failed refresh, doubled after every
+                further consecutive failure
+            max_retry_interval (float): maximum seconds the background task waits after a failed refresh
+            clock (Callable[[], float]): wall clock in seconds since the epoch
+        """
+        self._login: Callable[[], Awaitable[str]] = login
+        self.refresh_margin: float = refresh_margin
+        self.default_ttl: float = default_ttl
+        self._store: Optional[FileTokenStore] = store
+        self._on_token: Optional[Callable[[str], None]] = on_token
+        self.retry_interval: float = retry_interval
+        self.max_retry_interval: float = max(retry_interval, max_retry_interval)
+        self._clock: Callable[[], float] = clock
+        self._token: Optional[CachedToken] = None
+        # a single key: concurrent refreshes of a worker share one login
+        self._refreshes: SingleFlight[None, CachedToken] = SingleFlight(on_error=self._on_refresh_error)
+        self._background_task: Optional["asyncio.Task[None]"] = None
+        self.logins: int = 0
+        self.consecutive_failures: int = 0
+
+    def _needs_refresh(self, token: Optional[CachedToken]) -> bool:
+        return token is None or self._clock() >= token.expires_at - self.refresh_margin
+
+    async def get_token(self) -> str:
+        """
+        Returns:
+            str: a valid token, only awaits a login if the cached token is missing or expired
+
+        Raises:
+            Exception: the exception of the login if there is no valid token
+        """
+        token: Optional[CachedToken] = self._token
+        if token is not None and not self._needs_refresh(token):
+            return token.token
+        if token is not None and self._clock() < token.expires_at:
+            # still valid: served while a single refresh runs in the background
+            self._refreshes.start(None, self._fetch)
+            return token.token
+        return (await self._refreshes.run(None, self._fetch)).token
+
+    @staticmethod
+    def _on_refresh_error(error: BaseException) -> None:
+        log.warning(f"TokenManager: refreshing the token failed: {error!r}")
+
+    def _set_token(self, token: CachedToken) -> CachedToken:
+        if self._token != token:
+            self._token = token
+            if self._on_token is not None:
+                self._on_token(token.token)
+        return token
+
+    async def _fetch(self) -> CachedToken:
+        if self._store is None:
+            return self._set_token(await self._login_token())
+        async with AsyncExitStack() as stack:
+            try:
+                await stack.enter_async_context(self._store.lock())
+            except OSError as e:
+                # an unusable store must not break the auth: the token is then cached per worker
+                log.warning(f"TokenManager: token file {self._store.path} unusable, logging in per worker: {e!r}")
+                return self._set_token(await self._login_token())
+            # another worker may have refreshed the token while this one waited for the lock
+            stored: Optional[CachedToken] = self._store.load()
+            if not self._needs_refresh(stored):
+                assert stored is not None
+                return self._set_token(stored)
+            token: CachedToken = await self._login_token()
+            try:
+                self._store.save(token)
+            except OSError as e:
+                log.warning(f"TokenManager: token not shared through the file {self._store.path}: {e!r}")
+            return self._set_token(token)
+
+    async def _login_token(self) -> CachedToken:
+        token: str = await self._login()
+        self.logins += 1
+        expires_at: Optional[float] = get_token_expiry(token)
+        return CachedToken(token=token, expires_at=expires_at or self._clock() + self.default_ttl)
+
+    def start(self) -> None:
+        """
+        Starts the background task which logs in and refreshes the token before it expires.
+        """
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.ensure_future(self._refresh_periodically())
+
+    async def close(self) -> None:
+        """
+        Stops the background task.
+        """
+        background_task: Optional["asyncio.Task[None]"] = self._background_task
+        self._background_task = None
+        if background_task is not None:
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass
+
+    def retry_delay(self) -> float:
+        """
+        Returns:
+            float: seconds the background task waits after the consecutive failed refreshes, drawn uniformly between
+                retry_interval and retry_interval * 2 ** (consecutive_failures - 1), at most max_retry_interval
+        """
+        ceiling: float = min(self.max_retry_interval, self.retry_interval * 2 ** min(self.consecutive_failures - 1, 30))
+        return random.uniform(self.retry_interval, ceiling)
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            token: Optional[CachedToken] = self._token
+            try:
+                if token is None or self._needs_refresh(token):
+                    token = await self._refreshes.run(None, self._fetch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # logged by _on_refresh_error
+                self.consecutive_failures += 1
+                await asyncio.sleep(self.retry_delay())
+                continue
+            self.consecutive_failures = 0
+            # at least retry_interval, a token whose lifetime is shorter than the margin must not cause a busy loop
+            await asyncio.sleep(max(self.retry_interval, token.expires_at - self.refresh_margin - self._clock()))
@@ -0,0 +1,220 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fulfillment messages indexed by their message type.
+
+A fulfillment message is either an IntentMessage, as parsed from the request, or a dict in the json format of an
+IntentMessage, as created by custom code. Its message type is the field which is set, e.g. "text", "card",
+"quick_replies" or "payload". FulfillmentMessages indexes the positions of the messages per type once, hence finding,
+adding and overriding messages of a type does not scan the list again.
+"""
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    IntentMessage,
+    IntentMessageText,
+)
+
+Message = Union[Dict[str, Any], IntentMessage]
+
+# fields of IntentMessage which are no message type
+_MESSAGE_ATTRIBUTES: FrozenSet[str] = frozenset({"name", "language_code", "platform", "is_prompt"})
+MESSAGE_TYPES: Tuple[str, ...] = tuple(
+    field for field in IntentMessage.model_fields if field not in _MESSAGE_ATTRIBUTES
+)
+_MESSAGE_TYPE_SET: FrozenSet[str] = frozenset(MESSAGE_TYPES)
+
+
+def get_message_type(message: Message) -> Optional[str]:
+    """
+    Args:
+        message (Message): fulfillment message
+
+    Returns:
+        Optional[str]: the message type, i.e. the first message type field which is set
+    """
+    if isinstance(message, IntentMessage):
+        return next((field for field in MESSAGE_TYPES if getattr(message, field) is not None), None)
+    return next((key for key, value in message.items() if key in _MESSAGE_TYPE_SET and value is not None), None)
+
+
+def get_texts(message: Message) -> Optional[List[str]]:
+    """
+    Args:
+        message (Message): fulfillment message
+
+    Returns:
+        Optional[List[str]]: the texts of a text message; modifying the list modifies the message
+    """
+    if isinstance(message, IntentMessage):
+        return message.text.text if message.text is not None else None
+    text: Optional[Dict[str, Any]] = message.get("text")
+    return text.get("text") if text else None
+
+
+def set_texts(message: Message, texts: List[str]) -> None:
+    """
+    Args:
+        message (Message): text message
+        texts (List[str]): new texts of the message
+    """
+    if isinstance(message, IntentMessage):
+        message.text = IntentMessageText(text=texts)
+    else:
+        message["text"] = {**(message.get("text") or {}), "text": texts}
+
+
+def create_text_message(text: str) -> Dict[str, Any]:
+    """
+    Args:
+        text (str): text of the message
+
+    Returns:
+        Dict[str, Any]: new text message
+    """
+    return {"text": {"text": [text]}}
+
+
+class FulfillmentMessages:
+    """
+    Wraps a list of fulfillment messages and indexes the positions of the messages per message type.
+
+    All changes are made to the wrapped list, which is returned unchanged in identity by to_list().
+    """
+
+    def __init__(self, messages: List[Any]) -> None:
+        """
+        Args:
+            messages (List[Any]): fulfillment messages (List[Message]), not copied
+        """
+        self._messages: List[Message] = messages
+        self._positions: Dict[str, List[int]] = {}
+        for position, message in enumerate(messages):
+            self._index(position, message)
+
+    def _index(self, position: int, message: Message) -> None:
+        message_type: Optional[str] = get_message_type(message)
+        if message_type is not None:
+            self._positions.setdefault(message_type, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._messages)
+
+    def to_list(self) -> List[Message]:
+        """
+        Returns:
+            List[Message]: the wrapped list of fulfillment messages
+        """
+        return self._messages
+
+    def has(self, message_type: str) -> bool:
+        """
+        Args:
+            message_type (str): message type, e.g. "text"
+
+        Returns:
+            bool: True if there is a message of the type
+        """
+        return message_type in self._positions
+
+    def positions(self, message_type: str) -> List[int]:
+        """
+        Args:
+            message_type (str): message type, e.g. "text"
+
+        Returns:
+            List[int]: positions of the messages of the type in the list
+        """
+        return list(self._positions.get(message_type, []))
+
+    def first(self, message_type: str) -> Optional[Message]:
+        """
+        Args:
+            message_type (str): message type, e.g. "text"
+
+        Returns:
+            Optional[Message]: the first message of the type
+        """
+        positions: Optional[List[int]] = self._positions.get(message_type)
+        return self._messages[positions[0]] if positions else None
+
+    def of_type(self, message_type: str) -> List[Message]:
+        """
+        Args:
+            message_type (str): message type, e.g. "text"
+
+        Returns:
+            List[Message]: the messages of the type in the order of the list
+        """
+        return [self._messages[position] for position in self._positions.get(message_type, [])]
+
+    def append(self, message: Message) -> None:
+        """
+        Args:
+            message (Message): message appended to the list
+        """
+        self._messages.append(message)
+        self._index(len(self._messages) - 1, message)
+
+    def add_text(self, text: str) -> None:
+        """
+        Adds the text to the first text message, or appends a new text message if there is none.
+
+        Args:
+            text (str): text to add
+        """
+        message: Optional[Message] = self.first("text")
+        texts: Optional[List[str]] = get_texts(message) if message is not None else None
+        if message is None:
+            self.append(create_text_message(text))
+        elif texts is None:
+            set_texts(message, [text])
+        else:
+            texts.append(text)
+
+    def override_text(self, text: str) -> None:
+        """
+        Replaces the texts of the first text message by the text, or appends a new text message if there is none.
+
+        Args:
+            text (str): new text
+        """
+        message: Optional[Message] = self.first("text")
+        if message is None:
+            self.append(create_text_message(text))
+        else:
+            set_texts(message, [text])
+
+    def iter_texts(self) -> Iterator[List[str]]:
+        """
+        Yields:
+            List[str]: the texts of every text message; modifying a list modifies its message
+        """
+        for message in self.of_type("text"):
+            texts: Optional[List[str]] = get_texts(message)
+            if texts is not None:
+                yield texts
@@ -17,16 +17,35 @@ from typing import (
     Dict,
     List,
     Optional,
+    Set,
 )
 
-from bs4 import BeautifulSoup
 from ondewo.logging.logger import logger_console as log
-from requests import get
 
 from ondewo_nlu_webhook_server.server.base_models import (
     Context,
     Intent,
 )
+from ondewo_nlu_webhook_server.server.session_info import (
+    SessionInfo,
+    get_session_info,
+)
+from ondewo_nlu_webhook_server_custom_integration.price_service import (
+    PriceIndex,
+    PriceTable,
+    price_table_cache,
+)
+from ondewo_nlu_webhook_server_custom_integration.utils.fulfillment_messages import (
+    FulfillmentMessages,
+    Message,
+    create_text_message,
+    get_texts,
+)
+from ondewo_nlu_webhook_server_custom_integration.utils.templates import (
+    collect_template_values,
+    get_template_slots,
+    render_fulfillment_messages,
+)
 
 
 def add_text_to_fulfillment(fulfillment_messages: List[Dict[str, Any]], text: str) -> List[Dict[str, Any]]:
@@ -34,6 +53,8 @@ def add_text_to_fulfillment(fulfillment_messages: List[Dict[str, Any]], text: st
     add an entry to the text section of the fulfillment messages
     if no text entries are in the messages, a text entry with the desired text will be created
 
+    For several changes of the same messages, wrap them once into a FulfillmentMessages object instead.
+
     Args:
         fulfillment_messages (List[Dict[str, Any]]): list of fulfillment messages
         text (str): text to add to the text section of the fulfillment messages
@@ -41,12 +62,8 @@ def add_text_to_fulfillment(fulfillment_messages: List[Dict[str, Any]], text: st
     Returns:
         list of fulfillment messages with new text added
     """
-    if check_if_text_response_exist(fulfillment_messages):
-        idx = get_index_of_text_entry(fulfillment_messages)
-        fulfillment_messages[idx]["text"]["text"].append(text)
-        return fulfillment_messages
-    else:
-        return _append_message_to_fulfillment(fulfillment_messages, text)
+    FulfillmentMessages(fulfillment_messages).add_text(text)
+    return fulfillment_messages
 
 
 def check_if_text_response_exist(fulfillment_messages: List[Dict[str, Any]]) -> bool:
@@ -54,7 +71,7 @@ def check_if_text_response_exist(fulfillment_messages: List[Dict[str, Any]]) ->
     Checks if a text response exists in the provided fulfillment messages.
 
     This function examines a list of fulfillment messages (commonly from a chatbot or
-    messaging platform) and determines whether any of the messages contain a "text"
+    messaging platform) and determines whether the first text message contains a "text"
     field with content.
 
     Args:
@@ -62,17 +79,11 @@ def check_if_text_response_exist(fulfillment_messages: List[Dict[str, Any]]) ->
         where each message is a dictionary that may contain a "text" key.
 
     Returns:
-        bool: True if any message contains a "text" field with content,
+        bool: True if the first text message contains a "text" field with content,
         otherwise False.
     """
-    if len(fulfillment_messages) >= 1:
-        if any("text" in message.keys() for message in fulfillment_messages):
-            for message in fulfillment_messages:
-                if "text" in message.keys():
-                    break
-            if "text" in message["text"].keys():  # type: ignore
-                return True
-    return False
+    message: Optional[Message] = FulfillmentMessages(fulfillment_messages).first("text")
+    return message is not None and get_texts(message) is not None
 
 
 def override_fulfillment_with_text(
@@ -85,6 +96,8 @@ def override_fulfillment_with_text(
     it updates the content of the first "text" field with the provided `text` value.
     If no "text" entry is found, it appends a new message with the given text.
 
+    For several changes of the same messages, wrap them once into a FulfillmentMessages object instead.
+
     Args:
         fulfillment_messages (List[Dict[str, Any]]): A list of fulfillment messages, where
             each message may contain various fields, including a "text" field.
@@ -94,12 +107,8 @@ def override_fulfillment_with_text(
         List[Dict[str, Any]]: The updated list of fulfillment messages, with the "text" field
         overridden or appended based on the current state of the messages.
     """
-    if check_if_text_response_exist(fulfillment_messages):
-        idx = get_index_of_text_entry(fulfillment_messages)
-        fulfillment_messages[idx]["text"]["text"] = [text]
-        return fulfillment_messages
-    else:
-        return _append_message_to_fulfillment(fulfillment_messages, text)
+    FulfillmentMessages(fulfillment_messages).override_text(text)
+    return fulfillment_messages
 
 
 def _append_message_to_fulfillment(
@@ -133,7 +142,7 @@ def _append_message_to_fulfillment(
         - It is primarily for use cases where appending a new text message is necessary without
           considering existing "text" messages.
     """
-    fulfillment_messages.append({"text": {"text": [text]}})
+    fulfillment_messages.append(create_text_message(text))
     return fulfillment_messages
 
 
@@ -142,10 +151,6 @@ def get_index_of_text_entry(fulfillment_messages: List[Dict[str, Any]]) -> int:
     Searches for the index of the first message containing a "text" field in the
     given list of fulfillment messages.
 
-    This function iterates through the `fulfillment_messages` list and returns the index
-    of the first entry that contains a "text" field. If no such message is found,
-    it raises a `ValueError`.
-
     Args:
         fulfillment_messages (List[Dict[str, Any]]): A list of dictionaries representing
             the fulfillment messages. Each message may contain various fields, and this
@@ -157,10 +162,10 @@ def get_index_of_text_entry(fulfillment_messages: List[Dict[str, Any]]) -> int:
     Raises:
         ValueError: If no message containing a "text" field is found in the list.
     """
-    for idx, entry in enumerate(fulfillment_messages):
-        if "text" in entry.keys():
-            return idx
-    raise ValueError(f"Could not find text entries! messages: {str(fulfillment_messages)}")
+    positions: List[int] = FulfillmentMessages(fulfillment_messages).positions("text")
+    if not positions:
+        raise ValueError(f"Could not find text entries! messages: {str(fulfillment_messages)}")
+    return positions[0]
 
 
 def create_new_context_name(
@@ -171,7 +176,8 @@ def create_new_context_name(
 ) -> str:
     """
     Creates a compatible context name from the given string by either extracting the correct project
-    and session IDs from an active context, or by constructing it from the provided input.
+    and session IDs from the session of the request being processed resp. an active context, or by
+    constructing it from the provided input.
 
     Args:
         active_contexts (List[Context]): A list of active contexts. If provided, the function will
@@ -190,129 +196,100 @@ def create_new_context_name(
         ValueError: If neither active contexts nor both project_id and session_id are provided.
     """
     if not project_id and not session_id:
-        if len(active_contexts) < 1:
+        # parsed once per request by the relay, see ondewo_nlu_webhook_server.server.session_info
+        session_info: Optional[SessionInfo] = get_session_info()
+        if session_info is None or session_info.session_id is None:
+            session_info = SessionInfo(session="", contexts=active_contexts)
+        if session_info.session_id is None:
             raise ValueError(
                 "If no project ID and session ID are provided, at least one active context is needed "
                 + "to extract project and session IDs",
             )
-        some_context_name = active_contexts[0].name
-        project_id = some_context_name.split("projects/")[1].split("/agent")[0]
-        session_id = some_context_name.split("sessions/")[1].split("/active_contexts")[0]
+        project_id, session_id = session_info.project_id, session_info.session_id
 
-    return f"projects/{project_id}/agent/sessions/{session_id}/active_contexts/{context_name}"
+    return f"projects/{project_id}/agent/sessions/{session_id}/contexts/{context_name}"
 
 
-def replace_placeholder_in_text(
+async def replace_placeholder_in_text(
     fulfillment_messages: List[Dict[str, Any]],
     replace_text: str,
     active_intent: Intent,
     parameters: Optional[Dict[str, Any]],
+    active_contexts: Optional[List[Context]] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Replaces the placeholder '<>' in the 'text' field of fulfillment messages with the provided ID value.
+    Replaces the placeholders '<name>' in the 'text' field of fulfillment messages.
 
-    This function searches for a placeholder (`<>`) in the text field of the fulfillment messages
-    and replaces it with the provided `replace_text`. If the placeholder is not found, the list
-    of fulfillment messages is returned without modification. The function supports optional
-    parameters, including `active_intent` and additional context in `parameters`.
+    All placeholders of a text are replaced in one pass by the compiled template of the text, see utils.templates.
+    Placeholders named like a parameter of the request or of an active context are replaced by its value; the
+    intent-specific placeholders below are computed only if a text contains them. Placeholders without a value are
+    kept unchanged.
 
     Args:
         fulfillment_messages (List[Dict[str, Any]]): A list of fulfillment messages.
             Each message can contain various fields, including "text".
-        replace_text (str): The value to replace the placeholder (`<>`) in the text message.
+        replace_text (str): The value of the placeholder '<organization_name>' resp. the placeholder to replace by
+            the price of the example web request.
         active_intent (Intent): The current intent associated with the request, which may
             influence how the placeholder is replaced.
         parameters (Optional[Dict[str, Any]], optional): Additional context or parameters
             that may be used during the placeholder replacement (default is None).
+        active_contexts (Optional[List[Context]], optional): active contexts whose parameter values may be used
+            during the placeholder replacement (default is None).
 
     Returns:
         List[Dict[str, Any]]: The updated list of fulfillment messages with the placeholder replaced.
 
     """
-    for message in fulfillment_messages:
-        if "text" in message and "text" in message["text"]:
-            for i, message_text in enumerate(message["text"]["text"]):
-                if "<" in message_text and ">" in message_text:
-
-                    # Default Welcome Intent
-                    if active_intent.displayName == "Default Welcome Intent":
-                        message["text"]["text"][i] = message_text.replace("<organization_name>", replace_text)
-
-                    elif active_intent.displayName in ["i.example_webrequest"]:  # TODO: Example Intent, use yours
-                        url: str = "https://www.myurl.com/my-page"
-                        data = extract_price(url)
-                        assert parameters
-                        parameter_type: str = parameters['MyEntityType'][0]  # TODO: example entity type, use yours
-                        price: str
-                        if parameter_type == "parameter1":  # TODO: example parameter, use yours
-                            price = next(
-                                (
-                                    item["price"] for item in data['my-product-1'] if  # type: ignore
-                                    "my-product-category" in item["category"]
-                                ), None,
-                            )[:-2]
-                        else:
-                            price = next(
-                                (
-                                    item["price"] for item in data['my-product-2'] if  # type: ignore
-                                    "my-product-category" in item["category"]
-                                ), None,
-                            )[:-2]
-
-                        assert price is not None
-                        # replace with correct price based on TypeOfVehicle
-                        message["text"]["text"][i] = message_text.replace(replace_text, price)
-
-                    else:
-                        log.debug("Nothing to replace.")
+    slots: Set[str] = get_template_slots(fulfillment_messages)
+    if not slots:
+        log.debug("Nothing to replace.")
+        return fulfillment_messages
 
-    return fulfillment_messages
+    values: Dict[str, str] = collect_template_values(parameters, active_contexts)
+
+    # Default Welcome Intent
+    if active_intent.displayName == "Default Welcome Intent":
+        values["organization_name"] = replace_text
+
+    elif active_intent.displayName in ["i.example_webrequest"]:  # TODO: Example Intent, use yours
+        placeholder: str = replace_text.strip("<>")
+        if placeholder in slots:
+            url: str = "https://www.myurl.com/my-page"
+            price_index: PriceIndex = await price_table_cache.get_index(url)
+            assert parameters
+            parameter_type: str = parameters['MyEntityType'][0]  # TODO: example entity type, use yours
+            product: str = (
+                "my-product-1" if parameter_type == "parameter1"  # TODO: example parameter, use yours
+                else "my-product-2"
+            )
+            price: Optional[str] = price_index.find_by_substring(product, "my-product-category")
 
+            assert price is not None
+            # replace with correct price based on TypeOfVehicle
+            values[placeholder] = price[:-2]
 
-def extract_price(url: str) -> Dict[str, List[Dict[str, str]]]:
+    return render_fulfillment_messages(fulfillment_messages, values)
+
+
+async def extract_price(url: str) -> PriceTable:
     """
     Extracts price information from a webpage containing a structured HTML table.
 
-    This function fetches the webpage from the provided URL, parses it using BeautifulSoup,
-    and extracts price-related data from a specific table. The extracted data includes
-    categories, prices, and optional notes.
+    The webpage is fetched without blocking the event loop and the parsed table is cached, see
+    price_service.PriceTableCache.
 
     Args:
         url (str): The URL of the webpage containing the price table.
 
     Returns:
-        Dict[str, List[Dict[str, str]]]: A dictionary containing a list of extracted price entries.
+        PriceTable: A dictionary containing a list of extracted price entries.
         Each entry is a dictionary with the following keys:
             - "category" (str): The category name from the first column.
             - "price" (str): The price from the second column.
 
     Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request.
+        httpx.HTTPError: If there is an issue with the HTTP request.
         AssertionError: If the expected table or rows are not found in the HTML.
     """
-    response = get(url)
-    response.raise_for_status()  # Ensure the request was successful
-
-    soup: BeautifulSoup = BeautifulSoup(response.text, "html.parser")
-
-    # Find the table containing the data
-    table = soup.find("div", class_="table-box").find("table", class_="table")  # type: ignore
-    assert table is not None
-    rows = table.find_all("tr", class_="tablerow")  # type:ignore
-    assert rows is not None
-
-    values: List = []
-    # Parse the rows for data
-    for row in rows:
-        cells = row.find_all("td")
-        if len(cells) >= 2:
-            category = cells[0].get_text(strip=True)
-            price = cells[1].get_text(strip=True)
-            values.append(
-                {
-                    "category": category,
-                    "price": price,
-                },
-            )
-
-    return {"price_list": values}
+    return await price_table_cache.get(url)
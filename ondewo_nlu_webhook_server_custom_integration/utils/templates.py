@@ -0,0 +1,165 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Template engine for the placeholders "<name>" in the texts of fulfillment messages.
+
+Every text is compiled once into its literal segments and placeholder slots, the compiled templates are cached by text.
+Rendering fills all slots of a text in one pass. Placeholders without a value are kept unchanged.
+"""
+import re
+from functools import lru_cache
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import Context
+from ondewo_nlu_webhook_server_custom_integration.utils.fulfillment_messages import FulfillmentMessages
+
+PLACEHOLDER_PATTERN: Pattern[str] = re.compile(r"<([^<>\s]+)>")
+
+
+class CompiledTemplate:
+    """
+    A text split into literal segments and the names of the placeholder slots between them.
+    """
+
+    __slots__ = ("segments", "slots", "_parts")
+
+    def __init__(self, segments: Tuple[str, ...], slots: Tuple[str, ...]) -> None:
+        """
+        Args:
+            segments (Tuple[str, ...]): literal segments, one more than slots
+            slots (Tuple[str, ...]): placeholder names between the segments
+        """
+        self.segments: Tuple[str, ...] = segments
+        self.slots: Tuple[str, ...] = slots
+        # (slot, placeholder kept if the slot has no value, literal segment after the slot)
+        self._parts: Tuple[Tuple[str, str, str], ...] = tuple(
+            (slot, f"<{slot}>", segment) for slot, segment in zip(slots, segments[1:])
+        )
+
+    def render(self, values: Mapping[str, str]) -> str:
+        """
+        Args:
+            values (Mapping[str, str]): values of the placeholders by name
+
+        Returns:
+            str: the text with the placeholders replaced by their values
+        """
+        if not self._parts:
+            return self.segments[0]
+        parts: List[str] = [self.segments[0]]
+        for slot, placeholder, segment in self._parts:
+            parts.append(values.get(slot, placeholder))
+            parts.append(segment)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(text: str) -> CompiledTemplate:
+    """
+    Args:
+        text (str): text with placeholders "<name>"
+
+    Returns:
+        CompiledTemplate: the compiled text, cached by text
+    """
+    # re.split returns the literal segments with the captured placeholder names in between
+    parts: List[str] = PLACEHOLDER_PATTERN.split(text)
+    return CompiledTemplate(segments=tuple(parts[0::2]), slots=tuple(parts[1::2]))
+
+
+def render_template(text: str, values: Mapping[str, str]) -> str:
+    """
+    Args:
+        text (str): text with placeholders "<name>"
+        values (Mapping[str, str]): values of the placeholders by name
+
+    Returns:
+        str: the text with the placeholders replaced by their values
+    """
+    return compile_template(text).render(values)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def collect_template_values(
+    parameters: Optional[Dict[str, Any]],
+    active_contexts: Optional[List[Context]] = None,
+) -> Dict[str, str]:
+    """
+    Collects the values of the placeholders from the parameters of the request and of the active contexts.
+
+    Args:
+        parameters (Optional[Dict[str, Any]]): global parameters, list values are joined with ", "
+        active_contexts (Optional[List[Context]]): active contexts, their parameter values are available by
+            parameter name; global parameters take precedence
+
+    Returns:
+        Dict[str, str]: values of the placeholders by name
+    """
+    values: Dict[str, str] = {}
+    for context in active_contexts or []:
+        for name, parameter in context.parameters.items():
+            values.setdefault(name, parameter.value)
+    for name, value in (parameters or {}).items():
+        if value is not None and value != "":
+            values[name] = _format_value(value)
+    return values
+
+
+def get_template_slots(fulfillment_messages: List[Dict[str, Any]]) -> Set[str]:
+    """
+    Args:
+        fulfillment_messages (List[Dict[str, Any]]): list of fulfillment messages, dicts or IntentMessage objects
+
+    Returns:
+        Set[str]: names of all placeholders in the texts of the messages
+    """
+    slots: Set[str] = set()
+    for texts in FulfillmentMessages(fulfillment_messages).iter_texts():
+        for text in texts:
+            slots.update(compile_template(text).slots)
+    return slots
+
+
+def render_fulfillment_messages(
+    fulfillment_messages: List[Dict[str, Any]],
+    values: Mapping[str, str],
+) -> List[Dict[str, Any]]:
+    """
+    Replaces the placeholders in the texts of the fulfillment messages in place.
+
+    Args:
+        fulfillment_messages (List[Dict[str, Any]]): list of fulfillment messages, dicts or IntentMessage objects
+        values (Mapping[str, str]): values of the placeholders by name
+
+    Returns:
+        List[Dict[str, Any]]: the fulfillment messages with the placeholders replaced
+    """
+    for texts in FulfillmentMessages(fulfillment_messages).iter_texts():
+        texts[:] = [render_template(text, values) for text in texts]
+    return fulfillment_messages
@@ -0,0 +1,90 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmark of handing the contexts of a request to the custom code: deepcopy vs. copy-on-write, for custom code
+which does not touch the contexts and for custom code which reads every parameter
+
+Run with:
+    python -m tests.benchmarks.benchmark_copy_on_write
+"""
+import timeit
+from copy import deepcopy
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    Parameter,
+)
+from ondewo_nlu_webhook_server.server.copy_on_write import copy_contexts_on_write
+
+SIZES: List[Tuple[int, int]] = [(1, 2), (5, 10), (20, 20), (50, 50)]
+NUMBER_OF_RUNS: int = 200
+
+
+def create_contexts(number_of_contexts: int, number_of_parameters: int) -> List[Context]:
+    """Creates contexts with string parameters."""
+    return [
+        Context(
+            name=f"projects/<PROJECT-ID>/agent/sessions/<SESSION-ID>/contexts/context_{i}",
+            lifespanCount=5,
+            parameters={
+                f"parameter_{j}": Parameter(
+                    name=f"parameter_{j}",
+                    display_name=f"parameter_{j}",
+                    value=f"value {j}",
+                    value_original=f"original value {j}",
+                )
+                for j in range(number_of_parameters)
+            },
+        )
+        for i in range(number_of_contexts)
+    ]
+
+
+def read_all_parameters(contexts: Optional[List[Context]]) -> None:
+    """Mimics custom code which reads every parameter of every context."""
+    for context in contexts or []:
+        for parameter in context.parameters.values():
+            parameter.value
+
+
+def measure(function: Callable[[], object]) -> float:
+    """Returns the mean time in microseconds of one call."""
+    return timeit.timeit(function, number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS * 1e6
+
+
+def main() -> None:
+    print(
+        f"{'contexts':>9} {'parameters':>11} {'deepcopy [us]':>14} {'cow untouched [us]':>19} "
+        f"{'cow read all [us]':>18}",
+    )
+    for number_of_contexts, number_of_parameters in SIZES:
+        contexts: List[Context] = create_contexts(number_of_contexts, number_of_parameters)
+        deepcopy_us: float = measure(lambda: read_all_parameters(deepcopy(contexts)))
+        untouched_us: float = measure(lambda: copy_contexts_on_write(contexts))
+        read_all_us: float = measure(lambda: read_all_parameters(copy_contexts_on_write(contexts)))
+        print(
+            f"{number_of_contexts:>9} {number_of_parameters:>11} {deepcopy_us:>14.1f} {untouched_us:>19.1f} "
+            f"{read_all_us:>18.1f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmark of the price lookup in replace_placeholder_in_text: linear next() scan vs. PriceIndex, for a category
+substring of the last entry only and for a substring common to all entries
+
+Run with:
+    python -m tests.benchmarks.benchmark_price_index
+"""
+import timeit
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+
+from ondewo_nlu_webhook_server_custom_integration.price_service import (
+    PriceIndex,
+    PriceTable,
+)
+
+NUMBERS_OF_ENTRIES: List[int] = [10, 100, 1000, 10000]
+NUMBER_OF_RUNS: int = 200
+SUBSTRING: str = "my-product-category"
+COMMON_SUBSTRING: str = "category"
+
+
+def create_table(number_of_entries: int) -> PriceTable:
+    """Creates a price table whose last entry matches the substring."""
+    entries = [{"category": f"category {i}", "price": f"{i},00 €"} for i in range(number_of_entries - 1)]
+    entries.append({"category": f"special {SUBSTRING}", "price": "99,00 €"})
+    return {"my-product-1": entries}
+
+
+def scan(table: PriceTable, substring: str) -> Optional[str]:
+    """The lookup of replace_placeholder_in_text before the index."""
+    return next((item["price"] for item in table["my-product-1"] if substring in item["category"]), None)
+
+
+def measure(function: Callable[[], object]) -> float:
+    """Returns the mean time in microseconds of one call."""
+    return timeit.timeit(function, number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS * 1e6
+
+
+def main() -> None:
+    print(
+        f"{'entries':>8} {'scan [us]':>10} {'index [us]':>11} {'scan common [us]':>17} {'index common [us]':>18} "
+        f"{'build [ms]':>11}",
+    )
+    for number_of_entries in NUMBERS_OF_ENTRIES:
+        table: PriceTable = create_table(number_of_entries)
+        index: PriceIndex = PriceIndex(table)
+        scan_us: float = measure(lambda: scan(table, SUBSTRING))
+        index_us: float = measure(lambda: index.find_by_substring("my-product-1", SUBSTRING))
+        scan_common_us: float = measure(lambda: scan(table, COMMON_SUBSTRING))
+        index_common_us: float = measure(lambda: index.find_by_substring("my-product-1", COMMON_SUBSTRING))
+        build_us: float = measure(lambda: PriceIndex(table))
+        print(
+            f"{number_of_entries:>8} {scan_us:>10.2f} {index_us:>11.2f} {scan_common_us:>17.2f} "
+            f"{index_common_us:>18.2f} {build_us / 1000:>11.2f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark of the webhook request decoding: legacy two-pass decoding vs. single-pass decoding from the raw body
+
+Run with:
+    python -m tests.benchmarks.benchmark_request_decoding
+"""
+import json
+import timeit
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import WebhookRequest
+from ondewo_nlu_webhook_server.server.request_decoding import decode_webhook_request
+
+SCALE_FACTORS: List[int] = [1, 10, 100, 1000]
+NUMBER_OF_RUNS: int = 200
+
+
+def create_scaled_request_body(scale_factor: int, string_wrapped: bool) -> bytes:
+    """
+    Creates the body of a sample webhook request whose contexts and fulfillment messages are multiplied
+
+    Args:
+        scale_factor (int): number of copies of the contexts and fulfillment messages of the sample request
+        string_wrapped (bool): wrap the json object into a json string as ondewo-nlu-cai does
+
+    Returns:
+        bytes: the request body
+    """
+    request_dict: Dict[str, Any] = WebhookRequest.create_sample_request().model_dump()
+    query_result: Dict[str, Any] = request_dict["queryResult"]
+    query_result["outputContexts"] = [
+        {**context, "name": f"{context['name']} {i}"}
+        for i in range(scale_factor)
+        for context in query_result["outputContexts"]
+    ]
+    query_result["fulfillmentMessages"] = query_result["fulfillmentMessages"] * scale_factor
+    body: str = json.dumps(request_dict)
+    if string_wrapped:
+        body = json.dumps(body)
+    return body.encode("utf-8")
+
+
+def decode_legacy(body: bytes) -> WebhookRequest:
+    """Decoding as done by server.call_case before the single-pass decoding."""
+    request_json: Any = json.loads(body)
+    if isinstance(request_json, str):
+        request_json = json.loads(request_json)
+    webhook_request: WebhookRequest = WebhookRequest(**request_json)
+    assert WebhookRequest.model_validate(webhook_request)
+    return webhook_request
+
+
+def measure(function: Callable[[bytes], WebhookRequest], body: bytes) -> float:
+    """Returns the mean time in microseconds of one decoding."""
+    return timeit.timeit(lambda: function(body), number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS * 1e6
+
+
+def main() -> None:
+    print(f"{'wrapped':>8} {'scale':>6} {'size [kB]':>10} {'legacy [us]':>12} {'single-pass [us]':>17} {'saving':>7}")
+    for string_wrapped in (False, True):
+        for scale_factor in SCALE_FACTORS:
+            body: bytes = create_scaled_request_body(scale_factor=scale_factor, string_wrapped=string_wrapped)
+            assert decode_legacy(body) == decode_webhook_request(body)
+
+            legacy_us: float = measure(decode_legacy, body)
+            single_pass_us: float = measure(decode_webhook_request, body)
+            print(
+                f"{str(string_wrapped):>8} {scale_factor:>6} {len(body) / 1024:>10.1f} {legacy_us:>12.1f} "
+                f"{single_pass_us:>17.1f} {1 - single_pass_us / legacy_us:>7.1%}",
+            )
+
+
+if __name__ == "__main__":
+    main()
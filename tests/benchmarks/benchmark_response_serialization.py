@@ -0,0 +1,107 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmark of the WebhookResponse serialization for large fulfillment message lists: FastAPI `response_model`
+handling (dump, re-validation, json encoding) vs. the precompiled serializer
+
+Run with:
+    python -m tests.benchmarks.benchmark_response_serialization
+"""
+import json
+import timeit
+from typing import (
+    Callable,
+    List,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    EventInput,
+    IntentMessage,
+    IntentMessageCard,
+    IntentMessageCardButton,
+    IntentMessageQuickReplies,
+    IntentMessageText,
+    WebhookRequest,
+    WebhookResponse,
+)
+from ondewo_nlu_webhook_server.server.serialization import serialize_webhook_response
+
+NUMBERS_OF_MESSAGES: List[int] = [1, 10, 100, 1000]
+NUMBER_OF_RUNS: int = 200
+
+
+def create_response(number_of_messages: int) -> WebhookResponse:
+    """Creates a response with a mix of text, quick reply and card messages."""
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    messages: List[IntentMessage] = []
+    for i in range(number_of_messages):
+        if i % 3 == 0:
+            messages.append(IntentMessage(text=IntentMessageText(text=[f"message {i}", "second line"])))
+        elif i % 3 == 1:
+            messages.append(
+                IntentMessage(quick_replies=IntentMessageQuickReplies(title=f"title {i}", quick_replies=["a", "b"])),
+            )
+        else:
+            messages.append(
+                IntentMessage(
+                    card=IntentMessageCard(
+                        title=f"card {i}",
+                        buttons=[IntentMessageCardButton(text="button", postback="postback")],
+                    ),
+                ),
+            )
+    return WebhookResponse(
+        fulfillmentText='',
+        fulfillmentMessages=messages,
+        source='',
+        payload={},
+        outputContexts=webhook_request.queryResult.outputContexts,
+        followupEventInput=EventInput(),
+    )
+
+
+def serialize_response_model(webhook_response: WebhookResponse) -> bytes:
+    """Mimics the FastAPI response_model handling: dump, re-validate, serialize to python, encode json."""
+    validated: WebhookResponse = WebhookResponse.model_validate(webhook_response.model_dump(by_alias=True))
+    return json.dumps(
+        validated.model_dump(mode="json", by_alias=True),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def measure(function: Callable[[WebhookResponse], bytes], webhook_response: WebhookResponse) -> float:
+    """Returns the mean time in microseconds of one serialization."""
+    return timeit.timeit(lambda: function(webhook_response), number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS * 1e6
+
+
+def main() -> None:
+    print(f"{'messages':>9} {'response_model [us]':>20} {'precompiled [us]':>17} {'speedup':>8} {'bytes saved':>12}")
+    for number_of_messages in NUMBERS_OF_MESSAGES:
+        webhook_response: WebhookResponse = create_response(number_of_messages)
+        response_model_us: float = measure(serialize_response_model, webhook_response)
+        precompiled_us: float = measure(serialize_webhook_response, webhook_response)
+        bytes_saved: int = (
+            len(serialize_response_model(webhook_response)) - len(serialize_webhook_response(webhook_response))
+        )
+        print(
+            f"{number_of_messages:>9} {response_model_us:>20.1f} {precompiled_us:>17.1f} "
+            f"{response_model_us / precompiled_us:>7.1f}x {bytes_saved:>12}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmark of filling the placeholders of fulfillment texts: one str.replace per placeholder and text vs. the
+compiled templates
+
+Run with:
+    python -m tests.benchmarks.benchmark_templates
+"""
+import timeit
+from typing import (
+    Callable,
+    Dict,
+    List,
+)
+
+from ondewo_nlu_webhook_server_custom_integration.utils.templates import render_template
+
+SIZES: List[int] = [1, 5, 20, 50]
+NUMBER_OF_TEXTS: int = 20
+NUMBER_OF_RUNS: int = 200
+
+
+def create_texts(number_of_placeholders: int) -> List[str]:
+    """Creates texts with every placeholder once."""
+    return [
+        " ".join(f"word {i} <placeholder_{j}>" for j in range(number_of_placeholders)) + "."
+        for i in range(NUMBER_OF_TEXTS)
+    ]
+
+
+def replace_each(texts: List[str], values: Dict[str, str]) -> List[str]:
+    """Fills the placeholders as before the template engine: rescans every text for every placeholder."""
+    result: List[str] = []
+    for text in texts:
+        if "<" in text and ">" in text:
+            for name, value in values.items():
+                text = text.replace(f"<{name}>", value)
+        result.append(text)
+    return result
+
+
+def render_all(texts: List[str], values: Dict[str, str]) -> List[str]:
+    return [render_template(text, values) for text in texts]
+
+
+def measure(function: Callable[[], object]) -> float:
+    """Returns the mean time in microseconds of one call."""
+    return timeit.timeit(function, number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS * 1e6
+
+
+def main() -> None:
+    print(f"{'placeholders':>13} {'str.replace [us]':>17} {'compiled [us]':>14} {'speedup':>8}")
+    for number_of_placeholders in SIZES:
+        texts: List[str] = create_texts(number_of_placeholders)
+        values: Dict[str, str] = {f"placeholder_{j}": f"value {j}" for j in range(number_of_placeholders)}
+        assert replace_each(texts, values) == render_all(texts, values)
+        replace_us: float = measure(lambda: replace_each(texts, values))
+        compiled_us: float = measure(lambda: render_all(texts, values))
+        print(
+            f"{number_of_placeholders:>13} {replace_us:>17.1f} {compiled_us:>14.1f} "
+            f"{replace_us / compiled_us:>7.1f}x",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+
+from starlette.types import (
+    Message,
+    Receive,
+    Scope,
+    Send,
+)
+
+from ondewo_nlu_webhook_server.server.admission import (
+    AdmissionController,
+    AdmissionControlMiddleware,
+)
+
+
+def test_queued_requests_are_admitted_in_order_or_shed_after_the_queue_time() -> None:
+    async def run() -> None:
+        controller: AdmissionController = AdmissionController(max_in_flight=1, max_queue_time=0.05)
+        assert await controller.acquire(time.monotonic())
+
+        second: "asyncio.Task[bool]" = asyncio.ensure_future(controller.acquire(time.monotonic()))
+        third: "asyncio.Task[bool]" = asyncio.ensure_future(controller.acquire(time.monotonic()))
+        await asyncio.sleep(0.01)
+        assert controller.stats()["queued"] == 2
+
+        controller.release(None)
+        assert await second
+        assert not await third  # still no free slot after the queue time
+        assert not await controller.acquire(time.monotonic() - 1)  # arrived too long ago to wait at all
+        assert controller.stats() == {"limit": 1, "in_flight": 1, "queued": 0, "admitted": 2, "shed": 2}
+
+    asyncio.run(run())
+
+
+def test_limit_is_decreased_by_slow_and_increased_by_fast_requests() -> None:
+    now: List[float] = [1000.0]
+    controller: AdmissionController = AdmissionController(
+        max_in_flight=10, min_in_flight=2, target_latency=1, decrease_factor=0.5, clock=lambda: now[0],
+    )
+    controller.in_flight = 4
+
+    controller.release(latency=3)
+    assert controller.limit == 5
+    controller.release(latency=3)  # slow at the same time: no further decrease
+    assert controller.limit == 5
+    now[0] += 1
+    controller.release(latency=3)
+    assert controller.limit == 2.5
+    controller.release(latency=0.1)
+    assert controller.limit == 2.9
+
+
+def test_middleware_sheds_webhook_requests_with_retry_after() -> None:
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def call(middleware: AdmissionControlMiddleware, method: str, path: str) -> Dict[str, Any]:
+        messages: List[Message] = []
+
+        async def send(message: Message) -> None:
+            messages.append(message)
+
+        await middleware({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+        return {"status": messages[0]["status"], "headers": dict(messages[0]["headers"])}
+
+    async def run() -> None:
+        controller: AdmissionController = AdmissionController(max_in_flight=1, max_queue_time=0.01)
+        middleware: AdmissionControlMiddleware = AdmissionControlMiddleware(app, controller, retry_after=2)
+        assert (await call(middleware, "POST", "/slot_filling"))["status"] == 200
+
+        assert await controller.acquire(time.monotonic())
+        shed: Dict[str, Any] = await call(middleware, "POST", "/slot_filling")
+        assert shed["status"] == 503
+        assert shed["headers"][b"retry-after"] == b"2"
+        # other routes are not limited
+        assert (await call(middleware, "GET", "/health"))["status"] == 200
+        assert (await call(middleware, "POST", "/batch/slot_filling"))["status"] == 200
+
+    asyncio.run(run())
@@ -0,0 +1,118 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+import pytest
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    Parameter,
+    WebhookRequest,
+)
+from ondewo_nlu_webhook_server.server.copy_on_write import (
+    CopyOnWriteParameter,
+    copy_contexts_on_write,
+)
+
+
+def test_request_contexts_stay_unchanged() -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    request_contexts: Optional[List[Context]] = webhook_request.queryResult.outputContexts
+    assert request_contexts is not None
+    expected: List[dict] = [context.model_dump() for context in request_contexts]
+
+    contexts: Optional[List[Context]] = copy_contexts_on_write(request_contexts)
+    assert contexts is not None
+    contexts[0].parameters["parameter1"].value = "changed"
+    contexts[0].lifespanCount = 5
+    for context in contexts:
+        context.parameters["new"] = Parameter(name="new", display_name="new", value="new", value_original="new")
+        context.parameters.pop("parameter1")
+    contexts.append(Context(name="new context", lifespanCount=1, parameters={}))
+
+    assert [context.model_dump() for context in request_contexts] == expected
+    assert len(contexts) == len(request_contexts) + 1
+    assert all("new" in context.parameters and "parameter1" not in context.parameters for context in contexts[:-1])
+
+
+def test_untouched_contexts_are_not_copied() -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    request_contexts: Optional[List[Context]] = webhook_request.queryResult.outputContexts
+    assert request_contexts is not None
+
+    contexts: Optional[List[Context]] = copy_contexts_on_write(request_contexts)
+    assert contexts is not None
+    assert contexts[1] is not request_contexts[1]
+
+    assert list.__getitem__(contexts, 0) is request_contexts[0]
+    assert copy_contexts_on_write(None) is None
+
+
+@pytest.mark.parametrize(
+    "copy_parameters",
+    [dict, lambda parameters: {**parameters}, lambda parameters: parameters.copy(), copy.copy],
+    ids=["dict", "unpacking", "copy", "copy.copy"],
+)
+def test_copies_of_the_parameters_do_not_share_the_request_parameters(copy_parameters) -> None:  # type: ignore
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    request_contexts: Optional[List[Context]] = webhook_request.queryResult.outputContexts
+    assert request_contexts is not None
+    contexts: Optional[List[Context]] = copy_contexts_on_write(request_contexts)
+    assert contexts is not None
+
+    parameters: Dict[str, Parameter] = copy_parameters(contexts[0].parameters)
+    parameters["parameter1"].value = "changed"
+
+    assert request_contexts[0].parameters["parameter1"].value == "1"
+
+
+def test_copies_of_the_contexts_do_not_share_the_request_contexts() -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    request_contexts: Optional[List[Context]] = webhook_request.queryResult.outputContexts
+    assert request_contexts is not None
+    contexts: Optional[List[Context]] = copy_contexts_on_write(request_contexts)
+    assert contexts is not None
+    lifespan_counts: List[int] = [context.lifespanCount for context in request_contexts]
+
+    contexts.copy()[0].lifespanCount = 99
+    (contexts + [])[1].lifespanCount = 99
+    copy.copy(contexts)[0].parameters["parameter1"].value = "changed"
+
+    assert [context.lifespanCount for context in request_contexts] == lifespan_counts
+    assert request_contexts[0].parameters["parameter1"].value == "1"
+
+
+def test_parameters_are_shared_until_they_are_set() -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    request_contexts: Optional[List[Context]] = webhook_request.queryResult.outputContexts
+    assert request_contexts is not None
+    contexts: Optional[List[Context]] = copy_contexts_on_write(request_contexts)
+    assert contexts is not None
+    request_parameter: Parameter = request_contexts[0].parameters["parameter1"]
+
+    parameter: Parameter = contexts[0].parameters["parameter1"]
+    assert isinstance(parameter, CopyOnWriteParameter)
+    assert parameter.__dict__ is request_parameter.__dict__
+    assert contexts[0].parameters["parameter1"] is parameter
+
+    parameter.value = "changed"
+    assert parameter.__dict__ is not request_parameter.__dict__
+    assert (request_parameter.value, parameter.value) == ("1", "changed")
+    assert parameter.model_dump()["value"] == "changed"
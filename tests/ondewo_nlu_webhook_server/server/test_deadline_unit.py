@@ -0,0 +1,70 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from contextvars import Token
+from typing import Optional
+
+from ondewo_nlu_webhook_server.server.deadline import (
+    TimeBudgets,
+    get_time_budget,
+    get_timeout,
+    reset_deadline,
+    set_deadline,
+)
+
+HEADER: str = "x-ondewo-timeout-ms"
+
+
+def test_most_specific_time_budget_wins() -> None:
+    budgets: TimeBudgets = TimeBudgets(
+        default=4,
+        budgets="slot_filling=1.5, response_refinement:order pizza=3,response_refinement:no limit=0,invalid=x",
+    )
+
+    assert budgets.get("slot_filling", "order pizza") == 1.5
+    assert budgets.get("response_refinement", "order pizza") == 3
+    assert budgets.get("response_refinement", "other intent") == 4
+    assert budgets.get("response_refinement", "no limit") is None
+    assert TimeBudgets(default=0).get("slot_filling", "order pizza") is None
+
+
+def test_header_shortens_the_time_budget() -> None:
+    budgets: TimeBudgets = TimeBudgets(default=2)
+
+    def budget(header_value: Optional[str]) -> Optional[float]:
+        headers = {HEADER: header_value} if header_value is not None else {}
+        return get_time_budget(budgets, "slot_filling", "intent", headers, HEADER)
+
+    assert budget(None) == 2
+    assert budget("500") == 0.5
+    assert budget("5000") == 2
+    assert budget("invalid") == 2
+    for not_a_waiting_time in ["nan", "inf", "-5", "0"]:
+        assert budget(not_a_waiting_time) == 2
+    assert get_time_budget(TimeBudgets(default=None), "slot_filling", "intent", {HEADER: "300"}, HEADER) == 0.3
+    assert get_time_budget(TimeBudgets(default=None), "slot_filling", "intent", {HEADER: "nan"}, HEADER) is None
+
+
+def test_timeouts_of_outbound_calls_are_bounded_by_the_deadline() -> None:
+    assert get_timeout(10) == 10
+
+    token: Token = set_deadline(1)
+    try:
+        timeout: Optional[float] = get_timeout(10)
+        assert timeout is not None and 0.9 < timeout <= 1
+        assert get_timeout(0.5) == 0.5
+    finally:
+        reset_deadline(token)
+
+    assert get_timeout(None) is None
@@ -0,0 +1,72 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import List
+
+import pytest
+from starlette.types import (
+    Message,
+    Receive,
+)
+
+from ondewo_nlu_webhook_server.server.disconnect import (
+    ClientDisconnected,
+    cancel_on_disconnect,
+)
+
+
+def _receive_disconnect_after(seconds: float) -> Receive:
+    async def receive() -> Message:
+        await asyncio.sleep(seconds)
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+def test_work_is_cancelled_when_the_client_disconnects() -> None:
+    events: List[str] = []
+
+    async def custom_code() -> str:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return "response"
+
+    async def run() -> None:
+        with pytest.raises(ClientDisconnected):
+            await cancel_on_disconnect(custom_code(), _receive_disconnect_after(0.01))
+        assert events == ["cancelled"]
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(run())
+
+
+def test_result_is_returned_and_the_watcher_stopped_if_the_client_waits() -> None:
+    async def custom_code() -> str:
+        await asyncio.sleep(0.01)
+        return "response"
+
+    async def failing_code() -> str:
+        raise ValueError("failed")
+
+    async def run() -> None:
+        assert await cancel_on_disconnect(custom_code(), _receive_disconnect_after(10)) == "response"
+        with pytest.raises(ValueError):
+            await cancel_on_disconnect(failing_code(), _receive_disconnect_after(10))
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(run())
@@ -0,0 +1,64 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import (
+    List,
+    Optional,
+)
+
+import pytest
+
+from ondewo_nlu_webhook_server.constants import (
+    RESPONSE_REFINEMENT_CASE,
+    SLOT_FILLING_CASE,
+)
+from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    Intent,
+)
+from ondewo_nlu_webhook_server.server.intent_handler_registry import IntentHandlerRegistry
+
+
+async def handler(active_intent: Intent, active_contexts: Optional[List[Context]] = None) -> Optional[List[Context]]:
+    return active_contexts
+
+
+def create_intent(display_name: str, intent_id: str) -> Intent:
+    return Intent(name=f"projects/<PROJECT-ID>/agent/intents/{intent_id}", displayName=display_name)
+
+
+def test_dispatch_by_display_name_and_intent_id() -> None:
+    registry: IntentHandlerRegistry = IntentHandlerRegistry()
+    registry.register(SLOT_FILLING_CASE, "my intent", "1234-abcd")(handler)
+
+    assert registry.get_handler(SLOT_FILLING_CASE, create_intent("my intent", "other-id")) is handler
+    assert registry.get_handler(SLOT_FILLING_CASE, create_intent("renamed intent", "1234-abcd")) is handler
+    assert registry.get_handler(SLOT_FILLING_CASE, create_intent("other intent", "other-id")) is None
+    assert not registry.is_handled(RESPONSE_REFINEMENT_CASE, create_intent("my intent", "1234-abcd"))
+
+    assert registry.handled_intents(SLOT_FILLING_CASE) == frozenset({"my intent", "1234-abcd"})
+    assert registry.handled_intents(RESPONSE_REFINEMENT_CASE) == frozenset()
+
+
+def test_register_conflicting_handler() -> None:
+    async def other_handler() -> None:
+        pass
+
+    registry: IntentHandlerRegistry = IntentHandlerRegistry()
+    registry.register(RESPONSE_REFINEMENT_CASE, "my intent")(handler)
+
+    with pytest.raises(ValueError):
+        registry.register(RESPONSE_REFINEMENT_CASE, "my intent")(other_handler)
+    with pytest.raises(ValueError):
+        registry.register("unknown_call_case", "my intent")
@@ -0,0 +1,156 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import pytest
+
+from ondewo_nlu_webhook_server.constants import (
+    OUTCOME_CACHED,
+    OUTCOME_HANDLED,
+    RESPONSE_REFINEMENT_CASE,
+)
+from ondewo_nlu_webhook_server.server import relay
+from ondewo_nlu_webhook_server.server.base_models import (
+    Parameter,
+    WebhookRequest,
+    WebhookResponse,
+)
+from ondewo_nlu_webhook_server.server.deadline import (
+    TimeBudgets,
+    get_remaining_time,
+)
+from ondewo_nlu_webhook_server.server.intent_handler_registry import IntentHandlerRegistry
+from ondewo_nlu_webhook_server.server.response_cache import (
+    CachePolicy,
+    ResponseCache,
+    key_by_parameters,
+)
+from ondewo_nlu_webhook_server.server.server import create_default_webhook_response
+
+
+@pytest.fixture
+def dispatched_calls(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Replaces the custom code dispatch of the relay and records for which intents it is called."""
+    calls: List[str] = []
+
+    async def response_refinement(**kwargs: Any) -> Tuple[Any, Any]:
+        calls.append(kwargs["active_intent"].displayName)
+        return kwargs["fulfillment_messages"], kwargs["active_contexts"]
+
+    registry: IntentHandlerRegistry = IntentHandlerRegistry()
+    registry.register(RESPONSE_REFINEMENT_CASE, "handled intent")(response_refinement)
+    monkeypatch.setattr(relay, "intent_handler_registry", registry)
+    monkeypatch.setattr(relay, "response_refinement", response_refinement)
+    return calls
+
+
+@pytest.mark.parametrize("intent_display_name", ["handled intent", "unhandled intent"])
+def test_call_custom_code_skips_unhandled_intents(intent_display_name: str, dispatched_calls: List[str]) -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    webhook_request.queryResult.intent.displayName = intent_display_name
+    webhook_response: WebhookResponse = create_default_webhook_response(webhook_request)
+
+    result: WebhookResponse = asyncio.run(
+        relay.call_custom_code(
+            webhook_request=webhook_request,
+            webhook_response=webhook_response,
+            call_case=RESPONSE_REFINEMENT_CASE,
+        ),
+    )
+
+    assert result is webhook_response
+    assert dispatched_calls == ([intent_display_name] if intent_display_name == "handled intent" else [])
+
+
+def test_call_custom_code_returns_default_response_after_time_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    remaining_times: List[Optional[float]] = []
+
+    async def response_refinement(**kwargs: Any) -> Tuple[Any, Any]:
+        remaining_times.append(get_remaining_time())
+        kwargs["active_contexts"][0].parameters["new"] = Parameter(name="new", display_name="new", value="new", value_original="new")
+        kwargs["fulfillment_messages"][0].text.text.append("changed")
+        await asyncio.sleep(1)
+        return kwargs["fulfillment_messages"], kwargs["active_contexts"]
+
+    registry: IntentHandlerRegistry = IntentHandlerRegistry()
+    registry.register(RESPONSE_REFINEMENT_CASE, "slow intent")(response_refinement)
+    monkeypatch.setattr(relay, "intent_handler_registry", registry)
+    monkeypatch.setattr(relay, "response_refinement", response_refinement)
+    monkeypatch.setattr(relay, "time_budgets", TimeBudgets(default=None, budgets="response_refinement=5"))
+
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    webhook_request.queryResult.intent.displayName = "slow intent"
+    # ondewo-cai waits for 50 ms only
+    webhook_request.headers = {"x-ondewo-timeout-ms": "50"}
+    webhook_response: WebhookResponse = create_default_webhook_response(webhook_request)
+    expected: Dict[str, Any] = webhook_response.model_dump()
+
+    result: WebhookResponse = asyncio.run(
+        relay.call_custom_code(
+            webhook_request=webhook_request,
+            webhook_response=webhook_response,
+            call_case=RESPONSE_REFINEMENT_CASE,
+        ),
+    )
+
+    assert result is webhook_response
+    assert result.model_dump() == expected
+    assert remaining_times[0] is not None and 0 < remaining_times[0] <= 0.05
+    assert get_remaining_time() is None
+
+
+def test_call_custom_code_serves_cached_handlers_from_the_response_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: List[str] = []
+
+    async def response_refinement(**kwargs: Any) -> Tuple[Any, Any]:
+        calls.append(kwargs["parameters"]["city"])
+        kwargs["fulfillment_messages"][0].text.text = [f"weather in {kwargs['parameters']['city']}"]
+        return kwargs["fulfillment_messages"], kwargs["active_contexts"]
+
+    registry: IntentHandlerRegistry = IntentHandlerRegistry()
+    registry.register(
+        RESPONSE_REFINEMENT_CASE, "weather", cache_policy=CachePolicy(key=key_by_parameters("city"), ttl=60),
+    )(response_refinement)
+    monkeypatch.setattr(relay, "intent_handler_registry", registry)
+    monkeypatch.setattr(relay, "response_refinement", response_refinement)
+    monkeypatch.setattr(relay, "response_cache", ResponseCache(max_entries=8))
+
+    async def refine(city: str) -> Tuple[Any, str]:
+        webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+        webhook_request.queryResult.intent.displayName = "weather"
+        webhook_request.queryResult.parameters = {"city": city}
+        result: WebhookResponse = await relay.call_custom_code(
+            webhook_request=webhook_request,
+            webhook_response=create_default_webhook_response(webhook_request),
+            call_case=RESPONSE_REFINEMENT_CASE,
+        )
+        return result.fulfillmentMessages[0].text.text, relay.get_custom_code_outcome()  # type: ignore[union-attr]
+
+    async def run() -> None:
+        assert await refine("Vienna") == (["weather in Vienna"], OUTCOME_HANDLED)
+        assert await refine("Vienna") == (["weather in Vienna"], OUTCOME_CACHED)
+        assert await refine("Graz") == (["weather in Graz"], OUTCOME_HANDLED)
+
+    asyncio.run(run())
+
+    assert calls == ["Vienna", "Graz"]
+    assert relay.response_cache.stats() == {"hits": 1, "misses": 2, "evictions": 0, "size": 2, "max_size": 8}
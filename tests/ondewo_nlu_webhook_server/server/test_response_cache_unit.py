@@ -0,0 +1,51 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List
+
+import pytest
+
+from ondewo_nlu_webhook_server.constants import SLOT_FILLING_CASE
+from ondewo_nlu_webhook_server.server.intent_handler_registry import IntentHandlerRegistry
+from ondewo_nlu_webhook_server.server.response_cache import (
+    CachePolicy,
+    ResponseCache,
+    key_by_parameters,
+)
+
+
+def test_least_recently_used_and_expired_entries_are_removed() -> None:
+    now: List[float] = [1000.0]
+    cache: ResponseCache = ResponseCache(max_entries=2, clock=lambda: now[0])
+    cache.put("a", ["message a"], ttl=10)
+    cache.put("b", ["message b"], ttl=10)
+    assert cache.get("a") == ["message a"]
+
+    cache.put("c", ["message c"], ttl=10)  # evicts "b", "a" was used more recently
+    assert cache.get("b") is None
+    assert cache.get("c") == ["message c"]
+
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "evictions": 1, "size": 1, "max_size": 2}
+
+
+def test_only_response_refinement_handlers_can_be_cached() -> None:
+    async def handler() -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        IntentHandlerRegistry().register(
+            SLOT_FILLING_CASE, "intent", cache_policy=CachePolicy(key=key_by_parameters(), ttl=60),
+        )(handler)
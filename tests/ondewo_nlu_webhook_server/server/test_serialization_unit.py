@@ -0,0 +1,60 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from typing import (
+    Any,
+    Dict,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    EventInput,
+    WebhookRequest,
+    WebhookResponse,
+)
+from ondewo_nlu_webhook_server.server.serialization import serialize_webhook_response
+
+
+def create_sample_response() -> WebhookResponse:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    return WebhookResponse(
+        fulfillmentText=webhook_request.queryResult.fulfillmentText,
+        fulfillmentMessages=webhook_request.queryResult.fulfillmentMessages or [],
+        source='',
+        payload={},
+        outputContexts=webhook_request.queryResult.outputContexts,
+        followupEventInput=EventInput(),
+    )
+
+
+def test_serialize_webhook_response_drops_none_fields() -> None:
+    webhook_response: WebhookResponse = create_sample_response()
+    serialized: Dict[str, Any] = json.loads(serialize_webhook_response(webhook_response))
+
+    assert serialized == webhook_response.model_dump(mode="json", exclude_none=True)
+    assert serialized["fulfillmentMessages"] == [
+        {"text": {"text": ["first message", "second message"]}, "platform": "PLATFORM_UNSPECIFIED"},
+    ]
+    assert WebhookResponse.model_validate(serialized) == WebhookResponse.model_validate(
+        webhook_response.model_dump(),
+    )
+
+
+def test_serialize_webhook_response_with_dict_messages() -> None:
+    webhook_response: WebhookResponse = create_sample_response()
+    # custom code may assign plain dicts without validation
+    webhook_response.fulfillmentMessages = [{"text": {"text": ["plain dict"]}}]  # type: ignore
+
+    serialized: Dict[str, Any] = json.loads(serialize_webhook_response(webhook_response))
+    assert serialized["fulfillmentMessages"] == [{"text": {"text": ["plain dict"]}}]
@@ -12,15 +12,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import json
 from typing import (
     Any,
     Dict,
+    List,
 )
 
+import pytest
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBasicCredentials
 from fastapi.testclient import TestClient
+from starlette.requests import (
+    ClientDisconnect,
+    Request,
+)
 
+from ondewo_nlu_webhook_server.metrics import (
+    metrics_registry,
+    requests_in_flight,
+)
 from ondewo_nlu_webhook_server.server.__main__ import app
 from ondewo_nlu_webhook_server.server.base_models import WebhookResponse
+from ondewo_nlu_webhook_server.server import server as server_module
+from ondewo_nlu_webhook_server.server.server import batch_call_case
 
 client = TestClient(app)
 
@@ -43,6 +59,19 @@ def test_valid_request(valid_request_data: Dict[str, Any], headers: Dict[str, st
     assert webhook_response
 
 
+def test_valid_string_wrapped_request(valid_request_data: Dict[str, Any], headers: Dict[str, str]) -> None:
+    """Test valid request sent as json string, as done by ondewo-nlu-cai."""
+    response = client.post(
+        url="/slot_filling",
+        headers=headers,
+        json=json.dumps(valid_request_data),
+    )
+    assert response.status_code == 200
+    webhook_response: WebhookResponse = WebhookResponse(**response.json())
+    assert webhook_response.outputContexts
+    assert len(webhook_response.outputContexts) == len(valid_request_data["queryResult"]["outputContexts"])
+
+
 def test_invalid_call_case(headers: Dict[str, str]) -> None:
     """Test invalid call_case."""
     response = client.post(
@@ -98,4 +127,188 @@ def test_custom_code_execution(valid_request_data: Dict[str, Any], headers: Dict
     webhook_response: WebhookResponse = WebhookResponse(**response_json)
     assert webhook_response
 
+
+def test_batch_request(valid_request_data: Dict[str, Any], headers: Dict[str, str]) -> None:
+    """Test NDJSON batch request: one response per request line in input order."""
+    lines: List[str] = []
+    for i in range(5):
+        valid_request_data["queryResult"]["fulfillmentText"] = f"request {i}"
+        lines.append(json.dumps(valid_request_data))
+    # string-wrapped requests of ondewo-nlu-cai are accepted as well
+    lines.append(json.dumps(json.dumps(valid_request_data)))
+
+    response = client.post(
+        url="/batch/response_refinement",
+        headers=headers,
+        content="\n".join(lines).encode("utf-8"),
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    webhook_responses: List[WebhookResponse] = [
+        WebhookResponse.model_validate_json(line) for line in response.text.splitlines()
+    ]
+    assert [webhook_response.fulfillmentText for webhook_response in webhook_responses] == [
+        "request 0", "request 1", "request 2", "request 3", "request 4", "request 4",
+    ]
+
+
+def test_batch_request_invalid_line(valid_request_data: Dict[str, Any], headers: Dict[str, str]) -> None:
+    """Test NDJSON batch request with an invalid line."""
+    response = client.post(
+        url="/batch/slot_filling",
+        headers=headers,
+        content=f"{json.dumps(valid_request_data)}\nnot a json\n".encode("utf-8"),
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid JSON format in line 2"}
+
+
+def test_metrics(
+    valid_request_data: Dict[str, Any],
+    headers: Dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that webhook requests are recorded in the latency histograms served in the Prometheus text format."""
+    monkeypatch.setattr(metrics_registry, "directory", "")
+    client.post(url="/slot_filling", headers=headers, json=valid_request_data)
+    client.post(url="/slot_filling", headers=headers, content="not a json")
+
+    response = client.get(url="/metrics", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    intent: str = valid_request_data["queryResult"]["intent"]["displayName"]
+    assert (
+        f'ondewo_nlu_webhook_request_duration_seconds_count{{call_case="slot_filling",intent="{intent}",'
+        'outcome="unhandled",status_code="200"}'
+    ) in response.text
+    assert (
+        'ondewo_nlu_webhook_request_duration_seconds_count{call_case="slot_filling",intent="",'
+        'outcome="invalid",status_code="400"}'
+    ) in response.text
+    assert 'ondewo_nlu_webhook_requests_in_flight{call_case="slot_filling"} 0.0' in response.text
+    assert client.get(url="/metrics").status_code == 401
+
+
+def _metric_value(text: str, sample: str) -> float:
+    values: List[float] = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(f"{sample} ")]
+    return values[0] if values else 0.0
+
+
+def test_batch_metrics(
+    valid_request_data: Dict[str, Any],
+    headers: Dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that the requests of a batch and the batch itself are recorded in the latency histograms."""
+    monkeypatch.setattr(metrics_registry, "directory", "")
+    intent: str = valid_request_data["queryResult"]["intent"]["displayName"]
+    item: str = (
+        f'ondewo_nlu_webhook_request_duration_seconds_count{{call_case="slot_filling",intent="{intent}",'
+        'outcome="unhandled",status_code="200"}'
+    )
+    batch: str = (
+        'ondewo_nlu_webhook_request_duration_seconds_count{call_case="batch/slot_filling",intent="",'
+        'outcome="handled",status_code="200"}'
+    )
+    invalid_batch: str = (
+        'ondewo_nlu_webhook_request_duration_seconds_count{call_case="batch/slot_filling",intent="",'
+        'outcome="invalid",status_code="400"}'
+    )
+    before: str = client.get(url="/metrics", headers=headers).text
+
+    response = client.post(
+        url="/batch/slot_filling",
+        headers=headers,
+        content="\n".join([json.dumps(valid_request_data)] * 3).encode("utf-8"),
+    )
+    assert len(response.text.splitlines()) == 3
+    client.post(url="/batch/slot_filling", headers=headers, content=b"not a json")
+
+    after: str = client.get(url="/metrics", headers=headers).text
+    assert _metric_value(after, item) - _metric_value(before, item) == 3
+    assert _metric_value(after, batch) - _metric_value(before, batch) == 1
+    assert _metric_value(after, invalid_batch) - _metric_value(before, invalid_batch) == 1
+    assert 'ondewo_nlu_webhook_requests_in_flight{call_case="batch/slot_filling"} 0.0' in after
+    assert 'ondewo_nlu_webhook_requests_in_flight{call_case="slot_filling"} 0.0' in after
+    assert 'ondewo_nlu_webhook_span_duration_seconds_count{span="batch_call_case_stream"}' in after
+
+
+def test_call_case_metrics_tell_invalid_requests_from_errors(
+    valid_request_data: Dict[str, Any],
+    headers: Dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that only undecodable requests are recorded as invalid, other failures as errors."""
+    monkeypatch.setattr(metrics_registry, "directory", "")
+    intent: str = valid_request_data["queryResult"]["intent"]["displayName"]
+    invalid: str = (
+        'ondewo_nlu_webhook_request_duration_seconds_count{call_case="slot_filling",intent="",'
+        'outcome="invalid",status_code="400"}'
+    )
+    error: str = (
+        f'ondewo_nlu_webhook_request_duration_seconds_count{{call_case="slot_filling",intent="{intent}",'
+        'outcome="error",status_code="500"}'
+    )
+    before: str = client.get(url="/metrics", headers=headers).text
+
+    assert client.post(url="/slot_filling", headers=headers, content=b"not a json").status_code == 400
+
+    async def failing_custom_code(**kwargs: Any) -> WebhookResponse:
+        raise RuntimeError("custom code failed")
+
+    monkeypatch.setattr(server_module, "call_custom_code", failing_custom_code)
+    with pytest.raises(RuntimeError):
+        client.post(url="/slot_filling", headers=headers, json=valid_request_data)
+
+    after: str = client.get(url="/metrics", headers=headers).text
+    assert _metric_value(after, invalid) - _metric_value(before, invalid) == 1
+    assert _metric_value(after, error) - _metric_value(before, error) == 1
+
+
+# the route is called directly, the credentials are verified by its dependency
+CREDENTIALS: HTTPBasicCredentials = HTTPBasicCredentials(username="user", password="password")
+
+
+def _batch_request(messages: List[Dict[str, Any]]) -> Request:
+    async def receive() -> Dict[str, Any]:
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "path": "/batch/slot_filling", "headers": []}, receive)
+
+
+def test_batch_gauge_is_restored_if_the_client_disconnects_during_the_upload() -> None:
+    """Test that a batch whose client disconnects before the body is read does not stay in flight."""
+    request: Request = _batch_request([{"type": "http.disconnect"}])
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(batch_call_case("slot_filling", request, CREDENTIALS))
+    assert requests_in_flight._values[("batch/slot_filling",)] == 0
+
+
+def test_batch_requests_are_only_processed_by_the_stream(valid_request_data: Dict[str, Any]) -> None:
+    """Test that a batch response which is never streamed neither starts the requests nor stays in flight."""
+    request: Request = _batch_request(
+        [{"type": "http.request", "body": json.dumps(valid_request_data).encode("utf-8"), "more_body": False}],
+    )
+
+    async def run() -> None:
+        response: StreamingResponse = await batch_call_case("slot_filling", request, CREDENTIALS)
+        assert isinstance(response, StreamingResponse)
+        await asyncio.sleep(0.01)
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(run())
+    assert requests_in_flight._values[("batch/slot_filling",)] == 0
+    assert requests_in_flight._values[("slot_filling",)] == 0
+
 # Ensure you include other edge cases and scenarios as needed.
+
+
+def test_profile_worker(headers: Dict[str, str]) -> None:
+    """Test that a profiling session of the worker returns collapsed stacks and rejects unknown modes."""
+    response = client.post(url="/admin/profile?mode=sampler&duration=0.05", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["x-worker-pid"]
+    assert response.headers["content-disposition"].endswith('.collapsed"')
+    assert response.text.strip().rsplit(" ", 1)[1].isdigit()
+
+    assert client.post(url="/admin/profile?mode=perf", headers=headers).status_code == 400
@@ -0,0 +1,87 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from contextvars import Token
+from typing import (
+    List,
+    Optional,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    Context,
+    Parameter,
+    WebhookRequest,
+)
+from ondewo_nlu_webhook_server.server.copy_on_write import copy_contexts_on_write
+from ondewo_nlu_webhook_server.server.session_info import (
+    SessionInfo,
+    get_session_info,
+    reset_session_info,
+    set_session_info,
+)
+from ondewo_nlu_webhook_server_custom_integration.utils.helpers import create_new_context_name
+
+SESSION: str = "projects/my-project/agent/sessions/my-session"
+
+
+def create_context(short_name: str, *parameter_names: str) -> Context:
+    return Context(
+        name=f"{SESSION}/contexts/{short_name}",
+        lifespanCount=1,
+        parameters={
+            name: Parameter(name=name, display_name=name, value=name, value_original=name)
+            for name in parameter_names
+        },
+    )
+
+
+def test_session_info_indexes() -> None:
+    request_contexts: List[Context] = [create_context("a", "p1", "p2"), create_context("b", "p2")]
+    contexts: Optional[List[Context]] = copy_contexts_on_write(request_contexts)
+    assert contexts is not None
+    session_info: SessionInfo = SessionInfo(session=SESSION, contexts=contexts)
+
+    assert (session_info.project_id, session_info.session_id) == ("my-project", "my-session")
+    assert session_info.create_context_name("c") == f"{SESSION}/contexts/c"
+
+    # lookups return the contexts handed to the custom code, not the contexts of the request
+    context_b: Optional[Context] = session_info.get_context("b")
+    assert context_b is contexts[1] and context_b is not request_contexts[1]
+    assert [context.name for context in session_info.get_contexts_with_parameter("p2")] == [
+        f"{SESSION}/contexts/a", f"{SESSION}/contexts/b",
+    ]
+    assert session_info.get_context("c") is None
+
+    # removing a context rebuilds the indexes
+    contexts.pop(0)
+    assert session_info.get_context("b") is contexts[0]
+    assert session_info.get_contexts_with_parameter("p1") == []
+
+
+def test_create_new_context_name() -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    webhook_request.session = SESSION
+
+    token: Token = set_session_info(SessionInfo.from_request(webhook_request))
+    try:
+        assert create_new_context_name([], "c") == f"{SESSION}/contexts/c"
+    finally:
+        reset_session_info(token)
+    assert get_session_info() is None
+
+    # outside of a request the IDs are parsed from the first active context
+    other_session: str = "projects/other-project/agent/sessions/other-session"
+    context: Context = Context(name=f"{other_session}/contexts/a", lifespanCount=1, parameters={})
+    assert create_new_context_name([context], "c") == f"{other_session}/contexts/c"
+    assert create_new_context_name([], "c", "p", "s") == "projects/p/agent/sessions/s/contexts/c"
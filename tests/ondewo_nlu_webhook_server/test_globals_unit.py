@@ -0,0 +1,33 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_server_does_not_start_without_batch_concurrency(value: str) -> None:
+    environment: Dict[str, str] = {**os.environ, "ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BATCH_MAX_CONCURRENCY": value}
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-c", "import ondewo_nlu_webhook_server.globals"],
+        env=environment,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "ONDEWO_NLU_WEBHOOK_SERVER_PYTHON_BATCH_MAX_CONCURRENCY must be at least 1" in result.stderr
@@ -0,0 +1,59 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from typing import List
+
+import pytest
+
+from ondewo_nlu_webhook_server.lazy_logging import (
+    LazyLogger,
+    PayloadDumpSampler,
+)
+
+
+@pytest.fixture
+def lazy_logger() -> LazyLogger:
+    logger: logging.Logger = logging.getLogger("test_lazy_logging_unit")
+    logger.setLevel(logging.INFO)
+    return LazyLogger(logger)
+
+
+def test_lazy_message_not_evaluated_for_disabled_level(lazy_logger: LazyLogger) -> None:
+    evaluated: List[str] = []
+    lazy_logger.debug(lambda: evaluated.append("debug") or "debug")  # type: ignore
+    lazy_logger.info(lambda: evaluated.append("info") or "info")  # type: ignore
+    assert evaluated == ["info"]
+
+
+def test_records_are_attributed_to_the_caller(lazy_logger: LazyLogger, caplog: pytest.LogCaptureFixture) -> None:
+    with caplog.at_level(logging.INFO, logger=lazy_logger.logger.name):
+        lazy_logger.info(lambda: "lazy")
+        lazy_logger.log(logging.WARNING, "plain")
+    assert [record.funcName for record in caplog.records] == ["test_records_are_attributed_to_the_caller"] * 2
+    assert all(record.filename == "test_lazy_logging_unit.py" for record in caplog.records)
+
+
+def test_payload_dump_sampler(lazy_logger: LazyLogger) -> None:
+    sampler: PayloadDumpSampler = PayloadDumpSampler(
+        lazy_logger=lazy_logger,
+        sample_rate=3,
+        intents=frozenset({"my intent"}),
+    )
+    # debug logging is disabled: nothing is dumped
+    assert not sampler.should_dump("my intent")
+
+    lazy_logger.logger.setLevel(logging.DEBUG)
+    assert not sampler.should_dump("other intent")
+    assert [sampler.should_dump("my intent") for _ in range(6)] == [True, False, False, True, False, False]
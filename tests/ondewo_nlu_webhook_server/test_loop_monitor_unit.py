@@ -0,0 +1,44 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from typing import List
+
+from ondewo_nlu_webhook_server.loop_monitor import EventLoopMonitor
+from ondewo_nlu_webhook_server.metrics import MetricsRegistry
+
+
+def test_blocking_call_is_detected_with_its_stack() -> None:
+    registry: MetricsRegistry = MetricsRegistry()
+    monitor: EventLoopMonitor = EventLoopMonitor(registry, interval=0.02, lag_threshold=0.05)
+
+    async def blocking_handler() -> None:
+        time.sleep(0.3)
+
+    async def run() -> None:
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await blocking_handler()
+        await asyncio.sleep(0.1)
+        await monitor.close()
+
+    asyncio.run(run())
+
+    assert monitor.blocked == 1
+    assert "blocking_handler" in monitor.last_blocking_stack
+    assert monitor.max_lag >= 0.2
+    lines: List[str] = registry.render(registry.snapshot()).splitlines()
+    assert "ondewo_nlu_webhook_event_loop_blocked 1.0" in lines
+    assert 'ondewo_nlu_webhook_threadpool{state="waiting"} 0.0' in lines
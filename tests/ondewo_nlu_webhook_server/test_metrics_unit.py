@@ -0,0 +1,64 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from pathlib import Path
+from typing import List
+
+from ondewo_nlu_webhook_server.metrics import (
+    Histogram,
+    MetricsRegistry,
+)
+
+
+def test_histograms_are_rendered_with_cumulative_buckets() -> None:
+    registry: MetricsRegistry = MetricsRegistry()
+    histogram: Histogram = registry.histogram("latency_seconds", "Latency.", ("intent",), buckets=(0.1, 1))
+    for seconds in (0.05, 0.5, 0.5, 2):
+        histogram.observe(('say "hi"',), seconds)
+
+    lines: List[str] = registry.render(registry.snapshot()).splitlines()
+
+    assert lines == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{intent="say \\"hi\\"",le="0.1"} 1.0',
+        'latency_seconds_bucket{intent="say \\"hi\\"",le="1.0"} 3.0',
+        'latency_seconds_bucket{intent="say \\"hi\\"",le="+Inf"} 4.0',
+        'latency_seconds_sum{intent="say \\"hi\\""} 3.05',
+        'latency_seconds_count{intent="say \\"hi\\""} 4.0',
+    ]
+
+
+def test_metrics_of_the_workers_are_merged(tmp_path: Path) -> None:
+    def worker(pid: int) -> MetricsRegistry:
+        return MetricsRegistry(directory=str(tmp_path), get_pid=lambda: pid, is_alive=lambda pid: pid != 3)
+
+    registries: List[MetricsRegistry] = [worker(1), worker(2), worker(3)]
+    for pid, registry in enumerate(registries, start=1):
+        registry.counter("requests_total", "Requests.", ("call_case",)).inc(("slot_filling",), pid)
+        registry.gauge("in_flight", "In flight.").inc()
+        registry.histogram("latency_seconds", "Latency.", buckets=(1,)).observe((), pid)
+        registry.write(registry.snapshot())
+
+    lines: List[str] = registries[0].render(registries[0].snapshot()).splitlines()
+
+    assert 'requests_total{call_case="slot_filling"} 6.0' in lines
+    # the gauge of the stopped worker 3 is not counted, its counters and histograms are kept
+    assert "in_flight 2.0" in lines
+    assert 'latency_seconds_bucket{le="1.0"} 1.0' in lines
+    assert "latency_seconds_count 3.0" in lines
+
+    registries[0].clear()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,80 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import marshal
+import pstats
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from ondewo_nlu_webhook_server.profiler import (
+    Profiler,
+    ProfilingInProgress,
+)
+
+
+async def busy_handler(seconds: float) -> None:
+    # holds the GIL in chunks of 20ms, longer than the switch interval of the interpreter
+    end: float = time.monotonic() + seconds
+    while time.monotonic() < end:
+        chunk_end: float = time.monotonic() + 0.02
+        while time.monotonic() < chunk_end:
+            pass
+        await asyncio.sleep(0)
+
+
+def test_sampler_returns_collapsed_stacks_of_the_event_loop() -> None:
+    async def run() -> bytes:
+        session: "asyncio.Task[bytes]" = asyncio.ensure_future(Profiler().profile("sampler", 0.2, interval=0.002))
+        await busy_handler(0.3)
+        return await session
+
+    lines: List[str] = asyncio.run(run()).decode().splitlines()
+
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    assert any(line.startswith("MainThread;") and "busy_handler" in line for line in lines)
+
+
+def test_cprofile_returns_a_pstats_dump(tmp_path: Path) -> None:
+    async def run() -> bytes:
+        session: "asyncio.Task[bytes]" = asyncio.ensure_future(Profiler().profile("cprofile", 0.1))
+        await busy_handler(0.05)
+        return await session
+
+    path: Path = tmp_path / "worker.prof"
+    path.write_bytes(asyncio.run(run()))
+
+    stats: pstats.Stats = pstats.Stats(str(path))
+    assert any(function == "busy_handler" for _, _, function in marshal.loads(path.read_bytes()))
+    assert stats.total_calls > 0  # type: ignore[attr-defined]
+
+
+def test_invalid_and_concurrent_sessions_are_rejected() -> None:
+    async def run() -> None:
+        profiler: Profiler = Profiler(max_duration=1)
+        with pytest.raises(ValueError):
+            await profiler.profile("perf", 0.1)
+        with pytest.raises(ValueError):
+            await profiler.profile("sampler", 2)
+
+        session: "asyncio.Task[bytes]" = asyncio.ensure_future(profiler.profile("sampler", 0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(ProfilingInProgress):
+            await profiler.profile("cprofile", 0.05)
+        await session
+
+    asyncio.run(run())
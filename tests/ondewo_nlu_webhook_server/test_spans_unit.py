@@ -0,0 +1,98 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    AsyncGenerator,
+    List,
+)
+
+from ondewo_nlu_webhook_server.metrics import (
+    Histogram,
+    MetricsRegistry,
+)
+from ondewo_nlu_webhook_server.spans import SpanRecorder
+
+
+def test_spans_of_coroutines_cover_their_execution_and_are_kept_in_a_ring_buffer() -> None:
+    registry: MetricsRegistry = MetricsRegistry()
+    histogram: Histogram = registry.histogram("span_duration_seconds", "Spans.", ("span",))
+    recorder: SpanRecorder = SpanRecorder(capacity=3, histogram=histogram)
+
+    @recorder.span("slow")
+    async def slow() -> str:
+        await asyncio.sleep(0.01)
+        return "slow"
+
+    @recorder.span()
+    def fast(value: int) -> int:
+        return value + 1
+
+    async def run() -> None:
+        assert await asyncio.gather(slow(), slow()) == ["slow", "slow"]
+
+    asyncio.run(run())
+    assert [fast(value) for value in range(2)] == [1, 2]
+
+    names: List[str] = [name for name, _, _ in recorder.spans()]
+    assert names == ["slow", fast.__qualname__, fast.__qualname__]
+    assert recorder.spans()[0][2] >= 10_000_000
+    assert recorder.summary()["slow"]["count"] == 1
+    # the histogram observed the overwritten span as well
+    assert 'span_duration_seconds_count{span="slow"} 2.0' in registry.render(registry.snapshot())
+
+
+def test_spans_are_switched_per_module() -> None:
+    recorder: SpanRecorder = SpanRecorder(capacity=10)
+
+    @recorder.span("traced")
+    def traced() -> None:
+        pass
+
+    recorder.set_enabled(__name__, False)
+    traced()
+    assert recorder.spans() == []
+    assert not recorder.is_enabled(__name__)
+
+    recorder.set_enabled(__name__, True)
+    traced()
+    assert [name for name, _, _ in recorder.spans()] == ["traced"]
+    assert recorder.modules() == {__name__: True}
+
+
+def test_spans_of_async_generators_cover_their_iteration() -> None:
+    recorder: SpanRecorder = SpanRecorder(capacity=10)
+    closed: List[bool] = []
+
+    @recorder.span("stream")
+    async def stream() -> AsyncGenerator[int, None]:
+        try:
+            for value in range(3):
+                await asyncio.sleep(0.01)
+                yield value
+        finally:
+            closed.append(True)
+
+    async def run() -> List[int]:
+        values: List[int] = [value async for value in stream()]
+        generator: AsyncGenerator[int, None] = stream()
+        values.append(await generator.__anext__())
+        # e.g. the client disconnected
+        await generator.aclose()
+        return values
+
+    assert asyncio.run(run()) == [0, 1, 2, 0]
+    assert closed == [True, True]
+    assert [name for name, _, _ in recorder.spans()] == ["stream", "stream"]
+    assert recorder.spans()[0][2] >= 30_000_000
@@ -11,3 +11,132 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import grpc  # type: ignore
+import pytest
+from ondewo.nlu import (
+    context_pb2,
+    context_pb2_grpc,
+    intent_pb2,
+    intent_pb2_grpc,
+)
+
+from ondewo_nlu_webhook_server_custom_integration.nlu_client_pool import AsyncNluClientPool
+
+# serves fake services of ondewo-nlu, the keyword arguments override the arguments of the pool
+NluServer = Callable[..., AsyncContextManager[AsyncNluClientPool]]
+
+
+class FakeIntents(intent_pb2_grpc.IntentsServicer):
+    """
+    Intents service of an agent with 5 intents, returned by ListIntents in pages of 2 intents. It records the calls and
+    the authorization metadata of GetIntent, and answers GetIntent slowly for an intent whose name ends with "slow".
+    """
+
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+        self.metadata: List[Tuple[Tuple[str, str], ...]] = []
+        # status code ListIntents fails with, e.g. because the bulk call exceeds the message size
+        self.list_intents_code: Optional[grpc.StatusCode] = None
+
+    @staticmethod
+    def intent(name: str, language_code: str) -> intent_pb2.Intent:
+        return intent_pb2.Intent(
+            name=name,
+            display_name=f"intent in {language_code}",
+            training_phrases=[
+                intent_pb2.Intent.TrainingPhrase(text=f"phrase {name.rsplit('-', 1)[-1]} in {language_code}"),
+            ],
+        )
+
+    async def ListIntents(
+        self,
+        request: intent_pb2.ListIntentsRequest,
+        context: Any,
+    ) -> intent_pb2.ListIntentsResponse:
+        self.calls.append("ListIntents")
+        if self.list_intents_code is not None:
+            context.set_code(self.list_intents_code)
+            return intent_pb2.ListIntentsResponse()
+        start: int = int(request.page_token or "0")
+        return intent_pb2.ListIntentsResponse(
+            intents=[
+                self.intent(f"{request.parent}/intents/intent-{index}", request.language_code)
+                for index in range(start, min(start + 2, 5))
+            ],
+            next_page_token=str(start + 2) if start + 2 < 5 else "",
+        )
+
+    async def GetIntent(self, request: intent_pb2.GetIntentRequest, context: Any) -> intent_pb2.Intent:
+        self.calls.append("GetIntent")
+        self.metadata.append(tuple((key, value) for key, value in context.invocation_metadata() if key == "authorization"))
+        await asyncio.sleep(1 if request.name.endswith("slow") else 0.01)
+        return self.intent(request.name, request.language_code)
+
+
+class FakeContexts(context_pb2_grpc.ContextsServicer):
+    """Contexts service which returns the contexts of a session in pages of one context."""
+
+    async def ListContexts(
+        self,
+        request: context_pb2.ListContextsRequest,
+        context: Any,
+    ) -> context_pb2.ListContextsResponse:
+        page: int = int(request.page_token or "0")
+        return context_pb2.ListContextsResponse(
+            contexts=[context_pb2.Context(name=f"{request.session_id}/contexts/context-{page}")],
+            next_page_token=str(page + 1) if page < 2 else "",
+        )
+
+
+def _add_servicer(servicer: Any, server: grpc.aio.Server) -> None:
+    # the generated module of a servicer base class registers it with add_<base class>_to_server
+    for base in type(servicer).__mro__:
+        add_servicer: Optional[Callable[[Any, grpc.aio.Server], None]] = getattr(
+            sys.modules[base.__module__], f"add_{base.__name__}_to_server", None,
+        )
+        if add_servicer is not None:
+            add_servicer(servicer, server)
+            return
+    raise TypeError(f"{type(servicer).__name__} is no servicer of a generated grpc module")
+
+
+@pytest.fixture
+def fake_intents() -> FakeIntents:
+    return FakeIntents()
+
+
+@pytest.fixture
+def nlu_server() -> NluServer:
+    """Fixture which serves the given services on a local port and yields a pool of one channel connected to them."""
+
+    @asynccontextmanager
+    async def serve(*servicers: Any, **pool_kwargs: Any) -> AsyncIterator[AsyncNluClientPool]:
+        server: grpc.aio.Server = grpc.aio.server()
+        for servicer in servicers:
+            _add_servicer(servicer, server)
+        port: int = server.add_insecure_port("localhost:0")
+        await server.start()
+        pool: AsyncNluClientPool = AsyncNluClientPool(
+            **{"host_and_port": f"localhost:{port}", "size": 1, "timeout": 5, **pool_kwargs},
+        )
+        try:
+            yield pool
+        finally:
+            await pool.close()
+            await server.stop(None)
+
+    return serve
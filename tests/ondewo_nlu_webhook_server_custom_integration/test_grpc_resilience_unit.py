@@ -0,0 +1,248 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    Any,
+    List,
+)
+
+import grpc  # type: ignore
+import pytest
+from ondewo.nlu import (
+    intent_pb2,
+    intent_pb2_grpc,
+)
+
+from ondewo_nlu_webhook_server_custom_integration.grpc_resilience import (
+    CircuitBreaker,
+    RetryBudget,
+    RetryInterceptor,
+    RetryPolicy,
+    RetryStats,
+)
+from tests.ondewo_nlu_webhook_server_custom_integration.conftest import NluServer
+
+
+class FlakyIntents(intent_pb2_grpc.IntentsServicer):
+    """Intents service which fails with the given status codes before it answers."""
+
+    def __init__(self, failures: List[grpc.StatusCode]) -> None:
+        self.failures: List[grpc.StatusCode] = failures
+        self.calls: int = 0
+
+    async def GetIntent(self, request: intent_pb2.GetIntentRequest, context: Any) -> intent_pb2.Intent:
+        self.calls += 1
+        if self.failures:
+            await context.abort(self.failures.pop(0), "failed")
+        return intent_pb2.Intent(name=request.name)
+
+
+class FixedBackoffPolicy(RetryPolicy):
+    """Retry policy without jitter, every backoff is initial_backoff."""
+
+    def backoff(self, retry: int) -> float:
+        return self.initial_backoff
+
+
+def _rpc_error(code: grpc.StatusCode) -> grpc.aio.AioRpcError:
+    return grpc.aio.AioRpcError(
+        code=code,
+        initial_metadata=grpc.aio.Metadata(),
+        trailing_metadata=grpc.aio.Metadata(),
+    )
+
+
+def _call_details(timeout: float) -> grpc.aio.ClientCallDetails:
+    return grpc.aio.ClientCallDetails(
+        method="/ondewo.nlu.Intents/GetIntent",
+        timeout=timeout,
+        metadata=None,
+        credentials=None,
+        wait_for_ready=None,
+    )
+
+
+def test_transient_failures_are_retried_but_not_others(nlu_server: NluServer) -> None:
+    intents: FlakyIntents = FlakyIntents([grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.UNAVAILABLE])
+
+    async def run() -> None:
+        async with nlu_server(intents, retry_policy=RetryPolicy(max_attempts=3, initial_backoff=0.001)) as pool:
+            assert (await pool.get_intent("my-intent", "de-DE")).name == "my-intent"
+            assert intents.calls == 3
+
+            intents.failures = [grpc.StatusCode.NOT_FOUND]
+            with pytest.raises(grpc.aio.AioRpcError) as error:
+                await pool.get_intent("my-intent", "de-DE")
+            assert error.value.code() == grpc.StatusCode.NOT_FOUND
+            assert intents.calls == 4
+
+    asyncio.run(run())
+
+
+def test_retries_stay_within_the_deadline() -> None:
+    now: List[float] = [1000.0]
+    timeouts: List[float] = []
+    stats: RetryStats = RetryStats()
+    interceptor: RetryInterceptor = RetryInterceptor(
+        policy=FixedBackoffPolicy(max_attempts=100, initial_backoff=0.0625),
+        budget=RetryBudget(retry_ratio=10.0),
+        circuit_breaker=CircuitBreaker(failure_threshold=1000, reset_timeout=10, stats=stats, clock=lambda: now[0]),
+        stats=stats,
+        clock=lambda: now[0],
+    )
+
+    async def unavailable_call(client_call_details: grpc.aio.ClientCallDetails, request: Any) -> Any:
+        timeouts.append(client_call_details.timeout)
+        now[0] += 0.125  # every attempt takes 125 ms
+        raise _rpc_error(grpc.StatusCode.UNAVAILABLE)
+
+    async def run() -> None:
+        with pytest.raises(grpc.aio.AioRpcError):
+            await interceptor.intercept_unary_unary(
+                unavailable_call, _call_details(timeout=0.5), intent_pb2.GetIntentRequest(),
+            )
+
+    asyncio.run(run())
+    # the third attempt ends at 375 ms, the backoff and as much time for another attempt reach the deadline at 500 ms
+    assert timeouts == [0.5, 0.375, 0.25]
+    assert now[0] - 1000.0 <= 0.5
+    assert stats.retries == 2
+    assert stats.retries_denied_by_deadline == 1
+
+
+def test_circuit_breaker_fails_fast_while_open(nlu_server: NluServer) -> None:
+    intents: FlakyIntents = FlakyIntents([grpc.StatusCode.UNAVAILABLE] * 3)
+    now: List[float] = [1000.0]
+    breaker: CircuitBreaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=lambda: now[0])
+
+    async def run() -> None:
+        async with nlu_server(intents, circuit_breaker=breaker) as pool:
+            for _ in range(3):
+                with pytest.raises(grpc.aio.AioRpcError):
+                    await pool.get_intent("my-intent", "de-DE")
+            assert pool.stats()["circuit_breaker_open"] == 1
+
+            with pytest.raises(grpc.aio.AioRpcError) as error:
+                await pool.get_intent("my-intent", "de-DE")
+            assert error.value.code() == grpc.StatusCode.UNAVAILABLE
+            assert intents.calls == 3
+
+            now[0] += 10  # the probe succeeds and closes the breaker
+            assert (await pool.get_intent("my-intent", "de-DE")).name == "my-intent"
+            assert pool.stats()["circuit_breaker_open"] == 0
+
+    asyncio.run(run())
+    assert breaker.stats.circuit_breaker_trips == 1
+    assert breaker.stats.circuit_breaker_rejections == 1
+
+
+def test_retry_budget_is_a_token_bucket() -> None:
+    budget: RetryBudget = RetryBudget(retry_ratio=0.5, max_tokens=2)
+    assert [budget.try_withdraw() for _ in range(3)] == [True, True, False]
+    budget.deposit()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    assert budget.try_withdraw()
+
+
+def test_cancelled_probe_opens_the_circuit_breaker_again() -> None:
+    now: List[float] = [1000.0]
+    breaker: CircuitBreaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    interceptor: RetryInterceptor = RetryInterceptor(
+        policy=RetryPolicy(max_attempts=1),
+        budget=RetryBudget(retry_ratio=0.1),
+        circuit_breaker=breaker,
+        stats=breaker.stats,
+        clock=lambda: now[0],
+    )
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    async def hanging_call(client_call_details: grpc.aio.ClientCallDetails, request: Any) -> Any:
+        await asyncio.Event().wait()
+
+    async def run() -> None:
+        now[0] += 10
+        probe: "asyncio.Task[Any]" = asyncio.ensure_future(
+            interceptor.intercept_unary_unary(hanging_call, _call_details(timeout=5), intent_pb2.GetIntentRequest()),
+        )
+        await asyncio.sleep(0)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    now[0] += 10  # another call probes the backend
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_call_of_a_closed_circuit_breaker_is_no_failure() -> None:
+    stats: RetryStats = RetryStats()
+    breaker: CircuitBreaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, stats=stats)
+    interceptor: RetryInterceptor = RetryInterceptor(
+        policy=RetryPolicy(max_attempts=1),
+        budget=RetryBudget(retry_ratio=0.1),
+        circuit_breaker=breaker,
+        stats=stats,
+    )
+
+    async def cancelled_call(client_call_details: grpc.aio.ClientCallDetails, request: Any) -> Any:
+        raise asyncio.CancelledError()
+
+    async def run() -> None:
+        with pytest.raises(asyncio.CancelledError):
+            await interceptor.intercept_unary_unary(
+                cancelled_call, _call_details(timeout=5), intent_pb2.GetIntentRequest(),
+            )
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert stats.circuit_breaker_trips == 0
+
+
+def test_exceeded_deadline_only_counts_as_failure_with_the_default_timeout() -> None:
+    stats: RetryStats = RetryStats()
+    breaker: CircuitBreaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, stats=stats)
+    interceptor: RetryInterceptor = RetryInterceptor(
+        policy=RetryPolicy(max_attempts=1),
+        budget=RetryBudget(retry_ratio=0.1),
+        circuit_breaker=breaker,
+        stats=stats,
+        default_timeout=5,
+    )
+
+    async def slow_call(client_call_details: grpc.aio.ClientCallDetails, request: Any) -> Any:
+        raise _rpc_error(grpc.StatusCode.DEADLINE_EXCEEDED)
+
+    async def call(timeout: float) -> None:
+        with pytest.raises(grpc.aio.AioRpcError):
+            await interceptor.intercept_unary_unary(slow_call, _call_details(timeout), intent_pb2.GetIntentRequest())
+
+    async def run() -> None:
+        # deadlines shortened to the remaining time of the webhook request
+        for _ in range(5):
+            await call(timeout=0.2)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        for _ in range(2):
+            await call(timeout=5)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    asyncio.run(run())
+    assert stats.circuit_breaker_trips == 1
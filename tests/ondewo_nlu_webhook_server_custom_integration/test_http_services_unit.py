@@ -0,0 +1,81 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    Any,
+    List,
+)
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from ondewo_nlu_webhook_server_custom_integration import http_services
+from ondewo_nlu_webhook_server_custom_integration.http_services import SharedHttpClient
+
+
+def handle_request(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/error":
+        return httpx.Response(503, text="unavailable")
+    if request.url.path == "/timeout":
+        raise httpx.ConnectTimeout("timeout", request=request)
+    return httpx.Response(200, json={"path": request.url.path})
+
+
+@pytest.fixture
+def shared_http_client(monkeypatch: pytest.MonkeyPatch) -> SharedHttpClient:
+    """Replaces the pooled http client by one whose requests are answered by handle_request."""
+    client: SharedHttpClient = SharedHttpClient(
+        limits=httpx.Limits(max_connections=10),
+        timeout=httpx.Timeout(1.0),
+        transport=httpx.MockTransport(handle_request),
+    )
+    monkeypatch.setattr(http_services, "shared_http_client", client)
+    return client
+
+
+def test_make_http_request_reuses_client(shared_http_client: SharedHttpClient) -> None:
+    async def run() -> List[Any]:
+        await shared_http_client.start()
+        client: httpx.AsyncClient = shared_http_client.client
+        results: List[Any] = [
+            await http_services.make_http_request("GET", "http://backend-a/items", headers={}),
+            await http_services.make_http_request("POST", "http://backend-a/items", headers={}, json_payload={"a": 1}),
+            await http_services.make_http_request("GET", "http://backend-b/items", headers={}),
+        ]
+        assert shared_http_client.client is client
+        await shared_http_client.close()
+        assert client.is_closed
+        return results
+
+    assert asyncio.run(run()) == [{"path": "/items"}] * 3
+    stats = shared_http_client.host_stats()
+    assert stats["backend-a"]["requests"] == 2
+    assert stats["backend-b"]["requests"] == 1
+    assert stats["backend-a"]["in_flight_requests"] == 0
+
+
+def test_make_http_request_failures(shared_http_client: SharedHttpClient) -> None:
+    with pytest.raises(HTTPException) as exception_info:
+        asyncio.run(http_services.make_http_request("GET", "http://backend-a/error", headers={}))
+    assert exception_info.value.status_code == 503
+
+    with pytest.raises(httpx.ConnectTimeout):
+        asyncio.run(http_services.make_http_request("GET", "http://backend-a/timeout", headers={}))
+
+    stats = shared_http_client.host_stats()["backend-a"]
+    assert stats["requests"] == 2
+    assert stats["failed_requests"] == 1
+    assert stats["in_flight_requests"] == 0
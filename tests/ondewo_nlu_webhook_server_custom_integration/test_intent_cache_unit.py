@@ -0,0 +1,131 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import List
+
+import grpc  # type: ignore
+from ondewo.nlu import intent_pb2
+
+from ondewo_nlu_webhook_server_custom_integration.intent_cache import IntentCache
+from tests.ondewo_nlu_webhook_server_custom_integration.conftest import (
+    FakeIntents,
+    NluServer,
+)
+
+AGENT: str = "projects/my-project/agent"
+
+
+def test_intents_are_served_from_memory_after_the_warm_up(fake_intents: FakeIntents, nlu_server: NluServer) -> None:
+    now: List[float] = [1000.0]
+
+    async def run() -> None:
+        async with nlu_server(fake_intents) as pool:
+            cache: IntentCache = IntentCache(nlu_client_pool=pool, ttl=60, clock=lambda: now[0])
+            assert await cache.warm_up(AGENT, "de-DE") == 5
+            assert fake_intents.calls == ["ListIntents"] * 3
+
+            intent: intent_pb2.Intent = await cache.get(f"{AGENT}/intents/intent-3", "de-DE")
+            assert intent.training_phrases[0].text == "phrase 3 in de-DE"
+            assert fake_intents.calls == ["ListIntents"] * 3
+
+            # another language is not warmed up: concurrent requests share one GetIntent call
+            english: List[intent_pb2.Intent] = list(
+                await asyncio.gather(*(cache.get(f"{AGENT}/intents/intent-3", "en-US") for _ in range(5))),
+            )
+            assert {intent.training_phrases[0].text for intent in english} == {"phrase 3 in en-US"}
+            assert fake_intents.calls.count("GetIntent") == 1
+
+            now[0] += 61  # expired
+            await cache.get(f"{AGENT}/intents/intent-3", "de-DE")
+            assert fake_intents.calls.count("GetIntent") == 2
+            assert (cache.hits, cache.misses) == (1, 6)
+
+    asyncio.run(run())
+
+
+def test_expired_intents_are_fetched_again(fake_intents: FakeIntents, nlu_server: NluServer) -> None:
+    now: List[float] = [1000.0]
+    name: str = f"{AGENT}/intents/intent-1"
+
+    async def run() -> None:
+        async with nlu_server(fake_intents) as pool:
+            cache: IntentCache = IntentCache(nlu_client_pool=pool, ttl=60, clock=lambda: now[0])
+            first: intent_pb2.Intent = await cache.get(name, "de-DE")
+            now[0] += 59.9
+            assert await cache.get(name, "de-DE") is first
+            assert fake_intents.calls == ["GetIntent"]
+
+            now[0] += 0.1
+            second: intent_pb2.Intent = await cache.get(name, "de-DE")
+            assert second is not first
+            assert second == first
+            assert fake_intents.calls == ["GetIntent"] * 2
+
+            # the fetched intent is cached for another TTL
+            now[0] += 30
+            assert await cache.get(name, "de-DE") is second
+            assert fake_intents.calls == ["GetIntent"] * 2
+            assert (cache.hits, cache.misses) == (2, 2)
+
+    asyncio.run(run())
+
+
+def test_concurrent_misses_share_one_call(fake_intents: FakeIntents, nlu_server: NluServer) -> None:
+    name: str = f"{AGENT}/intents/intent-2"
+
+    async def run() -> None:
+        async with nlu_server(fake_intents) as pool:
+            cache: IntentCache = IntentCache(nlu_client_pool=pool, ttl=60)
+            cancelled: "asyncio.Task[intent_pb2.Intent]" = asyncio.ensure_future(cache.get(name, "de-DE"))
+            waiting: "asyncio.Future[List[intent_pb2.Intent]]" = asyncio.gather(
+                *(cache.get(name, "de-DE") for _ in range(10)),
+            )
+            await asyncio.sleep(0)
+            # a cancelled request does not cancel the call the other requests wait for
+            cancelled.cancel()
+            results: List[intent_pb2.Intent] = await waiting
+            assert len({id(intent) for intent in results}) == 1
+            assert results[0].name == name
+            assert fake_intents.calls == ["GetIntent"]
+            assert (cache.hits, cache.misses) == (0, 11)
+            assert len(cache._fetches) == 0
+
+    asyncio.run(run())
+
+
+def test_intents_are_fetched_one_by_one_if_the_warm_up_fails(fake_intents: FakeIntents, nlu_server: NluServer) -> None:
+    fake_intents.list_intents_code = grpc.StatusCode.UNAVAILABLE
+
+    async def run() -> None:
+        async with nlu_server(fake_intents) as pool:
+            cache: IntentCache = IntentCache(
+                nlu_client_pool=pool, ttl=60, agents=[AGENT], language_codes=["de-DE"], retry_interval=60,
+            )
+            cache.start()
+            try:
+                while "ListIntents" not in fake_intents.calls:
+                    await asyncio.sleep(0.01)
+                assert len(cache) == 0
+
+                intent: intent_pb2.Intent = await cache.get(f"{AGENT}/intents/intent-4", "de-DE")
+                assert intent.training_phrases[0].text == "phrase 4 in de-DE"
+                assert await cache.get(f"{AGENT}/intents/intent-4", "de-DE") is intent
+                assert fake_intents.calls == ["ListIntents", "GetIntent"]
+                # the warm-up is retried later, it does not stop the background task
+                assert cache._background_task is not None and not cache._background_task.done()
+            finally:
+                await cache.close()
+
+    asyncio.run(run())
@@ -0,0 +1,136 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+from urllib.parse import parse_qsl
+
+import grpc  # type: ignore
+import httpx
+import pytest
+from ondewo.nlu import (
+    context_pb2,
+    intent_pb2,
+    intent_pb2_grpc,
+)
+from ondewo.nlu.utils.keycloak import KeycloakAuthenticationError
+
+from ondewo_nlu_webhook_server_custom_integration.http_services import SharedHttpClient
+from ondewo_nlu_webhook_server_custom_integration.nlu_client_pool import AsyncNluClientPool
+from tests.ondewo_nlu_webhook_server_custom_integration.conftest import (
+    FakeContexts,
+    FakeIntents,
+    NluServer,
+)
+
+SESSION: str = "projects/my-project/agent/sessions/my-session"
+
+
+def test_calls_are_concurrent_and_distributed_over_lazily_opened_channels(
+    fake_intents: FakeIntents,
+    nlu_server: NluServer,
+) -> None:
+    async def run() -> None:
+        async with nlu_server(
+            fake_intents, FakeContexts(), size=2, metadata=[("authorization", "Basic my-token")],
+        ) as pool:
+            assert pool._channels == []
+            intent_list: List[intent_pb2.Intent] = list(
+                await asyncio.gather(*(pool.get_intent(f"intent-{i}", "de-DE") for i in range(6))),
+            )
+            assert [intent.name for intent in intent_list] == [f"intent-{i}" for i in range(6)]
+            assert intent_list[0].display_name == "intent in de-DE"
+            assert len(pool._channels) == 2
+            assert len({id(stub) for stub in pool._stubs.values()}) == 2
+
+            contexts: List[context_pb2.Context] = await pool.list_contexts(SESSION)
+            assert [context.name for context in contexts] == [f"{SESSION}/contexts/context-{i}" for i in range(3)]
+
+    asyncio.run(run())
+    assert fake_intents.metadata == [(("authorization", "Basic my-token"),)] * 6
+
+
+def test_call_fails_after_its_deadline(fake_intents: FakeIntents, nlu_server: NluServer) -> None:
+    async def run() -> None:
+        async with nlu_server(fake_intents) as pool:
+            with pytest.raises(grpc.aio.AioRpcError) as error:
+                await pool.get_intent("slow", "de-DE", timeout=0.05)
+            assert error.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+
+    asyncio.run(run())
+
+
+def test_channels_are_reopened_in_another_event_loop() -> None:
+    pool: AsyncNluClientPool = AsyncNluClientPool(host_and_port="localhost:1", size=1, timeout=1)
+
+    async def open_channels() -> Any:
+        pool.get_stub(intent_pb2_grpc.IntentsStub)
+        return pool._channels[0]
+
+    first_channel: Any = asyncio.run(open_channels())
+    assert asyncio.run(open_channels()) is not first_channel
+
+
+def test_login_requests_a_keycloak_token_which_is_sent_as_bearer_token(
+    fake_intents: FakeIntents,
+    nlu_server: NluServer,
+) -> None:
+    token_requests: List[Dict[str, str]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        assert request.url == "https://keycloak/auth/realms/my-realm/protocol/openid-connect/token"
+        form: Dict[str, str] = dict(parse_qsl(request.content.decode()))
+        token_requests.append(form)
+        if form["password"] != "secret":
+            return httpx.Response(401, json={"error": "invalid_grant"})
+        return httpx.Response(200, json={"access_token": "my-access-token", "expires_in": 300})
+
+    async def run() -> None:
+        async with nlu_server(fake_intents, metadata=[("authorization", "Basic my-token")]) as pool:
+            pool.keycloak_url = "https://keycloak/auth"
+            pool.realm = "my-realm"
+            pool.client_id = "ondewo-nlu-cai-sdk-public"
+            pool._http_client = SharedHttpClient(
+                limits=httpx.Limits(max_connections=1),
+                timeout=httpx.Timeout(1.0),
+                transport=httpx.MockTransport(handle_request),
+            )
+            assert pool.supports_login
+
+            with pytest.raises(KeycloakAuthenticationError):
+                await pool.login("user@ondewo.com", "wrong")
+            pool.set_auth_token(await pool.login("user@ondewo.com", "secret"))
+            await pool.get_intent("intent", "de-DE")
+
+    asyncio.run(run())
+    assert token_requests[-1] == {
+        "grant_type": "password",
+        "client_id": "ondewo-nlu-cai-sdk-public",
+        "username": "user@ondewo.com",
+        "password": "secret",
+    }
+    # the bearer token replaces the http basic auth token
+    assert fake_intents.metadata == [(("authorization", "Bearer my-access-token"),)]
+
+
+def test_login_requires_keycloak() -> None:
+    pool: AsyncNluClientPool = AsyncNluClientPool(host_and_port="localhost:1", size=1, timeout=1)
+
+    assert not pool.supports_login
+    with pytest.raises(ValueError):
+        asyncio.run(pool.login("user@ondewo.com", "secret"))
@@ -0,0 +1,157 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    List,
+    Optional,
+)
+
+import httpx
+import pytest
+
+from ondewo_nlu_webhook_server_custom_integration import (
+    http_services,
+    price_service,
+)
+from ondewo_nlu_webhook_server_custom_integration.http_services import SharedHttpClient
+from ondewo_nlu_webhook_server_custom_integration.price_service import (
+    PriceIndex,
+    PriceTable,
+    PriceTableCache,
+)
+
+URL: str = "http://prices/my-page"
+PRICE_PAGE: str = """
+<div class="table-box"><table class="table">
+    <tr class="tablerow"><td>my-product-category</td><td>12,50 €</td></tr>
+    <tr class="tablerow"><td>other-category</td><td>9,90 €</td></tr>
+</table></div>
+"""
+
+
+class FakePricePage:
+    """Price page which answers conditional requests and records the validators of every request."""
+
+    def __init__(self) -> None:
+        self.conditional_headers: List[Optional[str]] = []
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.conditional_headers.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text=PRICE_PAGE, headers={"ETag": '"v1"'})
+
+
+@pytest.fixture
+def price_page(monkeypatch: pytest.MonkeyPatch) -> FakePricePage:
+    page: FakePricePage = FakePricePage()
+    client: SharedHttpClient = SharedHttpClient(
+        limits=httpx.Limits(),
+        timeout=httpx.Timeout(1.0),
+        transport=httpx.MockTransport(page.handle_request),
+    )
+    monkeypatch.setattr(http_services, "shared_http_client", client)
+    return page
+
+
+def test_parse_price_table() -> None:
+    assert price_service.parse_price_table(PRICE_PAGE) == {
+        "price_list": [
+            {"category": "my-product-category", "price": "12,50 €"},
+            {"category": "other-category", "price": "9,90 €"},
+        ],
+    }
+
+
+def test_concurrent_misses_share_one_request(price_page: FakePricePage) -> None:
+    cache: PriceTableCache = PriceTableCache(ttl=60, max_stale=60)
+
+    async def run() -> List[PriceTable]:
+        return list(await asyncio.gather(*(cache.get(URL) for _ in range(10))))
+
+    tables: List[PriceTable] = asyncio.run(run())
+    assert all(table == tables[0] for table in tables)
+    assert price_page.conditional_headers == [None]
+
+
+def test_stale_table_is_revalidated_in_background(price_page: FakePricePage) -> None:
+    now: List[float] = [1000.0]
+    cache: PriceTableCache = PriceTableCache(ttl=60, max_stale=60, clock=lambda: now[0])
+
+    async def run() -> None:
+        table: PriceTable = await cache.get(URL)
+
+        now[0] += 30  # fresh: served from the cache
+        assert await cache.get(URL) is table
+        assert price_page.conditional_headers == [None]
+
+        now[0] += 60  # stale: served from the cache and revalidated with a conditional request
+        assert await cache.get(URL) is table
+        await asyncio.sleep(0.01)
+        assert price_page.conditional_headers == [None, '"v1"']
+
+        now[0] += 30  # fresh again after the 304 response
+        assert await cache.get(URL) is table
+        assert len(price_page.conditional_headers) == 2
+
+        now[0] += 1000  # too old: the request waits for the revalidation
+        assert await cache.get(URL) is table
+        assert len(price_page.conditional_headers) == 3
+
+    asyncio.run(run())
+
+
+def test_price_index_matches_linear_scan() -> None:
+    table: PriceTable = {
+        "product": [
+            {"category": "b-category-long", "price": "1"},
+            {"category": "a-category", "price": "2"},
+            {"category": "b-category", "price": "3"},
+            {"category": "a-category", "price": "4"},
+        ],
+    }
+    index: PriceIndex = PriceIndex(table)
+
+    def scan(text: str, prefix: bool) -> Optional[str]:
+        return next(
+            (
+                item["price"] for item in table["product"]
+                if (item["category"].startswith(text) if prefix else text in item["category"])
+            ), None,
+        )
+
+    for text in ["a-category", "b-category", "category", "long", "b-", "missing", ""]:
+        assert index.find_by_substring("product", text) == scan(text, prefix=False)
+        assert index.find_by_prefix("product", text) == scan(text, prefix=True)
+
+    assert index.get("product", "a-category") == "2"
+    assert index.get("product", "category") is None
+    assert index.find_by_substring("other product", "a-category") is None
+
+    # an empty category contains the empty text only
+    table["product"].insert(0, {"category": "", "price": "0"})
+    index = PriceIndex(table)
+    for text in ["", "a-category"]:
+        assert index.find_by_substring("product", text) == scan(text, prefix=False)
+        assert index.find_by_prefix("product", text) == scan(text, prefix=True)
+
+    # many matching entries in an arbitrary order, the first row of each range of keys must still be found
+    table["product"] = [
+        {"category": f"category {(row * 7919) % 1000}", "price": str(row)} for row in range(1000)
+    ]
+    index = PriceIndex(table)
+    for text in ["category", "category 1", "y 99", "9", "0 ", "missing"]:
+        assert index.find_by_substring("product", text) == scan(text, prefix=False)
+        assert index.find_by_prefix("product", text) == scan(text, prefix=True)
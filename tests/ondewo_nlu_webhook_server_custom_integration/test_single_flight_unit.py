@@ -0,0 +1,65 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from functools import partial
+from typing import List
+
+import pytest
+
+from ondewo_nlu_webhook_server_custom_integration.single_flight import SingleFlight
+
+
+def test_concurrent_callers_of_a_key_share_one_call() -> None:
+    calls: List[str] = []
+    single_flight: SingleFlight[str, str] = SingleFlight()
+
+    async def call(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"result of {key}"
+
+    async def run() -> List[str]:
+        cancelled: "asyncio.Task[str]" = asyncio.ensure_future(single_flight.run("a", lambda: call("a")))
+        waiting: "asyncio.Future[List[str]]" = asyncio.gather(
+            *(single_flight.run(key, partial(call, key)) for key in ["a", "a", "b"]),
+        )
+        await asyncio.sleep(0)
+        assert "a" in single_flight and len(single_flight) == 2
+        # a cancelled caller does not cancel the call the other callers wait for
+        cancelled.cancel()
+        return await waiting
+
+    assert asyncio.run(run()) == ["result of a", "result of a", "result of b"]
+    assert calls == ["a", "b"]
+    assert len(single_flight) == 0
+
+
+def test_failed_call_is_reported_and_released() -> None:
+    errors: List[BaseException] = []
+    single_flight: SingleFlight[None, str] = SingleFlight(on_error=errors.append)
+
+    async def failing_call() -> str:
+        raise ConnectionError("upstream unavailable")
+
+    async def succeeding_call() -> str:
+        return "result"
+
+    async def run() -> str:
+        with pytest.raises(ConnectionError):
+            await single_flight.run(None, failing_call)
+        return await single_flight.run(None, succeeding_call)
+
+    assert asyncio.run(run()) == "result"
+    assert [repr(error) for error in errors] == [repr(ConnectionError("upstream unavailable"))]
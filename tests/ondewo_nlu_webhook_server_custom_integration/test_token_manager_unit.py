@@ -0,0 +1,204 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import base64
+import json
+import os
+from pathlib import Path
+from typing import (
+    List,
+    Optional,
+)
+
+import pytest
+
+from ondewo_nlu_webhook_server_custom_integration import auth
+from ondewo_nlu_webhook_server_custom_integration.token_manager import (
+    CachedToken,
+    FileTokenStore,
+    TokenManager,
+    get_token_expiry,
+)
+
+
+class FakeLogin:
+    """Login which returns a new token per call after a short delay."""
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return f"token-{self.calls}"
+
+
+def test_get_token_expiry_of_jwt() -> None:
+    payload: str = base64.urlsafe_b64encode(json.dumps({"exp": 1700000000}).encode()).decode().rstrip("=")
+    assert get_token_expiry(f"header.{payload}.signature") == 1700000000.0
+    assert get_token_expiry("opaque-token") is None
+    assert get_token_expiry("not.a!.jwt") is None
+
+
+def test_concurrent_requests_share_one_login() -> None:
+    login: FakeLogin = FakeLogin()
+    tokens: List[str] = []
+    manager: TokenManager = TokenManager(login=login, refresh_margin=10, default_ttl=100, on_token=tokens.append)
+
+    async def run() -> List[str]:
+        return list(await asyncio.gather(*(manager.get_token() for _ in range(10))))
+
+    assert asyncio.run(run()) == ["token-1"] * 10
+    assert login.calls == 1
+    assert tokens == ["token-1"]
+
+
+def test_token_is_refreshed_before_it_expires() -> None:
+    login: FakeLogin = FakeLogin()
+    now: List[float] = [1000.0]
+    manager: TokenManager = TokenManager(login=login, refresh_margin=10, default_ttl=100, clock=lambda: now[0])
+
+    async def run() -> None:
+        assert await manager.get_token() == "token-1"
+
+        now[0] += 95  # within the refresh margin: served while refreshed in the background
+        assert await manager.get_token() == "token-1"
+        await asyncio.sleep(0.05)
+        assert await manager.get_token() == "token-2"
+
+        now[0] += 200  # expired: the request waits for the login
+        assert await manager.get_token() == "token-3"
+
+    asyncio.run(run())
+    assert login.calls == 3
+
+
+def test_workers_share_the_token_through_the_store(tmp_path: Path) -> None:
+    logins: List[FakeLogin] = [FakeLogin(), FakeLogin()]
+    managers: List[TokenManager] = [
+        TokenManager(
+            login=login,
+            refresh_margin=10,
+            default_ttl=100,
+            store=FileTokenStore(str(tmp_path / "token.json"), lock_poll_interval=0.001),
+        )
+        for login in logins
+    ]
+
+    async def run() -> List[str]:
+        return list(await asyncio.gather(*(manager.get_token() for manager in managers)))
+
+    assert asyncio.run(run()) == ["token-1", "token-1"]
+    assert sorted(login.calls for login in logins) == [0, 1]
+
+
+def test_unusable_store_falls_back_to_the_per_worker_token(tmp_path: Path) -> None:
+    (tmp_path / "not_a_directory").write_text("")
+    login: FakeLogin = FakeLogin()
+    manager: TokenManager = TokenManager(
+        login=login,
+        refresh_margin=10,
+        default_ttl=100,
+        store=FileTokenStore(str(tmp_path / "not_a_directory" / "token.json")),
+    )
+
+    assert asyncio.run(manager.get_token()) == "token-1"
+    assert login.calls == 1
+
+
+def test_store_refuses_a_directory_accessible_by_others(tmp_path: Path) -> None:
+    shared: Path = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    store: FileTokenStore = FileTokenStore(str(shared / "token.json"))
+
+    async def lock() -> None:
+        async with store.lock():
+            pass
+
+    with pytest.raises(PermissionError):
+        asyncio.run(lock())
+
+
+def test_store_does_not_follow_a_planted_link(tmp_path: Path) -> None:
+    planted: Path = tmp_path / "planted.json"
+    planted.write_text(json.dumps({"token": "planted", "expires_at": 2e9}))
+    (tmp_path / "token.json").symlink_to(planted)
+    store: FileTokenStore = FileTokenStore(str(tmp_path / "token.json"))
+
+    assert store.load() is None
+    Path(f"{store.path}.{os.getpid()}.tmp").symlink_to(planted)
+    with pytest.raises(OSError):
+        store.save(CachedToken(token="token", expires_at=2e9))
+    assert json.loads(planted.read_text())["token"] == "planted"
+
+
+def test_background_refresh_logs_in_without_request() -> None:
+    login: FakeLogin = FakeLogin()
+    manager: TokenManager = TokenManager(login=login, refresh_margin=0, default_ttl=100, retry_interval=0.01)
+
+    async def run() -> Optional[str]:
+        manager.start()
+        await asyncio.sleep(0.05)
+        await manager.close()
+        return manager._token.token if manager._token is not None else None
+
+    assert asyncio.run(run()) == "token-1"
+    assert login.calls == 1
+
+
+def test_background_refresh_backs_off_after_failures() -> None:
+    attempts: List[int] = []
+
+    async def login() -> str:
+        attempts.append(manager.consecutive_failures)
+        if len(attempts) <= 3:
+            raise ConnectionError("identity provider unavailable")
+        return "token"
+
+    manager: TokenManager = TokenManager(
+        login=login, refresh_margin=0, default_ttl=100, retry_interval=0.01, max_retry_interval=0.03,
+    )
+    manager.consecutive_failures = 10
+    assert all(0.01 <= manager.retry_delay() <= 0.03 for _ in range(100))
+    manager.consecutive_failures = 2
+    assert all(0.01 <= manager.retry_delay() <= 0.02 for _ in range(100))
+    manager.consecutive_failures = 0
+
+    async def run() -> None:
+        manager.start()
+        while manager._token is None:
+            await asyncio.sleep(0.01)
+        await manager.close()
+
+    asyncio.run(run())
+    assert attempts == [0, 1, 2, 3]
+    assert manager.consecutive_failures == 0
+
+
+def test_token_refresh_is_not_started_without_keycloak(monkeypatch: pytest.MonkeyPatch) -> None:
+    started: List[bool] = []
+    monkeypatch.setattr(auth, "ONDEWO_NLU_CAI_USER_NAME", "user@ondewo.com")
+    monkeypatch.setattr(auth.nlu_client_pool, "keycloak_url", "")
+    monkeypatch.setattr(auth.nlu_token_manager, "start", lambda: started.append(True))
+
+    auth.start_token_refresh()
+    assert started == []
+
+    monkeypatch.setattr(auth.nlu_client_pool, "keycloak_url", "https://keycloak/auth")
+    monkeypatch.setattr(auth.nlu_client_pool, "realm", "my-realm")
+    monkeypatch.setattr(auth.nlu_client_pool, "client_id", "ondewo-nlu-cai-sdk-public")
+    auth.start_token_refresh()
+    assert started == [True]
@@ -0,0 +1,80 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+
+import pytest
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    IntentMessage,
+    IntentMessageQuickReplies,
+    IntentMessageText,
+)
+from ondewo_nlu_webhook_server_custom_integration.utils.fulfillment_messages import FulfillmentMessages
+from ondewo_nlu_webhook_server_custom_integration.utils.helpers import (
+    add_text_to_fulfillment,
+    check_if_text_response_exist,
+    get_index_of_text_entry,
+    override_fulfillment_with_text,
+)
+from ondewo_nlu_webhook_server_custom_integration.utils.templates import render_fulfillment_messages
+
+
+def test_index_of_dict_messages() -> None:
+    messages: List[Dict[str, Any]] = [
+        {"payload": {"a": 1}, "platform": "PLACEHOLDER_1"},
+        {"card": None, "text": {"text": ["first"]}},
+        {"quick_replies": {"quick_replies": ["yes", "no"]}},
+        {"text": {"text": ["second"]}},
+    ]
+    fulfillment_messages: FulfillmentMessages = FulfillmentMessages(messages)
+
+    assert fulfillment_messages.positions("text") == [1, 3]
+    assert fulfillment_messages.first("payload") is messages[0]
+    assert not fulfillment_messages.has("card")
+
+    fulfillment_messages.add_text("added")
+    fulfillment_messages.append({"card": {"title": "card"}})
+    assert fulfillment_messages.to_list() is messages
+    assert messages[1] == {"card": None, "text": {"text": ["first", "added"]}}
+    assert fulfillment_messages.positions("card") == [4]
+
+
+def test_intent_messages() -> None:
+    messages: List[IntentMessage] = [
+        IntentMessage(quick_replies=IntentMessageQuickReplies(title="title", quick_replies=["a"])),
+        IntentMessage(text=IntentMessageText(text=["Hello <name>"])),
+    ]
+    render_fulfillment_messages(messages, {"name": "Anna"})  # type: ignore
+    assert messages[1].text is not None and messages[1].text.text == ["Hello Anna"]
+
+    FulfillmentMessages(messages).override_text("new")
+    assert messages[1].text is not None and messages[1].text.text == ["new"]
+
+
+def test_helpers() -> None:
+    messages: List[Dict[str, Any]] = [{"payload": {}}]
+    assert not check_if_text_response_exist(messages)
+    with pytest.raises(ValueError):
+        get_index_of_text_entry(messages)
+
+    assert add_text_to_fulfillment(messages, "first") == [{"payload": {}}, {"text": {"text": ["first"]}}]
+    assert check_if_text_response_exist(messages)
+    assert get_index_of_text_entry(messages) == 1
+    assert add_text_to_fulfillment(messages, "second")[1] == {"text": {"text": ["first", "second"]}}
+    assert override_fulfillment_with_text(messages, "third")[1] == {"text": {"text": ["third"]}}
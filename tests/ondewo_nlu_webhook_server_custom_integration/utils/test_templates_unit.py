@@ -0,0 +1,83 @@
+# Copyright 2021-2025 ONDEWO GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+
+from ondewo_nlu_webhook_server.server.base_models import (
+    Intent,
+    IntentMessage,
+    IntentMessageText,
+    WebhookRequest,
+)
+from ondewo_nlu_webhook_server_custom_integration.utils.helpers import replace_placeholder_in_text
+from ondewo_nlu_webhook_server_custom_integration.utils.templates import (
+    collect_template_values,
+    compile_template,
+    get_template_slots,
+    render_fulfillment_messages,
+    render_template,
+)
+
+
+def test_render_template() -> None:
+    text: str = "Hello <name>, your <item> costs <price> € (<name>). a < b > c"
+    assert compile_template(text) is compile_template(text)
+    assert compile_template(text).slots == ("name", "item", "price", "name")
+
+    assert render_template(text, {"name": "Anna", "item": "ticket"}) == (
+        "Hello Anna, your ticket costs <price> € (Anna). a < b > c"
+    )
+    assert render_template("no placeholders", {"name": "Anna"}) == "no placeholders"
+
+
+def test_collect_template_values() -> None:
+    webhook_request: WebhookRequest = WebhookRequest.create_sample_request()
+    values: Dict[str, str] = collect_template_values(
+        parameters={"parameter2": "global", "MyEntityType": ["a", "b"], "empty": ""},
+        active_contexts=webhook_request.queryResult.outputContexts,
+    )
+    assert values == {"parameter1": "1", "parameter2": "global", "MyEntityType": "a, b"}
+
+
+def test_replace_placeholder_in_text() -> None:
+    fulfillment_messages: List[Dict[str, Any]] = [
+        {"text": {"text": ["Welcome to <organization_name>, <user_name>!", "<unknown> stays"]}},
+        {"card": {"title": "<organization_name>"}},
+    ]
+    assert get_template_slots(fulfillment_messages) == {"organization_name", "user_name", "unknown"}
+
+    result: List[Dict[str, Any]] = asyncio.run(
+        replace_placeholder_in_text(
+            fulfillment_messages=fulfillment_messages,
+            replace_text="ONDEWO",
+            active_intent=Intent(name="projects/p/agent/intents/i", displayName="Default Welcome Intent"),
+            parameters={"user_name": "Anna"},
+        ),
+    )
+    assert result[0]["text"]["text"] == ["Welcome to ONDEWO, Anna!", "<unknown> stays"]
+    assert result[1] == {"card": {"title": "<organization_name>"}}
+
+
+def test_render_intent_message_objects() -> None:
+    """The relay hands the parsed IntentMessage objects to the custom code."""
+    fulfillment_messages: List[Any] = [IntentMessage(text=IntentMessageText(text=["Hello <name>!"])), IntentMessage()]
+    assert get_template_slots(fulfillment_messages) == {"name"}
+
+    render_fulfillment_messages(fulfillment_messages, {"name": "Anna"})
+    assert fulfillment_messages[0].text.text == ["Hello Anna!"]